@@ -1,5 +1,5 @@
 import requests
-from openai import OpenAI
+from lib.llm import chat_completion
 from dotenv import load_dotenv
 import os
 import re
@@ -9,7 +9,6 @@ load_dotenv()
 URL = os.getenv("URL_zad1") # from the exercise 1
 USERNAME = "tester" # from the exercise 1
 PASSWORD = "574e112a" # from the exercise 1
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 
 def extract_question(response_text):
@@ -36,17 +35,11 @@ def extract_question(response_text):
 def get_ai_answer(question):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": f'answer to the question: "{question}" providing only the year number as the answer'}]
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         print(f"question: {question}")
         print(f"AI generated answer: {ai_answer}")
         return ai_answer
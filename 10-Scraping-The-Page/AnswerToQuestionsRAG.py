@@ -1,19 +1,68 @@
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain.text_splitter import MarkdownTextSplitter
-from langchain.chains import RetrievalQA
+from langchain.chains.question_answering import load_qa_chain
 from langchain_community.vectorstores import Qdrant
+from langchain_community.callbacks import get_openai_callback
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
 from qdrant_client import QdrantClient, models
+import asyncio
+import hashlib
+import json
 import os
+import sys
+import time
 from dotenv import load_dotenv
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.context_packing import pack_context
+from lib.telemetry import track_call
+
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
 URL = os.getenv("URL_zad10")
 OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
+# Chunks of the article are embedded once and kept on disk between runs
+QDRANT_PATH = os.path.join(root_folder, '..', '.cache', 'qdrant_document_qa')
+CHUNK_SIZE = 10000
+CHUNK_OVERLAP = 2000
+# Chunks retrieved per question, then packed into at most LLM_context_tokens tokens without the overlaps
+RETRIEVAL_K = 10
+CONTEXT_TOKENS = int(os.getenv("LLM_context_tokens", "8000"))
+LLM_CONCURRENCY = int(os.getenv("LLM_concurrency", "10")) # max answers requested at the same time in ask_questions
+
+class StreamingAnswerHandler(BaseCallbackHandler):
+    """
+    Prints the answer tokens as they arrive and measures time to first token and total time
+    """
+    def __init__(self):
+        self.start_time = None
+        self.time_to_first_token = None
+        self.total_time = None
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.start_time = time.perf_counter()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.start_time = time.perf_counter()
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.time_to_first_token is None and token:
+            self.time_to_first_token = time.perf_counter() - self.start_time
+        print(token, end="", flush=True)
+
+    def on_llm_end(self, response, **kwargs):
+        self.total_time = time.perf_counter() - self.start_time
+        print()
+
+    def timings(self):
+        return f"time to first token: {self.time_to_first_token or 0:.2f}s, total: {self.total_time or 0:.2f}s"
 
 class DocumentQA:
-    def __init__(self, openai_api_key, model_name="gpt-4o-mini"):
+    def __init__(self, openai_api_key, model_name="gpt-4o-mini", chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                 context_tokens=CONTEXT_TOKENS):
 
         # Initialize OpenAI API key
         os.environ["OPENAI_API_KEY"] = openai_api_key
@@ -22,27 +71,40 @@ class DocumentQA:
         self.llm = ChatOpenAI(
             temperature=0.6,  # Set to 0 for more consistent answers
             model=model_name,
-            max_tokens=15000  # Maximum length of the response
+            base_url=os.getenv("OpenAI_baseURL") or None,
+            max_tokens=15000,  # Maximum length of the response
+            streaming=True,  # Tokens are passed to the callbacks as they arrive
+            stream_usage=True  # Streamed answers report their token usage too (read by get_openai_callback)
         )
         
         # Initialize embeddings
-        self.embeddings = OpenAIEmbeddings()
+        self.embeddings = OpenAIEmbeddings(base_url=os.getenv("OpenAI_baseURL") or None)
         
         # Initialize Qdrant client
-        self.qdrant_client = QdrantClient(":memory:")  # Using in-memory storage
-        self.collection_name = "document_qa"
-        
-        # Create collection with proper configuration
-        self.qdrant_client.recreate_collection(
-            collection_name=self.collection_name,
-            vectors_config=models.VectorParams(
-                size=1536,  # OpenAI embeddings dimension
-                distance=models.Distance.COSINE
-            )
-        )
+        self.qdrant_client = QdrantClient(path=QDRANT_PATH)  # Local storage kept between runs
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.context_tokens = context_tokens
+        # Named after the loaded document
+        self.collection_name = None
         
         # Initialize vector store
         self.vector_store = None
+        # Text of the loaded document - chunks are located in it to remove the overlaps
+        self.document_text = None
+
+    def document_collection_prefix(self, markdown_path):
+        """Start of the collection names of one document - from the hash of its absolute path"""
+        path_hash = hashlib.sha256(os.path.abspath(markdown_path).encode('utf-8')).hexdigest()[:12]
+        return f"document_qa_{path_hash}_"
+
+    def document_collection_name(self, markdown_path, markdown_content):
+        """
+        Collection of one version of the document - named by the document's prefix and the hash
+        of its content, the chunking parameters and the embedding model, so any change gives a new collection
+        """
+        key = f"{self.chunk_size}:{self.chunk_overlap}:{self.embeddings.model}:{markdown_content}"
+        return self.document_collection_prefix(markdown_path) + hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
 
     def load_and_process_document(self, markdown_path):
         """
@@ -54,20 +116,45 @@ class DocumentQA:
         
         # Split the text into chunks
         text_splitter = MarkdownTextSplitter(
-            chunk_size=10000,
-            chunk_overlap=2000
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
         )
         texts = text_splitter.split_text(markdown_content)
-        
+        self.document_text = markdown_content
+
+        self.collection_name = self.document_collection_name(markdown_path, markdown_content)
         # Create vector store
         self.vector_store = Qdrant(
             client=self.qdrant_client,
             collection_name=self.collection_name,
             embeddings=self.embeddings
         )
+
+        # Unchanged document - the chunks were embedded on an earlier run
+        if (self.qdrant_client.collection_exists(self.collection_name)
+                and self.qdrant_client.count(self.collection_name).count == len(texts)):
+            print(f"Using stored embeddings from {self.collection_name}")
+            return len(texts)
+
+        # New or changed document (or an interrupted run) - embed it again
+        self.qdrant_client.recreate_collection(
+            collection_name=self.collection_name,
+            vectors_config=models.VectorParams(
+                size=1536,  # OpenAI embeddings dimension
+                distance=models.Distance.COSINE
+            )
+        )
         
         # Add texts to the vector store
-        self.vector_store.add_texts(texts)
+        with track_call("embedding", self.embeddings.model) as call:
+            self.vector_store.add_texts(texts)
+            call.extra["inputs"] = len(texts)
+
+        # Collections of the previous versions of this document are no longer used (other documents keep theirs)
+        prefix = self.document_collection_prefix(markdown_path)
+        for collection in self.qdrant_client.get_collections().collections:
+            if collection.name.startswith(prefix) and collection.name != self.collection_name:
+                self.qdrant_client.delete_collection(collection.name)
         
         return len(texts)
 
@@ -78,31 +165,141 @@ class DocumentQA:
         if not self.vector_store:
             raise ValueError("Please load a document first!")
         
-        # Create retrieval QA chain
-        self.qa_chain = RetrievalQA.from_chain_type(
-            llm=self.llm,
-            chain_type="stuff",
-            retriever=self.vector_store.as_retriever(
-                search_kwargs={"k": 10}  # Number of relevant chunks to retrieve
-            ),
-            return_source_documents=True
+        # Create QA chain - the chunks are retrieved and packed in ask_question
+        self.qa_chain = load_qa_chain(llm=self.llm, chain_type="stuff")
+
+    def retrieve_context(self, question, query_vector=None):
+        """
+        Retrieve the most relevant chunks, then keep each span of the document once, within the token budget.
+        The question is embedded here unless its vector is given.
+        """
+        if query_vector is None:
+            source_documents = self.vector_store.similarity_search(question, k=RETRIEVAL_K)
+        else:
+            source_documents = self.vector_store.similarity_search_by_vector(query_vector, k=RETRIEVAL_K)
+        packed_texts, packing = pack_context(
+            [doc.page_content for doc in source_documents],
+            self.context_tokens,
+            source=self.document_text,
+            model=self.llm.model_name
         )
+        return source_documents, [Document(page_content=text) for text in packed_texts], packing
+
+    def record_usage(self, call, usage, packing):
+        call.extra["context_tokens_saved"] = packing["saved_tokens"]
+        call.set_usage({
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens
+        })
 
-    def ask_question(self, question):
+    def ask_question(self, question, stream=False):
         """
-        Ask a question and get an answer
+        Ask a question and get an answer.
+        With stream=True the answer is printed while it is generated.
         """
         if not hasattr(self, 'qa_chain'):
             self.setup_qa_chain()
         
+        source_documents, input_documents, packing = self.retrieve_context(question)
+        print(f"Context: {packing['packed_tokens']} tokens from {packing['chunks']} chunks "
+              f"({packing['saved_tokens']} tokens saved)")
+
         # Get the answer
-        result = self.qa_chain({"query": question})
+        handler = StreamingAnswerHandler() if stream else None
+        with track_call("rag", self.llm.model_name) as call, get_openai_callback() as usage:
+            result = self.qa_chain(
+                {"input_documents": input_documents, "question": question},
+                callbacks=[handler] if handler else None
+            )
+            self.record_usage(call, usage, packing)
         
         return {
-            "answer": result["result"],
-            "source_documents": result["source_documents"]
+            "answer": result["output_text"],
+            "source_documents": source_documents,
+            "context": packing,
+            "timings": handler.timings() if handler else None
         }
 
+    def ask_questions(self, questions, concurrency=LLM_CONCURRENCY):
+        """
+        Answer many questions: one batched embedding call for all of them, then the answers
+        are requested concurrently (at most `concurrency` at a time). Results are in the order of the questions.
+        """
+        if not hasattr(self, 'qa_chain'):
+            self.setup_qa_chain()
+
+        with track_call("embedding", self.embeddings.model) as call:
+            query_vectors = self.embeddings.embed_documents(questions)
+            call.extra["inputs"] = len(questions)
+        # Local search - no network round-trip per question
+        contexts = [self.retrieve_context(question, vector) for question, vector in zip(questions, query_vectors)]
+
+        async def answer(question, context, semaphore):
+            source_documents, input_documents, packing = context
+            async with semaphore:
+                try:
+                    with track_call("rag", self.llm.model_name) as call, get_openai_callback() as usage:
+                        result = await self.qa_chain.acall({"input_documents": input_documents, "question": question})
+                        self.record_usage(call, usage, packing)
+                    answer_text = result["output_text"]
+                except Exception as e:
+                    answer_text = f"An error occurred: {str(e)}"
+            return {
+                "answer": answer_text,
+                "source_documents": source_documents,
+                "context": packing,
+                "timings": None
+            }
+
+        async def answer_all():
+            semaphore = asyncio.Semaphore(concurrency)
+            # gather returns the answers in the order of the questions
+            return await asyncio.gather(*[
+                answer(question, context, semaphore) for question, context in zip(questions, contexts)
+            ])
+
+        return list(asyncio.run(answer_all()))
+
+def load_questions(questions_path):
+    """
+    Questions from a JSON file (a list, or an object whose keys are the answer numbers)
+    or a text file with one question per line. Returns (number, question) pairs in file order.
+    """
+    with open(questions_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+    try:
+        questions = json.loads(content)
+    except json.JSONDecodeError:
+        questions = [line.strip() for line in content.splitlines() if line.strip()]
+    if isinstance(questions, str):
+        # A JSON string is one question
+        questions = [questions]
+    if isinstance(questions, dict):
+        return [(str(number), question) for number, question in questions.items()]
+    if not isinstance(questions, list):
+        raise ValueError(f"{questions_path}: expected a list or an object of questions, got {type(questions).__name__}")
+    return [(str(number), question) for number, question in enumerate(questions, start=1)]
+
+def answer_questions_file(qa_system, questions_path, answers_path):
+    """Batch mode: answer every question of the file and write the number=answer map as JSON"""
+    numbered_questions = load_questions(questions_path)
+    print(f"Answering {len(numbered_questions)} questions from {questions_path}")
+    start = time.perf_counter()
+    results = qa_system.ask_questions([question for _, question in numbered_questions])
+    print(f"Answered in {time.perf_counter() - start:.2f}s, "
+          f"{sum(result['context']['saved_tokens'] for result in results)} context tokens saved")
+
+    answers = {number: result["answer"] for (number, _), result in zip(numbered_questions, results)}
+    with open(answers_path, 'w', encoding='utf-8') as file:
+        json.dump(answers, file, ensure_ascii=False, indent=2)
+
+    print('Answers:\n')
+    for number, answer in answers.items():
+        print(f'{number}={answer}')
+    print(f"\nSaved to {answers_path}")
+    return answers
+
 def main():
 
     # Initialize the system
@@ -114,8 +311,16 @@ def main():
     
     # Load and process the document
     markdown_path = "article.md"  # Replace with your document path
+    start = time.perf_counter()
     num_chunks = qa_system.load_and_process_document(markdown_path)
-    print(f"Document processed into {num_chunks} chunks")
+    print(f"Document processed into {num_chunks} chunks in {time.perf_counter() - start:.2f}s")
+
+    # Batch mode: python AnswerToQuestionsRAG.py questions.json [answers.json]
+    if len(sys.argv) > 1:
+        questions_path = sys.argv[1]
+        answers_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(questions_path)[0] + "_answers.json"
+        answer_questions_file(qa_system, questions_path, answers_path)
+        return
 
     answers = []
     counter = 1
@@ -127,8 +332,9 @@ def main():
             break
             
         try:
-            result = qa_system.ask_question(question)
-            print("\nAnswer:", result["answer"])
+            print("\nAnswer: ", end="", flush=True)
+            result = qa_system.ask_question(question, stream=True)
+            print(f"[{result['timings']}]")
             answer = f'{counter}={result["answer"]}'
             answers.append(answer)
             counter += 1
@@ -138,7 +344,7 @@ def main():
         except Exception as e:
             print(f"An error occurred: {str(e)}")
 
-    print(f'Answers:\n')
+    print('Answers:\n')
     for answer in answers:
         print(answer)
 
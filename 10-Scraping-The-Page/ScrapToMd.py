@@ -1,7 +1,7 @@
 from dotenv import load_dotenv
-from openai import OpenAI
 import requests
 import os
+import sys
 import base64
 import re
 from bs4 import BeautifulSoup
@@ -11,12 +11,17 @@ from markdownify import MarkdownConverter
 from markdownify import markdownify as md_convert
 import glob
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+
+from lib.llm import chat_completion, print_cache_stats, send_with_limiter
+from lib.telemetry import track_call
+
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
 URL = os.getenv("URL_zad10")
 ARTICLE = os.getenv("article")
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 class ImageBlockConverter(MarkdownConverter):
     """
@@ -170,15 +175,19 @@ def update_attributes(soup, files_folder_path=None):
 def speech_to_text(file_path):
     try:
 
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        # Transcribe the audio file using Whisper API (the call is recorded in the telemetry)
+        with open(file_path, "rb") as audio_file, track_call("whisper", "whisper-1") as call:
+            def transcribe(client):
+                # A retried request sends the file from the start again
+                audio_file.seek(0)
+                return client.audio.transcriptions.with_raw_response.create(
+                    model="whisper-1",
+                    file=audio_file
+                )
 
-        # Transcribe the audio file using Whisper API
-        with open(file_path, "rb") as audio_file:
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
+            # Sent through the shared rate limiter, which also retries 429 and server errors
+            response = send_with_limiter("whisper-1", 0, transcribe, call)
+            call.set_usage(getattr(response, "usage", None))
         
         # Extract the transcription from the response
         transcription = response.text
@@ -194,9 +203,6 @@ def save_markdown_file(content, file_path):
     
 def get_ai_answer_to_image(question, context, image_path=None, image_type="png"):
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
         # Encode the image if provided
         image_data = None
         if image_path:
@@ -221,15 +227,12 @@ def get_ai_answer_to_image(question, context, image_path=None, image_type="png")
             }
         ]
 
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             #model="gpt-4o",
             messages=messages
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -242,6 +245,7 @@ def main():
     #download_files(soup, ARTICLE)
     #print(soup)
     soup_updated = update_attributes(soup)
+    print_cache_stats()
     #print(soup_updated)
     markdown_content = md_convert(soup_updated)
     save_markdown_file(markdown_content, 'article.md')
@@ -1,24 +1,34 @@
+import codecs
+import io
+import os
 import re
-from typing import Dict, List, Union
+import sys
+from typing import Dict, Iterator, List, Union
+
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.tokens import TokenOffsets, count_tokens
+
+# Characters read at a time by iter_split
+BLOCK_CHARS = 1_000_000
+# Characters at the end of a block not chunked until the next block is read, and
+# characters kept before the next chunk, so the text around it is tokenized as in one pass
+TOKENIZE_MARGIN = 1000
 
 class TextService:
-    def adjust_chunk_end(self, text: str, start: int, end: int, limit: int, min_chunk_tokens: int) -> int:
-        # Attempt to reduce chunk size until it fits within token limit
-        while end > start:
-            reduced_end = self.find_previous_newline(text, start, end)
-            if reduced_end == end:  # No newline found
-                reduced_end = self.find_new_chunk_end(text, start, end)
-            
-            chunk_text = text[start:reduced_end]
-            tokens = self.count_tokens(chunk_text)
-            if tokens <= limit and tokens >= min_chunk_tokens:
-                print(f"Reducing chunk to previous newline at position {reduced_end}")
-                return reduced_end
-            
-            end = reduced_end
-        
-        # Return original end if adjustments aren't suitable
-        return end
+    def __init__(self, model: str = "gpt-4o-mini"):
+        # Tokens are counted with the tiktoken encoding of this model
+        self.model = model
+
+    def adjust_chunk_end(self, text: str, offsets: TokenOffsets, start: int, end: int, min_chunk_tokens: int) -> int:
+        # End the chunk after the last newline that still leaves at least min_chunk_tokens tokens
+        min_end = offsets.end_after(start, max(min_chunk_tokens, 1))
+        if end >= len(text) or min_end >= end:
+            return end
+        newline_pos = self.find_previous_newline(text, min_end, end)
+        if newline_pos == end:  # No newline found
+            return end
+        return newline_pos + 1
 
     def find_previous_newline(self, text: str, start: int, end: int) -> int:
         # Find the position of the previous newline character
@@ -29,55 +39,78 @@ class TextService:
 
     def count_tokens(self, text: str) -> int:
         # Count the number of tokens in the text
-        return len(text.split())
-        
-        # Return original end if adjustments aren't suitable
-        return end
+        return count_tokens(text, self.model)
     
     def split(self, text: str, limit: int) -> List[Dict[str, Union[str, Dict[str, Union[int, Dict[str, List[str]], List[str]]]]]]:
         print(f"Starting split process with limit: {limit} tokens")
-        chunks = []
-        position = 0
-        total_length = len(text)
-        current_headers = {}
-
-        while position < total_length:
-            print(f"Processing chunk starting at position: {position}")
-            chunk_text = text[position:position + limit]
-            chunk_end = position + limit
-            tokens = self.count_tokens(chunk_text)
-            print(f"Chunk tokens: {tokens}")
-
-            headers_in_chunk = self.extract_headers(chunk_text)
-            self.update_current_headers(current_headers, headers_in_chunk)
-
-            extracted = self.extract_urls_and_images(chunk_text)
-            content = extracted["content"]
-            urls = extracted["urls"]
-            images = extracted["images"]
-
-            chunks.append({
-                "text": content,
-                "metadata": {
-                    "tokens": tokens,
-                    "headers": {**current_headers},
-                    "urls": urls,
-                    "images": images,
-                },
-            })
-
-            print(f"Chunk processed. New position: {chunk_end}")
-            position = chunk_end
-
+        # One block - the text is encoded once
+        chunks = list(self.iter_split(io.StringIO(text), limit, block_chars=max(len(text), 1)))
         print(f"Split process completed. Total chunks: {len(chunks)}")
         return chunks
 
-    def find_new_chunk_end(self, text: str, start: int, end: int) -> int:
-        # Reduce end position to try to fit within token limit
-        new_end = end - ((end - start) // 10)  # Reduce by 10% each iteration
-        if new_end <= start:
-            new_end = start + 1  # Ensure at least one character is included
-        return new_end
+    def iter_split(self, source, limit: int, block_chars: int = BLOCK_CHARS) -> Iterator[Dict]:
+        """
+        Yield chunks of a text read block by block from a file handle (text or binary) or an mmap.
+        Only the current block and the unfinished chunk are kept in memory; headers carry over between chunks.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        current_headers = {}
+        buffer = ""
+        buffer_position = 0  # position of the buffer in the whole text
+        position = 0  # start of the next chunk in the buffer
+        finished = False
+
+        while not finished:
+            block = source.read(block_chars)
+            finished = not block
+            if isinstance(block, (bytes, bytearray)):
+                block = decoder.decode(block, final=finished)
+            buffer += block
+            # Chunk ends are found by binary search over the token offsets of the buffer
+            offsets = TokenOffsets(buffer, self.model)
+            # Text at the end of the buffer may be tokenized differently once the next block is read
+            safe_end = len(buffer) if finished else len(buffer) - TOKENIZE_MARGIN
+
+            while position < len(buffer):
+                chunk_end = offsets.end_after(position, limit)
+                if chunk_end > safe_end:
+                    break
+                print(f"Processing chunk starting at position: {buffer_position + position}")
+                adjusted_end = self.adjust_chunk_end(buffer, offsets, position, chunk_end, int(limit * 0.8))
+                # The untrimmed end is kept when trimming would leave an empty chunk
+                if adjusted_end > position:
+                    chunk_end = adjusted_end
+                tokens = offsets.count(position, chunk_end)
+                print(f"Chunk tokens: {tokens}")
+                yield self.make_chunk(buffer[position:chunk_end], tokens, current_headers)
+                position = chunk_end
+
+            # The buffer is cut at a token start well before the next chunk, so the tokens
+            # (and estimated token positions) around it stay the same after re-encoding
+            keep = offsets.first_token(max(position - TOKENIZE_MARGIN, 0))
+            cut = int(offsets.offsets[keep]) if len(offsets) else position
+            buffer_position += cut
+            buffer = buffer[cut:]
+            position -= cut
+
+    def make_chunk(self, chunk_text: str, tokens: int, current_headers: Dict[str, List[str]]) -> Dict:
+        headers_in_chunk = self.extract_headers(chunk_text)
+        self.update_current_headers(current_headers, headers_in_chunk)
+
+        extracted = self.extract_urls_and_images(chunk_text)
+        content = extracted["content"]
+        urls = extracted["urls"]
+        images = extracted["images"]
+
+        return {
+            "text": content,
+            "metadata": {
+                "tokens": tokens,
+                "headers": {**current_headers},
+                "urls": urls,
+                "images": images,
+            },
+        }
 
     def extract_headers(self, text: str) -> Dict[str, List[str]]:
         headers: Dict[str, List[str]] = {}
@@ -106,7 +139,7 @@ class TextService:
         for l in range(level + 1, 7):
             headers.pop(f'h{l}', None)
 
-    def extract_urls_and_images(text: str) -> Dict[str, Union[str, List[str]]]:
+    def extract_urls_and_images(self, text: str) -> Dict[str, Union[str, List[str]]]:
         urls: List[str] = []
         images: List[str] = []
         url_index = 0
@@ -5,16 +5,17 @@ from TextService import TextService
 splitter = TextService()
 
 def process_file(file_path):
-    with open(file_path, 'r', encoding='utf-8') as file:
-        text = file.read()
-    
-    docs = splitter.split(text, 1000)
-    json_file_path = os.path.join(os.path.dirname(file_path), f"{os.path.basename(file_path).replace('.md', '')}.json")
-    
-    with open(json_file_path, 'w', encoding='utf-8') as json_file:
-        json.dump(docs, json_file, indent=2)
-    
-    chunk_sizes = [doc['metadata']['tokens'] for doc in docs]
+    json_file_path = os.path.join(os.path.dirname(file_path), f"{os.path.basename(file_path).replace('.md', '')}.jsonl")
+    chunk_sizes = []
+
+    # Chunks are written one per line as they are made - the file is never held in memory as a whole
+    with open(file_path, 'r', encoding='utf-8') as file, open(json_file_path, 'w', encoding='utf-8') as json_file:
+        for doc in splitter.iter_split(file, 1000):
+            json_file.write(json.dumps(doc, ensure_ascii=False) + "\n")
+            chunk_sizes.append(doc['metadata']['tokens'])
+
+    if not chunk_sizes:
+        return {'file': os.path.basename(file_path), 'totalChunks': 0}
     avg_chunk_size = sum(chunk_sizes) / len(chunk_sizes)
     min_chunk_size = min(chunk_sizes)
     max_chunk_size = max(chunk_sizes)
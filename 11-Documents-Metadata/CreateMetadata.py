@@ -1,33 +1,31 @@
 from dotenv import load_dotenv
-from openai import OpenAI
 import requests
 import json
 import os
+import sys
 import glob
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+
+from lib.llm import chat_completion
+from lib.prompts import build_messages
+from lib.telemetry import print_prompt_cache_stats
+
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
     
-def get_ai_answer(question, context):
+def get_ai_answer(question, context, shared_context=None):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             #model="gpt-4o",
-            messages=[
-                {"role": "system", "content": context},
-                {"role": "user", "content": f'{question}'}
-            ]
+            # Instructions and shared facts form a prefix that is identical for every file
+            messages=build_messages(context, f'{question}', shared_context)
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -96,7 +94,8 @@ def main():
     facts_path = '../../../zadanie 11/pliki_z_fabryki/facts'
     txt_extensions = ["txt", "docx", "pdf", "md"]
     txt_files = scan_folder(folder_path, txt_extensions)
-    facts = scan_folder(facts_path, txt_extensions)
+    # Sorted, so the facts context has the same bytes on every run
+    facts = sorted(scan_folder(facts_path, txt_extensions))
 
     facts_context = ''
 
@@ -108,14 +107,13 @@ def main():
     
     print(facts_context)
 
-    context = f'''
-    - Summarize the text by the keywords.\n
-    - Add the keywords information aboout the job and skills of the mentioned person.\n
-    - Add the keywords information about the sectors from the name of the file.\n
-    - Answer should only return comma-separated keywords!\n
-    - Translating to polish keep the word in the nominative case.\n
-    - Use the facts below :\n
-    {facts_context}
+    context = '''
+    - Summarize the text by the keywords.
+    - Add the keywords information aboout the job and skills of the mentioned person.
+    - Add the keywords information about the sectors from the name of the file.
+    - Answer should only return comma-separated keywords!
+    - Translating to polish keep the word in the nominative case.
+    - Use the facts below :
     '''
     
     for file in txt_files:
@@ -127,7 +125,7 @@ def main():
     for file_path in txt_files:
         text = get_text_from_file(file_path)
         filename = os.path.basename(file_path)
-        ai_answer = get_ai_answer(f'summarize the file {filename}: "{text}"', context)
+        ai_answer = get_ai_answer(f'summarize the file {filename}: "{text}"', context, facts_context)
 
         keywords = ai_answer
 
@@ -136,6 +134,8 @@ def main():
 
         print(f'Keywords for {filename}: {keywords}')
 
+    print_prompt_cache_stats()
+
     # Send the results
     task_type = 'dokumenty'
     send_results(task_type, api_key, keywords_dict, URL_POST)
@@ -1,23 +1,58 @@
 from pathlib import Path
+import hashlib
 import os
-from typing import List, Dict
-import openai
+import sys
+from typing import List, Dict, Optional, Tuple
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
 from dotenv import load_dotenv
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.bm25_index import BM25Index, reciprocal_rank_fusion
+from lib.document_store import DocumentStore
+from lib.embedding_cache import print_embedding_cache_stats
+from lib.embeddings import embed_text, embed_texts
+from lib.index_manifest import IndexManifest, stable_point_id
+from lib.ivf_index import open_ivf_index, save_ivf_index
+from lib.report_dates import date_to_int, parse_report_date
+from lib.vector_store import LocalVectorStore, get_vector_backend
+
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
 OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 QDRANT_API_KEY = os.getenv("Qdrant_APIkey")
 QDRANT_URL = os.getenv("Qdrant_URL")
+# Files embedded per request when saving a folder
+EMBEDDING_BATCH_SIZE = int(os.getenv("LLM_embedding_batch_size", "256"))
+# "qdrant" or "local" (in-process search over a memory-mapped matrix, no network hop)
+VECTOR_BACKEND = get_vector_backend()
+# Local backend only: "exact" or an approximate index for large stores - "ivf_pq" or "ivf_int8"
+VECTOR_INDEX = os.getenv("Vector_index", "exact")
+VECTOR_NPROBE = int(os.getenv("Vector_nprobe", "8"))
+# find_similar mode: "dense" (vectors only), "lexical" (BM25 only) or "hybrid" (both, fused by rank)
+SEARCH_MODE = os.getenv("Search_mode", "dense")
+# Results taken from each ranking before the fusion
+FUSION_CANDIDATES = 50
 
 class SimpleDocumentSearch:
     def __init__(self, openai_key: str, qdrant_url: str, qdrant_key: str):
-        """Start the search engine with API keys"""
-        # Setup OpenAI
-        openai.api_key = openai_key
+        """Start the search engine with API keys (OpenAI requests use the shared client configured from .env)"""
+        self.backend = VECTOR_BACKEND
+        # Keyword index of the same documents (exact dates, IDs and model names)
+        self.lexical = BM25Index("my_documents_local" if self.backend == "local" else "my_documents")
+        # Document bodies by content hash - payloads keep only the hash and metadata
+        self.documents = DocumentStore("my_documents_local" if self.backend == "local" else "my_documents")
+        if self.backend == "local":
+            self.store = LocalVectorStore("my_documents", dim=1536)
+            print(f"Using local vector store: {self.store.folder} ({self.store.count()} documents)")
+            for field in ("date_int", "file_name"):
+                self.store.create_payload_index(field)
+            self.index = None
+            if VECTOR_INDEX.startswith("ivf_"):
+                self.index = open_ivf_index(self.store, VECTOR_INDEX[len("ivf_"):], nprobe=VECTOR_NPROBE)
+            return
         
         # Connect to Qdrant database
         try:
@@ -36,9 +71,24 @@ class SimpleDocumentSearch:
                 print("Created new collection: my_documents")
             else:
                 print("Using existing collection: my_documents")
+
                 
         except Exception as e:
             print(f"Error connecting to database: {e}")
+
+        # Index the hash, so duplicate checks do not scan every payload, and the
+        # report date and file name, so filtered searches only score matching points
+        for field_name, field_schema in (("content_hash", models.PayloadSchemaType.KEYWORD),
+                                         ("date_int", models.PayloadSchemaType.INTEGER),
+                                         ("file_name", models.PayloadSchemaType.KEYWORD)):
+            try:
+                self.db.create_payload_index(
+                    collection_name="my_documents",
+                    field_name=field_name,
+                    field_schema=field_schema
+                )
+            except Exception as e:
+                print(f"Error creating the {field_name} index: {e}")
         
     def convert_text_to_vector(self, text: str) -> List[float]:
         """Convert text into numbers that AI can understand"""
@@ -47,24 +97,15 @@ class SimpleDocumentSearch:
             if not text.strip():
                 raise ValueError("Empty text provided")
                 
-            response = openai.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text
-            )
-            
-            # Access the embedding using the correct response structure
-            if hasattr(response, 'data') and len(response.data) > 0:
-                vector = response.data[0].embedding
+            # Texts embedded before are read from the local embedding cache
+            vector = embed_text(text, model="text-embedding-ada-002")
                 
-                # Verify vector dimension
-                if len(vector) != 1536:
-                    print(f"Warning: Expected 1536 dimensions, got {len(vector)}")
-                    return None
-                    
-                return vector
-            else:
-                print("Error: Invalid response structure from OpenAI API")
+            # Verify vector dimension
+            if len(vector) != 1536:
+                print(f"Warning: Expected 1536 dimensions, got {len(vector)}")
                 return None
+                
+            return vector
             
         except AttributeError as e:
             print(f"Error accessing embedding data: {e}")
@@ -73,96 +114,402 @@ class SimpleDocumentSearch:
             print(f"Error creating embedding: {e}")
             return None
 
-    def save_files(self, folder_path: str):
-        """Save all text files from a folder to the database"""
-        import hashlib
+    def load_existing_hashes(self, page_size: int = 1000) -> set:
+        """Content hashes of all stored documents, read page by page without vectors"""
+        if self.backend == "local":
+            return self.store.payload_values("content_hash")
+        hashes = set()
+        offset = None
+        while True:
+            points, offset = self.db.scroll(
+                collection_name="my_documents",
+                limit=page_size,
+                offset=offset,
+                with_payload=["content_hash"],
+                with_vectors=False
+            )
+            hashes.update(point.payload["content_hash"] for point in points if point.payload and point.payload.get("content_hash"))
+            if offset is None:
+                return hashes
+
+    def delete_points(self, entries: List[Dict]):
+        """Delete the points of manifest entries (by ID, or by path and hash for points stored without one)"""
+        point_ids = [entry["id"] for entry in entries if entry.get("id")]
+        self.lexical.remove(point_ids)
+        if self.backend == "local":
+            for entry in entries:
+                if not entry.get("id"):
+                    point_ids += self.store.find_ids(file_path=entry["file_path"], content_hash=entry["hash"])
+            self.store.delete(point_ids)
+            return
+        if point_ids:
+            self.db.delete(collection_name="my_documents", points_selector=models.PointIdsList(points=point_ids))
+        for entry in entries:
+            if not entry.get("id"):
+                self.db.delete(
+                    collection_name="my_documents",
+                    points_selector=models.FilterSelector(filter=models.Filter(must=[
+                        models.FieldCondition(key="file_path", match=models.MatchValue(value=entry["file_path"])),
+                        models.FieldCondition(key="content_hash", match=models.MatchValue(value=entry["hash"]))
+                    ]))
+                )
+
+    def requeue_duplicates(self, manifest: IndexManifest, deleted_entries: List[Dict]) -> List[Tuple]:
+        """
+        Files skipped as duplicates (manifest entries without an ID) rely on the point of another
+        file with the same content. When no stored file has that content any more, the first
+        duplicate of each hash is read again to be saved with its own point.
+        """
+        stored_hashes = {entry["hash"] for entry in manifest.entries.values() if entry["id"]}
+        lost_hashes = {entry["hash"] for entry in deleted_entries if entry["id"]} - stored_hashes
+        requeued = []
+        for path, entry in list(manifest.entries.items()):
+            if entry["id"] or entry["hash"] not in lost_hashes:
+                continue
+            manifest.remove(path)
+            try:
+                file_path = Path(entry["file_path"])
+                stat = file_path.stat()
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    text_content = file.read()
+            except OSError as e:
+                print(f"Error processing file {entry['file_path']}: {e}")
+                continue
+            content_hash = hashlib.md5(text_content.encode()).hexdigest()
+            requeued.append((file_path, stat, text_content, content_hash))
+            if content_hash == entry["hash"]:
+                # The other duplicates rely on this file's point from now on
+                lost_hashes.discard(content_hash)
+        if requeued:
+            print(f"Re-queued {len(requeued)} duplicate files whose stored copy was removed")
+        return requeued
+
+    def count_documents(self) -> int:
+        if self.backend == "local":
+            return self.store.count()
+        return self.db.count(collection_name="my_documents").count
+
+    def save_files(self, folder_path: str, batch_size: int = EMBEDDING_BATCH_SIZE):
+        """
+        Save all text files from a folder to the database (embedded in batches).
+        Only added, changed and removed files are processed - the rest is known from the local manifest.
+        """
         
+        manifest = IndexManifest("my_documents_local" if self.backend == "local" else "my_documents")
+        if manifest.entries and self.count_documents() == 0:
+            # The collection was emptied - the manifest no longer describes it
+            manifest.clear()
+            self.lexical.clear()
+
         # Get all .txt files from the folder
-        all_files = Path(folder_path).glob('*.txt')
+        all_files = sorted(Path(folder_path).glob('*.txt'))
         file_counter = 0
         skipped = 0
+        unchanged = 0
+        new_files = []
+        existing_hashes = None
         
         for file_path in all_files:
             try:
+                stat = file_path.stat()
+                entry = manifest.get(str(file_path))
+                if manifest.is_unchanged(str(file_path), stat) and (not entry["id"] or entry["id"] in self.lexical):
+                    unchanged += 1
+                    continue
+
                 # Read the file
                 with open(file_path, 'r', encoding='utf-8') as file:
                     text_content = file.read()
                 
                 # Create content hash
                 content_hash = hashlib.md5(text_content.encode()).hexdigest()
-                
-                # Check if document exists by searching for hash
-                existing_docs = self.db.scroll(
-                    collection_name="my_documents",
-                    scroll_filter=models.Filter(
-                        must=[
-                            models.FieldCondition(
-                                key="content_hash",
-                                match={"value": content_hash}
-                            )
-                        ]
-                    )
-                )[0]
-                
-                if existing_docs:
-                    print(f"Skipping {file_path.name} - already exists")
-                    skipped += 1
+
+                previous = manifest.get(str(file_path))
+                if previous and previous["hash"] == content_hash:
+                    # Only touched (or stored before the keyword index) - remember the new modification time
+                    if previous["id"] and previous["id"] not in self.lexical:
+                        self.lexical.add(previous["id"], text_content)
+                    manifest.set(str(file_path), stat, content_hash, previous["id"])
+                    unchanged += 1
                     continue
-                    
-                # Convert text to vector
-                text_vector = self.convert_text_to_vector(text_content)
-                
-                if text_vector:
-                    file_counter += 1
-                    self.db.upsert(
-                        collection_name="my_documents",
-                        points=[{
-                            "id": file_counter,
-                            "vector": text_vector,
-                            "payload": {
-                                "file_path": str(file_path),
-                                "file_name": file_path.name,
-                                "content": text_content,
-                                "content_hash": content_hash
-                            }
-                        }]
-                    )
-                    print(f"Saved file {file_path.name} with ID: {file_counter}")
+
+                if previous is None:
+                    if existing_hashes is None:
+                        # One paged pass over the stored hashes instead of a query per file
+                        existing_hashes = self.load_existing_hashes()
+                    # Check if document exists (or was already found in this folder)
+                    if content_hash in existing_hashes:
+                        print(f"Skipping {file_path.name} - already exists")
+                        manifest.set(str(file_path), stat, content_hash, None)
+                        skipped += 1
+                        continue
+                    existing_hashes.add(content_hash)
+
+                new_files.append((file_path, stat, text_content, content_hash))
                     
             except Exception as e:
                 print(f"Error processing file {file_path}: {e}")
+
+        # Files that disappeared from the folder are removed from the database
+        current_paths = {os.path.abspath(file_path) for file_path in all_files}
+        removed = [path for path in manifest.paths_under(folder_path) if path not in current_paths]
+        if removed:
+            try:
+                removed_entries = [manifest.entries[path] for path in removed]
+                self.delete_points(removed_entries)
+                for path in removed:
+                    manifest.remove(path)
+                print(f"Removed {len(removed)} deleted files from the database")
+                new_files += self.requeue_duplicates(manifest, removed_entries)
+            except Exception as e:
+                print(f"Error removing deleted files: {e}")
+
+        # Convert texts to vectors - many files per request instead of one request per file
+        # new_files can grow while saving (duplicates of changed files are re-queued)
+        batch_start = 0
+        while batch_start < len(new_files):
+            start = batch_start
+            batch = new_files[start:start + batch_size]
+            batch_start += len(batch)
+            text_vectors = embed_texts([text_content for _, _, text_content, _ in batch], batch_size=batch_size)
+
+            points = []
+            stored = []
+            texts = {}
+            for (file_path, stat, text_content, content_hash), text_vector in zip(batch, text_vectors):
+                if not text_vector:
+                    print(f"Error processing file {file_path}: no embedding")
+                    continue
+                if len(text_vector) != 1536:
+                    print(f"Warning: Expected 1536 dimensions, got {len(text_vector)} for {file_path.name}")
+                    continue
+                point_id = stable_point_id(str(file_path), content_hash)
+                payload = {
+                    "file_path": str(file_path),
+                    "file_name": file_path.name,
+                    "content_hash": content_hash
+                }
+                # Reports are named (or start) with their date - stored for date filters
+                report_date = parse_report_date(file_path.name, text_content)
+                if report_date:
+                    payload["date"] = report_date.isoformat()
+                    payload["date_int"] = date_to_int(report_date)
+                points.append({
+                    "id": point_id,
+                    "vector": text_vector,
+                    "payload": payload
+                })
+                texts[point_id] = (content_hash, text_content)
+                stored.append((file_path, stat, content_hash, point_id))
+
+            if not points:
+                continue
+            try:
+                # Bodies first, so a stored point always has its text
+                self.documents.put_many(dict(texts.values()))
+                if self.backend == "local":
+                    self.store.upsert(points)
+                else:
+                    self.db.upsert(collection_name="my_documents", points=points)
+                for point in points:
+                    self.lexical.add(point["id"], texts[point["id"]][1])
+                # Changed files - drop the point of the previous content
+                outdated = [manifest.get(str(file_path)) for file_path, _, _, _ in stored if manifest.get(str(file_path))]
+                if outdated:
+                    self.delete_points(outdated)
+                for file_path, stat, content_hash, point_id in stored:
+                    manifest.set(str(file_path), stat, content_hash, point_id)
+                new_files += self.requeue_duplicates(manifest, outdated)
+                manifest.save()
+                file_counter += len(points)
+                print(f"Saved {len(points)} files")
+            except Exception as e:
+                print(f"Error saving files {start + 1}-{start + len(batch)}: {e}")
+
+        manifest.save()
+        self.lexical.save()
+        # Bodies of removed and changed files are no longer referenced
+        pruned = self.documents.prune(entry["hash"] for entry in manifest.entries.values())
+
+        if self.backend == "local" and self.index is not None:
+            # Index the appended vectors (trained on the first run with enough documents)
+            self.index.update(self.store)
+            if self.index.trained:
+                save_ivf_index(self.store, self.index)
         
         print(f"\nProcessing complete:")
         print(f"Files saved: {file_counter}")
+        print(f"Files unchanged: {unchanged}")
         print(f"Files skipped: {skipped}")
+        print(f"Files removed: {len(removed)}")
+        print(f"Document bodies pruned: {pruned}")
+        print_embedding_cache_stats()
 
-    def find_similar(self, search_text: str, max_results: int = 3) -> List[Dict]:
-        """Find similar documents to your search text"""
-        try:
-            # Convert search text to vector
-            search_vector = self.convert_text_to_vector(search_text)
-            
-            # Search in database
-            found_docs = self.db.search(
+    def search_vectors(self, search_vectors: List[Optional[List[float]]], limit: int,
+                       query_filter: Optional[Dict] = None) -> List[List]:
+        """
+        Dense search of many query vectors in the configured backend - one batch request
+        (or one matrix product) for all of them. Hits (.id, .score, .payload) in input order.
+        """
+        positions = [position for position, vector in enumerate(search_vectors) if vector]
+        found_docs = [[] for _ in search_vectors]
+        if not positions:
+            return found_docs
+        vectors = [search_vectors[position] for position in positions]
+        if self.backend == "local" and self.index is not None:
+            hits = self.index.search_batch(self.store, vectors, limit=limit, query_filter=query_filter)
+        elif self.backend == "local":
+            hits = self.store.search_batch(vectors, limit=limit, query_filter=query_filter)
+        else:
+            qdrant_filter = self.to_qdrant_filter(query_filter)
+            hits = self.db.search_batch(
                 collection_name="my_documents",
-                query_vector=search_vector,
-                limit=max_results
+                requests=[models.SearchRequest(vector=vector, filter=qdrant_filter, limit=limit, with_payload=True)
+                          for vector in vectors]
             )
-            
-            # Make results easy to read
-            results = []
-            for doc in found_docs:
-                results.append({
+        for position, docs in zip(positions, hits):
+            found_docs[position] = docs
+        return found_docs
+
+    @staticmethod
+    def make_filter(date_from=None, date_to=None, file_names: Optional[List[str]] = None) -> Optional[Dict]:
+        """Payload filter for a date range (dates or "YYYY-MM-DD", both ends included) and file names"""
+        query_filter = {}
+        if date_from or date_to:
+            query_filter["date_int"] = {
+                "gte": date_to_int(date_from) if date_from else None,
+                "lte": date_to_int(date_to) if date_to else None
+            }
+        if file_names:
+            query_filter["file_name"] = {"any": list(file_names)}
+        return query_filter or None
+
+    @staticmethod
+    def to_qdrant_filter(query_filter: Optional[Dict]):
+        if not query_filter:
+            return None
+        conditions = []
+        if "date_int" in query_filter:
+            conditions.append(models.FieldCondition(key="date_int", range=models.Range(**query_filter["date_int"])))
+        if "file_name" in query_filter:
+            conditions.append(models.FieldCondition(key="file_name", match=models.MatchAny(any=query_filter["file_name"]["any"])))
+        return models.Filter(must=conditions)
+
+    def filter_ids(self, query_filter: Dict) -> List[str]:
+        """Point IDs of the documents matching a filter (narrows the keyword search)"""
+        if self.backend == "local":
+            return self.store.filter_ids(query_filter)
+        point_ids = []
+        offset = None
+        while True:
+            points, offset = self.db.scroll(
+                collection_name="my_documents",
+                scroll_filter=self.to_qdrant_filter(query_filter),
+                limit=1000,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            point_ids.extend(str(point.id) for point in points)
+            if offset is None:
+                return point_ids
+
+    def get_payloads(self, point_ids: List[str]) -> Dict:
+        """Payloads of stored documents by point ID"""
+        if not point_ids:
+            return {}
+        if self.backend == "local":
+            return self.store.retrieve(point_ids)
+        records = self.db.retrieve(collection_name="my_documents", ids=point_ids, with_payload=True, with_vectors=False)
+        return {str(record.id): record.payload for record in records}
+
+    def load_contents(self, docs: List[Dict]) -> List[Dict]:
+        """Fill in the bodies of found documents - one lookup for all of them"""
+        missing = [doc for doc in docs if doc.get("content") is None and doc.get("content_hash")]
+        if missing:
+            bodies = self.documents.get_many(doc["content_hash"] for doc in missing)
+            for doc in missing:
+                doc["content"] = bodies.get(doc["content_hash"], "")
+        return docs
+
+    def find_similar(self, search_text: str, max_results: int = 3, mode: str = SEARCH_MODE,
+                     date_from=None, date_to=None, file_names: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Find similar documents to your search text.
+        mode: "dense" (embeddings), "lexical" (BM25 keywords) or "hybrid" (both rankings fused with RRF)
+        date_from / date_to ("YYYY-MM-DD", inclusive) and file_names limit the search to matching
+        documents before they are scored.
+        """
+        return self.find_similar_many([search_text], max_results, mode, date_from, date_to, file_names)[0]
+
+    def find_similar_many(self, search_texts: List[str], max_results: int = 3, mode: str = SEARCH_MODE,
+                          date_from=None, date_to=None, file_names: Optional[List[str]] = None) -> List[List[Dict]]:
+        """
+        Find similar documents for many search texts at once: one batched embedding call
+        and one batch search instead of two round-trips per text. Results are in input order.
+        """
+        try:
+            query_filter = self.make_filter(date_from, date_to, file_names)
+            search_vectors = [None] * len(search_texts)
+            if mode != "lexical":
+                # Convert all search texts to vectors in one request (cached texts are not sent again)
+                search_vectors = embed_texts(search_texts)
+                for position, vector in enumerate(search_vectors):
+                    if not vector or len(vector) != 1536:
+                        print(f"Warning: no valid embedding for search text {position + 1}")
+                        search_vectors[position] = None
+
+            # Search in database
+            limit = max_results if mode == "dense" else max(max_results, FUSION_CANDIDATES)
+            found_docs = self.search_vectors(search_vectors, limit, query_filter) if mode != "lexical" else [[] for _ in search_texts]
+
+            if mode == "dense":
+                # Make results easy to read
+                return [[{
                     "file_name": doc.payload["file_name"],
-                    "content": doc.payload["content"],
+                    # Filled in by load_contents for the documents that are used
+                    "content": doc.payload.get("content"),
+                    "content_hash": doc.payload.get("content_hash"),
                     "similarity": round(doc.score, 2)
-                })
-            
-            return results
+                } for doc in docs] for docs in found_docs]
+
+            # The keyword search is limited to the documents matching the filter
+            allowed_ids = self.filter_ids(query_filter) if query_filter else None
+            fused_rankings = []
+            for search_text, docs in zip(search_texts, found_docs):
+                rankings = [[doc_id for doc_id, _ in self.lexical.search(search_text, limit=limit, doc_ids=allowed_ids)]]
+                if mode == "hybrid":
+                    rankings.append([str(doc.id) for doc in docs])
+                fused_rankings.append(reciprocal_rank_fusion(rankings)[:max_results])
+
+            # Documents found only by keywords need their payloads - one lookup for all texts
+            dense_payloads = {str(doc.id): doc.payload for docs in found_docs for doc in docs}
+            payloads = self.get_payloads(list({doc_id for fused in fused_rankings for doc_id, _ in fused
+                                               if doc_id not in dense_payloads}))
+            payloads.update(dense_payloads)
+
+            all_results = []
+            for fused, docs in zip(fused_rankings, found_docs):
+                similarities = {str(doc.id): doc.score for doc in docs}
+                results = []
+                for doc_id, score in fused:
+                    payload = payloads.get(doc_id)
+                    if not payload:
+                        continue
+                    results.append({
+                        "file_name": payload["file_name"],
+                        "content": payload.get("content"),
+                        "content_hash": payload.get("content_hash"),
+                        # Cosine similarity when the dense search found the document too
+                        "similarity": round(similarities[doc_id], 2) if doc_id in similarities else None,
+                        "score": round(score, 4)
+                    })
+                all_results.append(results)
+            return all_results
             
         except Exception as e:
             print(f"Error searching: {e}")
-            return []
+            return [[] for _ in search_texts]
 
 # Example usage:
 if __name__ == "__main__":
@@ -182,6 +529,8 @@ if __name__ == "__main__":
     
     # Search for something
     results = search.find_similar("kradzież prototypu")
+    # Only reports from a date range (dates are read from the file names when saving)
+    #results = search.find_similar("kradzież prototypu", date_from="2024-01-01", date_to="2024-12-31")
     
     # Show results
     for result in results:
@@ -1,14 +1,21 @@
 from typing import List, Dict
-import openai
+import asyncio
 from dotenv import load_dotenv
 import os
+import sys
 from VectorDatabaseSearch import SimpleDocumentSearch
 import requests
 import json
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.llm import async_create_chat_completion, create_chat_completion
+from lib.prompts import build_messages, normalize_prompt
+
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
+LLM_CONCURRENCY = int(os.getenv("LLM_concurrency", "10")) # max answers requested at the same time in get_answers
 
 class DocumentBasedAnswering:
     def __init__(self):
@@ -21,9 +28,6 @@ class DocumentBasedAnswering:
             qdrant_url=os.getenv("Qdrant_URL"),
             qdrant_key=os.getenv("Qdrant_APIkey")
         )
-        
-        # Setup OpenAI
-        openai.api_key = os.getenv("OpenAI_APIkey")
 
     def save_files_to_db(self, folder_path: str):
         """Trigger save_files method from search engine"""
@@ -31,11 +35,30 @@ class DocumentBasedAnswering:
 
     def format_context(self, similar_docs: List[Dict]) -> str:
         """Format similar documents into context string"""
+        # Bodies are read from the local document store only for the documents used here
+        self.search_engine.load_contents(similar_docs)
         context = "Relevant information from documents:\n\n"
         for doc in similar_docs:
             context += f"From file '{doc['file_name']}':\n{doc['content']}\n\n"
         return context
 
+    def build_answer_messages(self, question: str, additional_information: str, similar_docs: List[Dict]) -> List[Dict]:
+        """Prompt for one question and the documents found for it"""
+        # Format context from similar documents
+        context = self.format_context(similar_docs)
+        
+        # Create prompt for GPT - the instructions are the same for every question,
+        # so they go first and the retrieved context and question last
+        instructions = f"""You are a helpful assistant that answers questions based on the provided document context.
+        Based on the following context, please answer the question.
+        If the answer cannot be derived from the context, say so.
+        {additional_information}"""
+        prompt = f"""Context:
+        {context}
+        
+        Question: {question}"""
+        return build_messages(instructions, normalize_prompt(prompt))
+
     def get_answer(self, question: str, additional_information: str, max_docs: int = 3) -> str:
         """Get answer based on similar documents"""
         try:
@@ -50,26 +73,10 @@ class DocumentBasedAnswering:
             for doc in similar_docs:
                 print(f"File: {doc['file_name']}, Similarity: {doc['similarity']}")
             
-            # Format context from similar documents
-            context = self.format_context(similar_docs)
-            
-            # Create prompt for GPT
-            prompt = f"""Based on the following context, please answer the question. 
-            If the answer cannot be derived from the context, say so.
-            {additional_information}
-            
-            Context:
-            {context}
-            
-            Question: {question}"""
-            
             # Get response from OpenAI
-            response = openai.chat.completions.create(
+            response = create_chat_completion(
                 model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided document context."},
-                    {"role": "user", "content": prompt}
-                ]
+                messages=self.build_answer_messages(question, additional_information, similar_docs)
             )
             
             return response.choices[0].message.content
@@ -77,6 +84,41 @@ class DocumentBasedAnswering:
         except Exception as e:
             return f"Error getting answer: {e}"
 
+    async def get_answer_async(self, question: str, additional_information: str, similar_docs: List[Dict],
+                               semaphore: asyncio.Semaphore) -> str:
+        if not similar_docs:
+            return "No relevant documents found to answer the question."
+        async with semaphore:
+            try:
+                response = await async_create_chat_completion(
+                    model="gpt-4o-mini",
+                    messages=self.build_answer_messages(question, additional_information, similar_docs)
+                )
+                return response.choices[0].message.content
+            except Exception as e:
+                return f"Error getting answer: {e}"
+
+    def get_answers(self, questions: List[str], additional_information: str, max_docs: int = 3,
+                    concurrency: int = LLM_CONCURRENCY) -> List[str]:
+        """
+        Answer many questions: one batched embedding call and one batch search for all of them,
+        then the answers are requested concurrently. Answers are in the order of the questions.
+        """
+        similar_docs_per_question = self.search_engine.find_similar_many(questions, max_docs)
+        print(f"Found documents for {sum(1 for docs in similar_docs_per_question if docs)} of {len(questions)} questions.")
+        # One document store lookup for the bodies of all questions
+        self.search_engine.load_contents([doc for docs in similar_docs_per_question for doc in docs])
+
+        async def answer_all():
+            semaphore = asyncio.Semaphore(concurrency)
+            # gather returns the answers in the order of the questions
+            return await asyncio.gather(*[
+                self.get_answer_async(question, additional_information, similar_docs, semaphore)
+                for question, similar_docs in zip(questions, similar_docs_per_question)
+            ])
+
+        return list(asyncio.run(answer_all()))
+
 def send_results(task, api_key, data, URL: str, ):
 
     # Set up the headers
@@ -2,10 +2,14 @@ import requests
 import json
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
+import sys
+
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+
+from lib.llm import chat_completion
 
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 class DBAPIClient:
     def __init__(self, api_key, base_url="YOUR_API_ENDPOINT"):
@@ -31,11 +35,8 @@ class DBAPIClient:
 def get_ai_answer(question, context):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             #model="gpt-4o",
             messages=[
@@ -43,9 +44,6 @@ def get_ai_answer(question, context):
                 {"role": "user", "content": f'{question}'}
             ]
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -1,17 +1,20 @@
-import openai
 import requests
 import json
 from typing import Dict, Optional
 import os
+import sys
 from dotenv import load_dotenv
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.llm import create_chat_completion
+
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 class CitySearchAssistant:
     def __init__(self, api_key, openai_api_key: str):
         self.openai_api_key = openai_api_key
-        openai.api_key = openai_api_key
         self.api_key = api_key
         
     def get_suggestion(self, context, user_input: str) -> str:
@@ -20,7 +23,7 @@ class CitySearchAssistant:
             {"role": "user", "content": f'{user_input}. Here you have additional information for next suggestions:\n "{context}"' }
         ]
         
-        response = openai.chat.completions.create(
+        response = create_chat_completion(
             model="gpt-4o-mini",
             messages=messages,
             temperature=0.7
@@ -1,14 +1,18 @@
 import json
 from dotenv import load_dotenv
 import os
+import sys
 import requests
 import re
 from urllib.parse import urlparse
-from openai import OpenAI
 import base64
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+
+from lib.llm import chat_completion
+
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 
 def execute_query(api_key, query):
@@ -67,9 +71,6 @@ def download_photos(urls):
 
 def get_ai_answer_to_image(question, context, image_path=None, image_type="png"):
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
         # Encode the image if provided
         image_data = None
         if image_path:
@@ -94,15 +95,12 @@ def get_ai_answer_to_image(question, context, image_path=None, image_type="png")
             }
         ]
 
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             #model="gpt-4o",
             messages=messages
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
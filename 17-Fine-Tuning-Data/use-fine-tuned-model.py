@@ -2,32 +2,37 @@ import json
 import openai
 from dotenv import load_dotenv
 import os
+import sys
 import requests
-from openai import OpenAI
+
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+
+from lib.llm import chat_completion
+from lib.openai_batch import run_chat_batch
 
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
+BATCH_MODE = os.getenv("LLM_batch", "0") == "1" # classify all rows with one Batch API job
+BATCH_FILE = os.path.join(root_folder, 'batch', 'research_batch.jsonl')
+MODEL = "ft:gpt-4o-mini-2024-07-18:personal:ai-devs3-task-17-research:AZMdnVBN" # Mine fine-tuned model
+#MODEL = "gpt-4o"
+
+def build_messages(dataset_content):
+    return [
+        {"role": "system", "content": "Classify the dataset if it is correct or incorrect"},
+        {"role": "user", "content": dataset_content}
+    ]
    
 def get_ai_answer(dataset_content):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
-            model="ft:gpt-4o-mini-2024-07-18:personal:ai-devs3-task-17-research:AZMdnVBN", # Mine fine-tuned model
-            #model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Classify the dataset if it is correct or incorrect"},
-                {"role": "user", "content": dataset_content}
-            ]
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
+            model=MODEL,
+            messages=build_messages(dataset_content)
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -109,13 +114,27 @@ def main():
 
     results = []
 
-    # Process each entry
-    for entry in dataset:
-        values_string = ",".join(map(str, entry['values']))
-        result = get_ai_answer(values_string)
-        print(f"ID: {entry['id']}, Result: {result}")
-        if result == 'correct':
-            results.append(entry['id'].strip())
+    if BATCH_MODE:
+        # Offline mode - one batch job instead of a request per row
+        # Requests are keyed by the row number, so rows with the same ID are all sent
+        messages_by_row = {
+            str(row): build_messages(",".join(map(str, entry['values'])))
+            for row, entry in enumerate(dataset)
+        }
+        answers = run_chat_batch(messages_by_row, MODEL, BATCH_FILE)
+        for row, entry in enumerate(dataset):
+            result = answers[str(row)]
+            print(f"ID: {entry['id']}, Result: {result}")
+            if result == 'correct':
+                results.append(entry['id'].strip())
+    else:
+        # Process each entry
+        for entry in dataset:
+            values_string = ",".join(map(str, entry['values']))
+            result = get_ai_answer(values_string)
+            print(f"ID: {entry['id']}, Result: {result}")
+            if result == 'correct':
+                results.append(entry['id'].strip())
     
     print("Results:")
     print(results)
@@ -1,15 +1,18 @@
 import requests
 from bs4 import BeautifulSoup
-import openai
 from typing import List, Dict, Tuple
 from urllib.parse import urljoin
 from dotenv import load_dotenv
 import os
+import sys
+
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.llm import create_chat_completion
 
 class WebpageSearcher:
     def __init__(self, api_key: str):
         self.visited_urls = set()
-        openai.api_key = api_key
         
     def fetch_webpage(self, url: str) -> str:
         try:
@@ -93,7 +96,7 @@ class WebpageSearcher:
         ANSWER: The final answer or "Not found"
         """
 
-        response = openai.chat.completions.create(
+        response = create_chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "Search the webpage for the information that will help you answer the question. DO NOT TAKE THE COMMENTS INTO ACCOUNT!"},
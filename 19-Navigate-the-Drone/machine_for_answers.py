@@ -1,12 +1,16 @@
 # machine_for_answers.py
 import os
-import openai
+import sys
 from dotenv import load_dotenv
 from typing import Dict, Optional
 import json
 import logging
 import base64
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.llm import create_chat_completion
+
 load_dotenv()
 
 class MachineForAnswers:
@@ -15,7 +19,6 @@ class MachineForAnswers:
         self.api_key = os.getenv('OpenAI_APIkey')
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
-        openai.api_key = self.api_key
         self.logger = logging.getLogger(__name__)
 
     def get_ai_answer(self, question, system_prompt):
@@ -23,7 +26,7 @@ class MachineForAnswers:
         try:
 
             # Get response from AI
-            response = openai.chat.completions.create(
+            response = create_chat_completion(
                 #model="gpt-4o-mini",
                 model="gpt-4o",
                 messages=[
@@ -39,7 +42,7 @@ class MachineForAnswers:
         except Exception as e:
             print(f"Error getting AI response: {e}")
             return None
-        
+
     def get_ai_answer_to_image(self, question, system_prompt, image_path=None, image_type="png"):
         try:
 
@@ -68,7 +71,7 @@ class MachineForAnswers:
             ]
 
             # Get response from AI
-            response = openai.chat.completions.create(
+            response = create_chat_completion(
                 #model="gpt-4o-mini",
                 model="gpt-4o",
                 messages=messages
@@ -1,13 +1,13 @@
 import requests
 import json
 from dotenv import load_dotenv
-from openai import OpenAI
+from lib.llm import chat_completion
+from lib.prompts import build_messages
 import os
 
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL = os.getenv("URL_zad2") # from the exercise 2
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 def get_ai_answer(question):
 
@@ -22,17 +22,12 @@ def get_ai_answer(question):
     - Aktualny rok to 1999
     '''
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
-            messages=[{"role": "user", "content": f'{question} + {context}'}]
+            # Static instructions first, the robot's question last
+            messages=build_messages(context, question)
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         print(f"question: {question}")
         print(f"AI generated answer: {ai_answer}")
         return ai_answer
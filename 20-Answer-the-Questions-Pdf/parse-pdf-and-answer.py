@@ -1,6 +1,6 @@
 import os
+import sys
 from PyPDF2 import PdfReader
-import openai
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
@@ -9,41 +9,51 @@ import io
 from PIL import Image
 import base64
 
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+from lib.embedding_cache import print_embedding_cache_stats
+from lib.embeddings import embed_text
+from lib.llm import ChatStream, create_chat_completion
+from lib.vector_store import LocalVectorStore, get_vector_backend
+
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI API key
-openai.api_key = os.getenv('OpenAI_APIkey')
-
 # Initialize Qdrant client with API key and cluster URL
 qdrant_api_key = os.getenv('Qdrant_APIkey')
 qdrant_url = os.getenv('Qdrant_URL') 
 
 # Create a Qdrant collection
 collection_name = "pdf_text_collection"
+# "qdrant" or "local" (in-process search over a memory-mapped matrix, no network hop)
+vector_backend = get_vector_backend()
 
-try:
-    qdrant_client = QdrantClient(
-        url=qdrant_url,
-        api_key=qdrant_api_key
-    )
+if vector_backend == "local":
+    local_store = LocalVectorStore(collection_name, dim=1536)
+    print(f"Using local vector store: {local_store.folder}")
+else:
+    try:
+        qdrant_client = QdrantClient(
+            url=qdrant_url,
+            api_key=qdrant_api_key
+        )
 
-    # Check if collection exists
-    if not qdrant_client.collection_exists("pdf_text_collection"):
-        # Create collection if it doesn't exist
-        qdrant_client.create_collection(
-            collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=1536,
-                distance=models.Distance.COSINE
+        # Check if collection exists
+        if not qdrant_client.collection_exists("pdf_text_collection"):
+            # Create collection if it doesn't exist
+            qdrant_client.create_collection(
+                collection_name=collection_name,
+                vectors_config=models.VectorParams(
+                    size=1536,
+                    distance=models.Distance.COSINE
+                )
             )
-        )
-        print(f"Created new collection: {collection_name}")
-    else:
-        print(f"Using existing collection: {collection_name}")
+            print(f"Created new collection: {collection_name}")
+        else:
+            print(f"Using existing collection: {collection_name}")
                 
-except Exception as e:
-    print(f"Error connecting to database: {e}")
+    except Exception as e:
+        print(f"Error connecting to database: {e}")
 
 def extract_text_from_pdf(pdf_path):
     """Extract text content from a PDF file."""
@@ -65,24 +75,15 @@ def get_openai_embedding(text):
         if not text.strip():
             raise ValueError("Empty text provided")
             
-        response = openai.embeddings.create(
-            model="text-embedding-ada-002",
-            input=text
-        )
-        
-        # Access the embedding using the correct response structure
-        if hasattr(response, 'data') and len(response.data) > 0:
-            vector = response.data[0].embedding
+        # Chunks and questions embedded before are read from the local embedding cache
+        vector = embed_text(text, model="text-embedding-ada-002")
             
-            # Verify vector dimension
-            if len(vector) != 1536:
-                print(f"Warning: Expected 1536 dimensions, got {len(vector)}")
-                return None
-                
-            return vector
-        else:
-            print("Error: Invalid response structure from OpenAI API")
+        # Verify vector dimension
+        if len(vector) != 1536:
+            print(f"Warning: Expected 1536 dimensions, got {len(vector)}")
             return None
+            
+        return vector
         
     except AttributeError as e:
         print(f"Error accessing embedding data: {e}")
@@ -102,10 +103,13 @@ def store_text_in_vector_db(text):
         # Create an embedding for each chunk
         embedding = get_openai_embedding(chunk)
         if embedding:
-            # Prepare the vector for Qdrant
-            vectors.append(models.PointStruct(id=i, vector=embedding, payload={"text": chunk}))
-    # Store the vectors in Qdrant
-    qdrant_client.upsert(collection_name=collection_name, points=vectors)
+            # Prepare the point (id, vector, payload)
+            vectors.append({"id": i, "vector": embedding, "payload": {"text": chunk}})
+    # Store the vectors in Qdrant (or the local store)
+    if vector_backend == "local":
+        local_store.upsert(vectors)
+    else:
+        qdrant_client.upsert(collection_name=collection_name, points=[models.PointStruct(**vector) for vector in vectors])
 
 def get_relevant_text(question, max_results=5):
     """Retrieve relevant text from the vector database."""
@@ -113,11 +117,14 @@ def get_relevant_text(question, max_results=5):
     question_embedding = get_openai_embedding(question)
     if question_embedding:
         # Query the vector database
-        search_result = qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=question_embedding,
-            limit=max_results
-        )
+        if vector_backend == "local":
+            search_result = local_store.search(question_embedding, limit=max_results)
+        else:
+            search_result = qdrant_client.search(
+                collection_name=collection_name,
+                query_vector=question_embedding,
+                limit=max_results
+            )
 
         # Retrieve the most relevant text chunks
         relevant_texts = [hit.payload['text'] for hit in search_result]
@@ -137,7 +144,7 @@ def get_answer_from_openai(context, question):
         prompt = f"""Context: {context}\n\nQuestion: {question}\n\nAnswer the question based on the context provided above."""
         
         # Make API call to OpenAI
-        response = openai.chat.completions.create(
+        response = create_chat_completion(
             #model="gpt-4o-mini",
             model="gpt-4o",
             messages=[
@@ -153,6 +160,25 @@ def get_answer_from_openai(context, question):
         print(f"Error getting answer from OpenAI: {str(e)}")
         return None
 
+def stream_answer_from_openai(context, question):
+    """Print the answer as it arrives and return it with its timings (time to first token, total time)."""
+    prompt = f"""Context: {context}\n\nQuestion: {question}\n\nAnswer the question based on the context provided above."""
+    stream = ChatStream(
+        model="gpt-4o",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant that answers questions based on the provided context."},
+            {"role": "user", "content": prompt}
+        ]
+    )
+    try:
+        for token in stream:
+            print(token, end="", flush=True)
+        print(f"\n\n[{stream.timings()}]")
+        return stream.text.strip()
+    except Exception as e:
+        print(f"\nError getting answer from OpenAI: {str(e)}")
+        return None
+
 # this method or LLM-answer-to-image one should be adjusted to extract only images that have text or possibly important information (skipping images of empty pages etc.)
 def extract_and_save_images_from_pdf(pdf_path, output_folder):
     """Extract images from a PDF file and save them as PNG files."""
@@ -204,7 +230,7 @@ def get_ai_answer_to_image(question, context, image_path=None, image_type="png")
         ]
 
         # Get response from AI
-        response = openai.chat.completions.create(
+        response = create_chat_completion(
             #model="gpt-4o-mini",
             model="gpt-4o",
             messages=messages
@@ -251,6 +277,7 @@ def main():
 
         print("Storing text in vector database...")
         store_text_in_vector_db(pdf_text)
+        print_embedding_cache_stats()
         
         # Interactive question-answering loop
         while True:
@@ -263,11 +290,10 @@ def main():
             relevant_text = get_relevant_text(question)
             
             print("\nGetting answer from OpenAI...")
-            answer = get_answer_from_openai(relevant_text, question)
+            print("\nAnswer: ", end="", flush=True)
+            answer = stream_answer_from_openai(relevant_text, question)
             
-            if answer:
-                print("\nAnswer:", answer)
-            else:
+            if not answer:
                 print("\nFailed to get an answer. Please try again.")
 
 if __name__ == "__main__":
@@ -1,8 +1,13 @@
 import requests
-from openai import OpenAI
+from lib.llm import async_chat_completion, chat_completion
+from lib.openai_batch import run_chat_batch
+from lib.rate_limiter import get_rate_limiter
+from lib.single_flight import print_single_flight_stats
 from dotenv import load_dotenv
+import asyncio
 import os
 import json
+import time
 from typing import List, Dict
 import re
 
@@ -12,6 +17,10 @@ URL = os.getenv("URL_zad3") # from the exercise 3
 URL_TXT_FILE = os.getenv("URL_text") # from the exercise 3
 OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 MY_API_KEY = os.getenv("APIkey")
+ASYNC_MODE = os.getenv("LLM_async", "1") != "0" # send the test blocks concurrently
+LLM_CONCURRENCY = int(os.getenv("LLM_concurrency", "10")) # max requests in flight in async mode
+BATCH_MODE = os.getenv("LLM_batch", "0") == "1" # answer the test blocks with one Batch API job
+BATCH_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "batch", "test_blocks_batch.jsonl")
 
 
 def download_json_file(URL_TXT_FILE: str) -> dict:
@@ -64,27 +73,29 @@ def validate_math_answer(question: str, given_answer: int) -> tuple:
         print(f"Error validating math problem: {e}")
         return False, None
 
+def build_test_block_messages(test_block: Dict) -> List[Dict]:
+    """
+    Build the LLM messages for a test block
+    """
+    # Format the test block for LLM
+    prompt = f"Please answer the following question accurately:\n"
+    prompt += f"Question: {test_block['q']}\n"
+
+    return [
+        {"role": "system", "content": "You are a knowledgeable assistant. Please provide accurate answers to questions. Return only the answer without explanation."},
+        {"role": "user", "content": prompt}
+    ]
+
 def process_test_block_with_llm(test_block: Dict, api_key: str) -> Dict:
     """
     Process a test block using LLM
     Modify this function to work with your specific LLM API
     """
     try:
-        # Format the test block for LLM
-        prompt = f"Please answer the following question accurately:\n"
-        prompt += f"Question: {test_block['q']}\n"
-
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        response = client.chat.completions.create(
+        response = chat_completion(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a knowledgeable assistant. Please provide accurate answers to questions. Return only the answer without explanation."},
-                {"role": "user", "content": prompt}
-            ]
+            messages=build_test_block_messages(test_block)
         )
-    
-        response = response.choices[0].message.content
 
         return {"q": test_block['q'], "a": response}
     
@@ -92,6 +103,41 @@ def process_test_block_with_llm(test_block: Dict, api_key: str) -> Dict:
         print(f"Error processing test block with LLM: {e}")
         return test_block
 
+async def process_test_block_with_llm_async(test_block: Dict, api_key: str, semaphore: asyncio.Semaphore) -> Dict:
+    """
+    Async version of process_test_block_with_llm, limited by the shared semaphore
+    """
+    async with semaphore:
+        try:
+            response = await async_chat_completion(
+                model="gpt-4o-mini",
+                messages=build_test_block_messages(test_block)
+            )
+
+            return {"q": test_block['q'], "a": response}
+
+        except Exception as e:
+            print(f"Error processing test block with LLM: {e}")
+            return test_block
+
+def correct_math_item(item: Dict) -> Dict:
+    """
+    Copy the item and fix the answer if it is a wrong math result
+    """
+    processed_item = item.copy()
+
+    # Check if it's a math problem
+    if is_math_problem(item['question']):
+        is_correct, correct_answer = validate_math_answer(item['question'], item['answer'])
+        
+        if not is_correct:
+            print(f"Math error found in: {item['question']}")
+            processed_item['original_answer'] = item['answer']
+            processed_item['answer'] = correct_answer
+            processed_item['corrected'] = True
+
+    return processed_item
+
 def process_data(data: Dict, api_key: str) -> Dict:
     """
     Process the entire dataset, handling both math problems and test blocks
@@ -103,17 +149,7 @@ def process_data(data: Dict, api_key: str) -> Dict:
     print(f"Processing {len(test_data)} items...")
     
     for item in test_data:
-        processed_item = item.copy()
-        
-        # Check if it's a math problem
-        if is_math_problem(item['question']):
-            is_correct, correct_answer = validate_math_answer(item['question'], item['answer'])
-            
-            if not is_correct:
-                print(f"Math error found in: {item['question']}")
-                processed_item['original_answer'] = item['answer']
-                processed_item['answer'] = correct_answer
-                processed_item['corrected'] = True
+        processed_item = correct_math_item(item)
         
         # Check if there's a test block
         if 'test' in item:
@@ -125,6 +161,69 @@ def process_data(data: Dict, api_key: str) -> Dict:
     processed_data['test-data'] = processed_test_data
     return processed_data
 
+async def process_data_async(data: Dict, api_key: str, concurrency: int = LLM_CONCURRENCY) -> Dict:
+    """
+    Process the dataset like process_data, but send the test blocks to the LLM
+    concurrently (at most `concurrency` requests at once). Output order matches the input.
+    """
+    start_time = time.perf_counter()
+    processed_data = data.copy()
+    test_data = data.get('test-data', [])
+
+    print(f"Processing {len(test_data)} items (async, concurrency: {concurrency})...")
+
+    # Math checks are local and fast, test blocks are collected for the LLM
+    processed_test_data = [correct_math_item(item) for item in test_data]
+    test_block_indexes = [index for index, item in enumerate(test_data) if 'test' in item]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    test_blocks = await asyncio.gather(*[
+        process_test_block_with_llm_async(test_data[index]['test'], api_key, semaphore)
+        for index in test_block_indexes
+    ])
+
+    # gather returns results in the order of the tasks, so they map back by index
+    for index, test_block in zip(test_block_indexes, test_blocks):
+        processed_test_data[index]['test'] = test_block
+
+    elapsed = max(time.perf_counter() - start_time, 1e-6)
+    print(f"Processed {len(test_data)} items ({len(test_block_indexes)} test blocks) in {elapsed:.2f}s "
+          f"- {len(test_data) / elapsed:.1f} items/s, {len(test_block_indexes) / elapsed:.1f} test blocks/s")
+    print(f"Rate limiter: {get_rate_limiter('gpt-4o-mini').stats()}")
+    # Duplicate test questions in flight at the same time are sent only once
+    print_single_flight_stats()
+
+    processed_data['test-data'] = processed_test_data
+    return processed_data
+
+def process_data_batch(data: Dict, api_key: str) -> Dict:
+    """
+    Process the dataset like process_data, but answer all test blocks with one
+    OpenAI Batch API job (cheaper, no per-minute rate limits, results within 24h)
+    """
+    processed_data = data.copy()
+    test_data = data.get('test-data', [])
+
+    print(f"Processing {len(test_data)} items (batch mode)...")
+
+    processed_test_data = [correct_math_item(item) for item in test_data]
+
+    # The item index is the batch custom_id, so answers map back to their items
+    messages_by_id = {
+        f"item-{index}": build_test_block_messages(item['test'])
+        for index, item in enumerate(test_data) if 'test' in item
+    }
+    answers = run_chat_batch(messages_by_id, "gpt-4o-mini", BATCH_FILE)
+
+    for custom_id, answer in answers.items():
+        index = int(custom_id.split('-')[1])
+        test_block = test_data[index]['test']
+        # Failed requests keep the original test block, like process_test_block_with_llm does
+        processed_test_data[index]['test'] = {"q": test_block['q'], "a": answer} if answer is not None else test_block
+
+    processed_data['test-data'] = processed_test_data
+    return processed_data
+
 def save_results(data: Dict, output_file: str):
     """
     Save processed results to a file
@@ -201,7 +300,12 @@ def main():
     
     # Process the data
     print("Processing data...")
-    processed_data = process_data(original_data, OPENAI_API_KEY)
+    if BATCH_MODE:
+        processed_data = process_data_batch(original_data, OPENAI_API_KEY)
+    elif ASYNC_MODE:
+        processed_data = asyncio.run(process_data_async(original_data, OPENAI_API_KEY))
+    else:
+        processed_data = process_data(original_data, OPENAI_API_KEY)
     
     # Save results
     save_results(processed_data, output_file)
@@ -1,5 +1,7 @@
 from langchain_ollama import OllamaLLM
-from openai import OpenAI
+from lib.llm import chat_completion
+from lib.prompts import build_messages, normalize_prompt
+from lib.telemetry import print_prompt_cache_stats
 import requests
 from dotenv import load_dotenv
 import os
@@ -9,7 +11,6 @@ load_dotenv()
 URL = os.getenv("URL_zad5") # from the exercise 5
 URL_POST = os.getenv("URL_post") # from the exercise 5
 api_key = os.getenv("APIkey")
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 def get_text_from_website():
 
@@ -35,27 +36,20 @@ def get_text_from_website():
 def anonymize_text(text, context):
     llm = OllamaLLM(model="gemma2:2b")
 
-    response = llm.invoke(f'Anonymize the text: "{text}" \n Remember about the rules: {context}')
+    # Rules first and the text last, so the model can reuse the processed prefix
+    response = llm.invoke(f'Remember about the rules: {normalize_prompt(context)}\n\nAnonymize the text: "{text}"')
 
     return response
 
 def anonymize_text_openai(text, context):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": context},
-                {"role": "user", "content": f'Anonymize the text: "{text}" \n Remember about the rules: {context}'}
-            ]
+            # The rules are sent once, as the static prefix of the prompt
+            messages=build_messages(context, f'Anonymize the text: "{text}"')
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -115,6 +109,7 @@ def main():
     #anonymized_text = anonymize_text_openai(text, context)
 
     print(f'Anonymized text: {anonymized_text}')
+    print_prompt_cache_stats()
 
     # Step 3: Submit the anonymized text
     submit_text(anonymized_text, URL_POST, api_key)
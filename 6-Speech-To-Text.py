@@ -1,22 +1,18 @@
 import requests
 import json
 from dotenv import load_dotenv
-from openai import OpenAI
+from lib.llm import chat_completion
 import os
 
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL = os.getenv("URL_zad6") # from the exercise 6
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 def get_ai_answer(question, text, context):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": context},
@@ -24,9 +20,6 @@ def get_ai_answer(question, text, context):
                 #{"role": "user", "content": f'Below is the transcript. Please provide a step-by-step reasoning process to determine the University street name where professor Andrzej Maj was working. Then, provide the final answer?: \n "{text}"'}
             ]
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -1,17 +1,12 @@
 import base64
 from PIL import Image
 from dotenv import load_dotenv
-from openai import OpenAI
-import os
+from lib.llm import chat_completion
 
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 def get_ai_answer_to_image(question, context, image_path=None, image_type="png"):
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
         # Encode the image if provided
         image_data = None
         if image_path:
@@ -36,15 +31,12 @@ def get_ai_answer_to_image(question, context, image_path=None, image_type="png")
             }
         ]
 
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             #model="gpt-4o-mini",
             model="gpt-4o",
             messages=messages
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -54,11 +46,8 @@ def get_ai_answer_to_image(question, context, image_path=None, image_type="png")
 def get_ai_answer(question, context):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             #model="gpt-4o-mini",
             model="gpt-4o",
             messages=[
@@ -66,9 +55,6 @@ def get_ai_answer(question, context):
                 {"role": "user", "content": f'{question}'}
             ]
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
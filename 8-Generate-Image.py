@@ -1,5 +1,5 @@
 from dotenv import load_dotenv
-from openai import OpenAI
+from lib.llm import chat_completion, send_with_limiter
 import requests
 import json
 import os
@@ -8,7 +8,6 @@ load_dotenv()
 api_key = os.getenv("APIkey")
 URL = os.getenv("URL_zad8") # from the task 8
 URL_POST = os.getenv("URL_post")
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
 
 def get_data_from_website(URL):
 
@@ -35,17 +34,14 @@ def get_data_from_website(URL):
 def generate_ai_image(image_description):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Generate the image
-        response = client.images.generate(
+        # Generate the image (through the shared rate limiter, which also retries 429 and server errors)
+        response = send_with_limiter("dall-e-3", 0, lambda client: client.images.with_raw_response.generate(
             model="dall-e-3",
             prompt=image_description,
             size="1024x1024",
             quality="standard",
             n=1,
-        )
+        ))
         
         # Extract the image URL from the response
         image_url = response.data[0].url
@@ -58,20 +54,14 @@ def generate_ai_image(image_description):
 def get_ai_answer(question, context):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": context},
                 {"role": "user", "content": f'{question}'}
             ]
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
-from openai import OpenAI
+from lib.llm import chat_completion, print_cache_stats, send_with_limiter
+from lib.telemetry import track_call
 import requests
 import json
 import os
@@ -9,25 +10,18 @@ import glob
 load_dotenv()
 api_key = os.getenv("APIkey")
 URL_POST = os.getenv("URL_post")
-OPENAI_API_KEY = os.getenv("OpenAI_APIkey")
     
 def get_ai_answer(question, context):
 
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": context},
                 {"role": "user", "content": f'{question}'}
             ]
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -37,15 +31,19 @@ def get_ai_answer(question, context):
 def speech_to_text(file_path):
     try:
 
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
-        # Transcribe the audio file using Whisper API
-        with open(file_path, "rb") as audio_file:
-            response = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
+        # Transcribe the audio file using Whisper API (the call is recorded in the telemetry)
+        with open(file_path, "rb") as audio_file, track_call("whisper", "whisper-1") as call:
+            def transcribe(client):
+                # A retried request sends the file from the start again
+                audio_file.seek(0)
+                return client.audio.transcriptions.with_raw_response.create(
+                    model="whisper-1",
+                    file=audio_file
+                )
+
+            # Sent through the shared rate limiter, which also retries 429 and server errors
+            response = send_with_limiter("whisper-1", 0, transcribe, call)
+            call.set_usage(getattr(response, "usage", None))
         
         # Extract the transcription from the response
         transcription = response.text
@@ -61,9 +59,6 @@ def get_text_from_file(file_path):
     
 def get_ai_answer_to_image(question, context, image_path=None, image_type="png"):
     try:
-        # Create OpenAI client
-        client = OpenAI(api_key=OPENAI_API_KEY)
-
         # Encode the image if provided
         image_data = None
         if image_path:
@@ -88,15 +83,12 @@ def get_ai_answer_to_image(question, context, image_path=None, image_type="png")
             }
         ]
 
-        # Get response from AI
-        response = client.chat.completions.create(
+        # Get response from AI (identical requests are served from the local cache)
+        ai_answer = chat_completion(
             #model="gpt-4o-mini",
             model="gpt-4o",
             messages=messages
         )
-        
-        # Extract the answer from AI response
-        ai_answer = response.choices[0].message.content
         return ai_answer
         
     except Exception as e:
@@ -214,6 +206,8 @@ def main():
         if ai_answer.lower() == 'hardware':
             hardware_files_list.append(os.path.basename(file_path))
 
+    print_cache_stats()
+
     # Send the results
     files_list = {
         "people": people_files_list,
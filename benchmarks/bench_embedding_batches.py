@@ -0,0 +1,41 @@
+# benchmarks/bench_embedding_batches.py
+# Ingestion throughput of embed_texts for different batch sizes, against the
+# local stand-in server with a fixed per-request latency.
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib.mock_openai_server import start_mock_server
+from lib import openai_client
+from lib.embeddings import embed_texts
+
+DOCUMENTS = 2000
+BATCH_SIZES = [1, 16, 128, 512]
+LATENCY = 0.05
+
+
+def main():
+    server, base_url = start_mock_server(latency=LATENCY)
+    os.environ["OpenAI_APIkey"] = "test"
+    os.environ["OpenAI_baseURL"] = base_url
+    openai_client.close_client()
+
+    texts = [f"Raport nr {index}: czujniki w sektorze {index % 7} nie wykryły ruchu." for index in range(DOCUMENTS)]
+    print(f"{DOCUMENTS} documents, {LATENCY * 1000:.0f} ms per request\n")
+
+    for batch_size in BATCH_SIZES:
+        start_time = time.perf_counter()
+        # Every batch size must reach the server - cached vectors would hide the request cost
+        vectors = embed_texts(texts, batch_size=batch_size, use_cache=False)
+        elapsed = time.perf_counter() - start_time
+        missing = sum(vector is None for vector in vectors)
+        print(f"batch size {batch_size:>4}: {elapsed:7.2f}s   {DOCUMENTS / elapsed:8.1f} docs/s   missing: {missing}")
+
+    openai_client.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_hybrid_search.py
+# Hit quality (hit@1, hit@5, MRR) and search latency of dense-only, BM25-only and
+# hybrid (reciprocal-rank fusion) retrieval on synthetic factory reports whose
+# queries ask for exact dates and event IDs. Dense embeddings come from the API
+# configured in .env (cached in the embedding cache, so re-runs are free);
+# without OpenAI_APIkey only the lexical search is measured.
+#
+#   python benchmarks/bench_hybrid_search.py --documents 300 --queries 100
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib.bm25_index import BM25Index, reciprocal_rank_fusion
+from lib.vector_store import LocalVectorStore
+
+SECTORS = ["A1", "B2", "C4", "D7", "E3"]
+MODELS = ["RX-7", "FN-2000", "KB-44", "PX-12", "TOR-9"]
+EVENTS = [
+    "Czujniki ruchu wykryły intruza w pobliżu magazynu z prototypem {model}.",
+    "Przeprowadzono testy broni {model}, wyniki zgodne z normą.",
+    "Zgłoszono kradzież części do prototypu {model}.",
+    "Rutynowy patrol nie wykazał żadnych anomalii, sprzęt {model} zabezpieczony.",
+    "Awaria zasilania w laboratorium, testy {model} przerwane."
+]
+
+
+def make_reports(documents, seed):
+    rng = random.Random(seed)
+    start_date = datetime.date(2024, 1, 1)
+    reports = []
+    for index in range(documents):
+        date = (start_date + datetime.timedelta(days=index)).isoformat()
+        event_id = f"ZD-{rng.randint(10000, 99999)}-{index}"
+        text = (f"Raport z dnia {date}. Sektor {rng.choice(SECTORS)}. "
+                f"{rng.choice(EVENTS).format(model=rng.choice(MODELS))} Numer zdarzenia: {event_id}.")
+        reports.append({"id": f"report-{index}", "text": text, "date": date, "event_id": event_id})
+    return reports
+
+
+def make_queries(reports, count, seed):
+    rng = random.Random(seed + 1)
+    queries = []
+    for report in rng.sample(reports, min(count, len(reports))):
+        if rng.random() < 0.5:
+            queries.append((f"Co się wydarzyło {report['date']}?", report["id"]))
+        else:
+            queries.append((f"Szczegóły zdarzenia {report['event_id']}", report["id"]))
+    return queries
+
+
+def evaluate(name, search, queries):
+    timings = []
+    ranks = []
+    for query, expected in queries:
+        start = time.perf_counter()
+        found = search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+        ranks.append(found.index(expected) + 1 if expected in found else None)
+    hit_1 = sum(rank == 1 for rank in ranks) / len(ranks)
+    hit_5 = sum(rank is not None and rank <= 5 for rank in ranks) / len(ranks)
+    mrr = sum(1 / rank for rank in ranks if rank) / len(ranks)
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<10} hit@1: {hit_1:.2f}   hit@5: {hit_5:.2f}   MRR: {mrr:.3f}   "
+          f"mean: {statistics.mean(timings):7.3f} ms   p95: {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dense vs BM25 vs hybrid retrieval on exact-token queries")
+    parser.add_argument("--documents", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--limit", type=int, default=10, help="Results per search")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    reports = make_reports(args.documents, args.seed)
+    queries = make_queries(reports, args.queries, args.seed)
+    print(f"{len(reports)} reports, {len(queries)} queries for exact dates and event IDs\n")
+
+    with tempfile.TemporaryDirectory() as folder:
+        lexical = BM25Index("bench", folder=folder)
+        start = time.perf_counter()
+        for report in reports:
+            lexical.add(report["id"], report["text"])
+        lexical.save()
+        print(f"BM25 index built in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        def lexical_ids(query, limit=args.limit):
+            return [doc_id for doc_id, _ in lexical.search(query, limit=limit)]
+
+        evaluate("lexical", lexical_ids, queries)
+
+        if not os.getenv("OpenAI_APIkey"):
+            print("\nOpenAI_APIkey is not set - dense and hybrid search skipped")
+            return
+
+        from lib.embeddings import embed_texts
+        vectors = embed_texts([report["text"] for report in reports])
+        query_vectors = dict(zip([query for query, _ in queries], embed_texts([query for query, _ in queries])))
+        store = LocalVectorStore("bench", dim=len(vectors[0]), folder=folder)
+        store.upsert([{"id": report["id"], "vector": vector, "payload": {}}
+                      for report, vector in zip(reports, vectors) if vector])
+
+        def dense_ids(query, limit=args.limit):
+            return [hit.id for hit in store.search(query_vectors[query], limit=limit)]
+
+        def hybrid_ids(query):
+            candidates = max(args.limit, 50)
+            fused = reciprocal_rank_fusion([lexical_ids(query, candidates), dense_ids(query, candidates)])
+            return [doc_id for doc_id, _ in fused[:args.limit]]
+
+        # Query embeddings are computed up front, so the timings cover the searches only
+        evaluate("dense", dense_ids, queries)
+        evaluate("hybrid", hybrid_ids, queries)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
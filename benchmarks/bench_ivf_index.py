@@ -0,0 +1,91 @@
+# benchmarks/bench_ivf_index.py
+# Recall@k and query latency of the approximate IVF index (pq and int8 codes)
+# for different nprobe values, against exact brute-force search over the same
+# memory-mapped store. Synthetic clustered 1536-dim vectors, no API calls.
+#
+#   python benchmarks/bench_ivf_index.py --documents 50000 --queries 100
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib.ivf_index import IVFIndex
+from lib.vector_store import LocalVectorStore
+
+
+def make_vectors(documents, dim, seed):
+    """Clustered random vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, documents // 100), dim)).astype(np.float32)
+    return centers[rng.integers(0, len(centers), documents)] + 0.5 * rng.normal(size=(documents, dim)).astype(np.float32)
+
+
+def measure(search, queries):
+    timings = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append([hit.id for hit in search(query)])
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, results
+
+
+def recall_at_k(results, expected):
+    found = sum(len(set(result) & set(exact)) for result, exact in zip(results, expected))
+    return found / sum(len(exact) for exact in expected)
+
+
+def report(name, timings, recall):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<24} mean: {statistics.mean(timings):8.2f} ms   p50: {statistics.median(timings):8.2f} ms   "
+          f"p95: {p95:8.2f} ms   recall: {recall:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the IVF index against brute force")
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--limit", type=int, default=10, help="Results per query (k)")
+    parser.add_argument("--rerank", type=int, default=100, help="Candidates re-ranked exactly")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.documents, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.documents, args.queries)] + 0.3 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+    print(f"{args.documents} vectors of size {args.dim}, {args.queries} queries, k={args.limit}, rerank={args.rerank}\n")
+
+    with tempfile.TemporaryDirectory() as folder:
+        store = LocalVectorStore("bench", dim=args.dim, dtype="float32", folder=folder)
+        for start in range(0, args.documents, 5000):
+            store.upsert([{"id": index, "vector": vectors[index], "payload": {}}
+                          for index in range(start, min(start + 5000, args.documents))])
+
+        timings, expected = measure(lambda query: store.search(query, limit=args.limit), queries)
+        report("brute force", timings, 1.0)
+        print(f"{'':<24} {args.dim * 4} bytes per vector in RAM\n")
+
+        for quantization in ("pq", "int8"):
+            index = IVFIndex(dim=args.dim, quantization=quantization, rerank=args.rerank, seed=args.seed)
+            start = time.perf_counter()
+            index.update(store, min_points=0)
+            print(f"ivf {quantization}: {len(index.centroids)} lists, built in {time.perf_counter() - start:.1f}s, "
+                  f"{index.memory_bytes() / args.documents:.0f} bytes per vector in RAM")
+            for nprobe in args.nprobe:
+                timings, results = measure(lambda query: index.search(store, query, limit=args.limit, nprobe=nprobe), queries)
+                report(f"ivf {quantization} nprobe={nprobe}", timings, recall_at_k(results, expected))
+            print()
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/bench_mock_pipelines.py
+# Latency and throughput of every kind of model call the task scripts make,
+# measured against the local stand-in server with synthetic latency (and
+# optionally errors or recorded fixtures), so the numbers are reproducible.
+#
+#   python benchmarks/bench_mock_pipelines.py --latency 0.05 --jitter 0.02 --error-rate 0.02
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+# Every call has to reach the server, not the completion cache
+os.environ["LLM_cache"] = "0"
+
+from lib.mock_openai_server import start_mock_server
+from lib import openai_client
+from lib.embeddings import create_embeddings
+from lib.llm import ChatStream, async_chat_completion, chat_completion, send_with_limiter
+
+TEXT_MESSAGES = [
+    {"role": "system", "content": "Answer the question in one word"},
+    {"role": "user", "content": "What is the capital of Poland?"}
+]
+VISION_MESSAGES = [
+    {"role": "system", "content": "You are a helpful assistant that is an expert in making OCR from images"},
+    {"role": "user", "content": [
+        {"type": "text", "text": "Read the text from the image"},
+        {"type": "image_url", "image_url": {"url": "data:image/png;base64,iVBORw0KGgo="}}
+    ]}
+]
+
+
+def chat_call(index):
+    chat_completion(model="gpt-4o-mini", messages=TEXT_MESSAGES)
+
+
+def vision_call(index):
+    chat_completion(model="gpt-4o", messages=VISION_MESSAGES)
+
+
+def embedding_call(index):
+    create_embeddings(f"Document number {index}", model="text-embedding-ada-002")
+
+
+def transcription_call(index):
+    audio_file = ("recording.mp3", b"\x00" * 2048)
+    send_with_limiter("whisper-1", 0, lambda client: client.audio.transcriptions.with_raw_response.create(
+        model="whisper-1", file=audio_file))
+
+
+def image_call(index):
+    send_with_limiter("dall-e-3", 0, lambda client: client.images.with_raw_response.generate(
+        model="dall-e-3", prompt="A robot on the map", size="1024x1024", n=1))
+
+
+def measure(call, requests):
+    """Run the calls one after another, returns latencies (ms), wall time and failures"""
+    timings = []
+    failures = 0
+    start = time.perf_counter()
+    for index in range(requests):
+        call_start = time.perf_counter()
+        try:
+            call(index)
+        except Exception:
+            failures += 1
+            continue
+        timings.append((time.perf_counter() - call_start) * 1000)
+    return timings, time.perf_counter() - start, failures
+
+
+def measure_stream(requests):
+    """Time to first token and total time of streamed chat answers"""
+    first_token = []
+    total = []
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        stream = ChatStream(model="gpt-4o-mini", messages=TEXT_MESSAGES)
+        try:
+            for _ in stream:
+                pass
+        except Exception:
+            failures += 1
+            continue
+        first_token.append(stream.time_to_first_token * 1000)
+        total.append(stream.total_time * 1000)
+    return first_token, total, time.perf_counter() - start, failures
+
+
+async def measure_concurrent_chat(requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    failures = 0
+
+    async def call():
+        nonlocal failures
+        async with semaphore:
+            try:
+                await async_chat_completion(model="gpt-4o-mini", messages=TEXT_MESSAGES)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(requests)))
+    return time.perf_counter() - start, failures
+
+
+def report(name, timings, elapsed, failures):
+    if not timings:
+        print(f"{name:<22} all {failures} calls failed")
+        return
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:<22} {len(timings) / elapsed:8.1f} calls/s   mean: {statistics.mean(timings):8.2f} ms   "
+          f"p50: {statistics.median(timings):8.2f} ms   p95: {p95:8.2f} ms   failed: {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the task pipelines against the stand-in server")
+    parser.add_argument("--requests", type=int, default=50, help="Calls per pipeline")
+    parser.add_argument("--concurrency", type=int, default=10, help="Requests in flight for the async chat run")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="Replay recorded responses from this file")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(
+        fixtures_path=args.fixtures, latency=args.latency, jitter=args.jitter,
+        token_latency=args.token_latency, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, seed=args.seed
+    )
+    os.environ["OpenAI_APIkey"] = "test"
+    os.environ["OpenAI_baseURL"] = base_url
+    openai_client.close_client()
+
+    print(f"{args.requests} calls per pipeline against {base_url} "
+          f"(latency {args.latency}s + up to {args.jitter}s, error rate {args.error_rate}, 429 rate {args.rate_limit_rate})\n")
+
+    for name, call in (("chat", chat_call), ("vision", vision_call), ("embeddings", embedding_call),
+                       ("transcription", transcription_call), ("image generation", image_call)):
+        report(name, *measure(call, args.requests))
+
+    first_token, total, elapsed, failures = measure_stream(args.requests)
+    report("stream first token", first_token, elapsed, failures)
+    report("stream total", total, elapsed, failures)
+
+    elapsed, failures = asyncio.run(measure_concurrent_chat(args.requests, args.concurrency))
+    print(f"{'async chat':<22} {(args.requests - failures) / elapsed:8.1f} calls/s   "
+          f"({args.concurrency} in flight, failed: {failures})")
+
+    print(f"\nServer: {server.state.stats()}")
+    openai_client.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
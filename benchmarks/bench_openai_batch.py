@@ -0,0 +1,49 @@
+# benchmarks/bench_openai_batch.py
+# Full batch job lifecycle (write, upload, submit, poll, download, map back)
+# against the local stand-in server.
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib.mock_openai_server import start_mock_server
+from lib import openai_client
+from lib.openai_batch import run_chat_batch
+
+REQUESTS = 1000
+
+
+def main():
+    server, base_url = start_mock_server(batch_delay=0.2)
+    os.environ["OpenAI_APIkey"] = "test"
+    os.environ["OpenAI_baseURL"] = base_url
+    openai_client.close_client()
+
+    messages_by_id = {
+        f"row-{index:05d}": [
+            {"role": "system", "content": "Classify the dataset if it is correct or incorrect"},
+            {"role": "user", "content": f"{index},{index * 2},{index * 3}"}
+        ]
+        for index in range(REQUESTS)
+    }
+
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = run_chat_batch(messages_by_id, "gpt-4o-mini", os.path.join(temp_dir, "batch.jsonl"), poll_interval=0.1, timeout=30)
+    elapsed = time.perf_counter() - start_time
+
+    # Every input ID has to come back with an answer
+    missing = [custom_id for custom_id in messages_by_id if results.get(custom_id) is None]
+    if list(results) != list(messages_by_id) or missing:
+        raise SystemExit(f"Batch results do not match the input: {len(missing)} missing")
+
+    print(f"\n{REQUESTS} requests mapped back to their IDs in {elapsed:.2f}s")
+
+    openai_client.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
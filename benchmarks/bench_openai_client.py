@@ -0,0 +1,69 @@
+# benchmarks/bench_openai_client.py
+# Per-call overhead of a fresh OpenAI client vs the shared pooled one,
+# measured against the local stand-in server (no API key or network needed).
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from openai import OpenAI
+from lib.mock_openai_server import start_mock_server
+from lib import openai_client
+
+CALLS = 200
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+def fresh_client_call(base_url):
+    # Old behaviour - new client (and new connection) for every request
+    client = OpenAI(api_key="test", base_url=base_url)
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+
+
+def shared_client_call(base_url):
+    client = openai_client.get_client()
+    client.chat.completions.create(model="gpt-4o-mini", messages=MESSAGES)
+
+
+def measure(call, base_url, calls):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call(base_url)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:<16} mean: {statistics.mean(timings):7.3f} ms   "
+          f"p50: {statistics.median(timings):7.3f} ms   p95: {p95:7.3f} ms")
+
+
+def main():
+    server, base_url = start_mock_server()
+    os.environ["OpenAI_APIkey"] = "test"
+    os.environ["OpenAI_baseURL"] = base_url
+    openai_client.close_client()
+
+    # Warm up both paths (imports, first connection)
+    measure(fresh_client_call, base_url, 5)
+    measure(shared_client_call, base_url, 5)
+
+    print(f"{CALLS} chat completion calls against {base_url}\n")
+    before = measure(fresh_client_call, base_url, CALLS)
+    after = measure(shared_client_call, base_url, CALLS)
+    report("fresh client", before)
+    report("shared client", after)
+    print(f"\nSaved per call: {statistics.mean(before) - statistics.mean(after):.3f} ms "
+          "(a real endpoint also saves the TLS handshake)")
+
+    openai_client.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_text_splitter.py
+# Splitting multi-MB markdown into token-limited chunks: TextService (one encoding
+# of the document, chunk ends by binary search over the token offsets) against
+# re-encoding the candidate chunk after every 10% shrink step.
+#
+#   python benchmarks/bench_text_splitter.py --megabytes 5 --limit 1000
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import random
+import sys
+import time
+
+root_folder = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(root_folder, '..'))
+
+from lib.tokens import get_encoding
+
+WORDS = ["raport", "czujnik", "sektor", "prototyp", "zabezpieczenie", "analiza", "wyniki", "testy",
+         "magazyn", "laboratorium", "zgłoszenie", "kradzież", "patrol", "awaria", "zasilanie", "dane",
+         "the", "report", "sensor", "model", "RX-7", "FN-2000", "2024-11-12", "12:45"]
+
+
+def load_text_service():
+    # The module file name is not importable as is
+    path = os.path.join(root_folder, '..', '11-Documents-Metadata', '(in-progress)TextService.py')
+    spec = importlib.util.spec_from_file_location("TextService", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.TextService
+
+
+def make_markdown(megabytes, seed):
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    section = 0
+    while size < megabytes * 1024 * 1024:
+        if section % 10 == 0:
+            parts.append(f"# Część {section // 10 + 1}\n\n")
+        parts.append(f"## Sekcja {section}\n\n")
+        for _ in range(rng.randint(2, 6)):
+            sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 120)))
+            if rng.random() < 0.2:
+                sentence += f" [źródło](https://example.com/raport/{section}) ![schemat](https://example.com/img/{section}.png)"
+            parts.append(sentence.capitalize() + ".\n\n")
+            size += len(parts[-1])
+        section += 1
+    return "".join(parts)
+
+
+def split_by_recounting(text, limit, encoding):
+    """Chunk ends found by re-encoding the whole candidate chunk after every shrink step"""
+    chunks = []
+    position = 0
+    encodes = 0
+    while position < len(text):
+        # Start from a generous character window and shrink it by 10% until it fits
+        end = min(position + limit * 8, len(text))
+        while True:
+            tokens = len(encoding.encode(text[position:end], disallowed_special=()))
+            encodes += 1
+            if tokens <= limit or end - position <= 1:
+                break
+            end -= max((end - position) // 10, 1)
+        # Then back to the previous newline when the chunk stays large enough
+        newline_pos = text.rfind('\n', position, end)
+        if end < len(text) and newline_pos > position:
+            tokens = len(encoding.encode(text[position:newline_pos + 1], disallowed_special=()))
+            encodes += 1
+            if tokens >= limit * 0.8:
+                end = newline_pos + 1
+        chunks.append(tokens)
+        position = end
+    return chunks, encodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token-limited markdown splitting")
+    parser.add_argument("--megabytes", type=float, default=5)
+    parser.add_argument("--limit", type=int, default=1000, help="Tokens per chunk")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--skip-baseline", action="store_true", help="Do not run the re-encoding splitter")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    encoding = get_encoding(args.model)
+    if encoding is None:
+        print("No tiktoken encoding - token counts are estimated from the text length")
+    text = make_markdown(args.megabytes, args.seed)
+    print(f"{len(text.encode('utf-8')) / 1024 / 1024:.1f} MB of markdown, {len(text)} characters, "
+          f"limit {args.limit} tokens per chunk\n")
+
+    TextService = load_text_service()
+    splitter = TextService(model=args.model)
+    start = time.perf_counter()
+    # The splitter reports every chunk - kept out of the timing output
+    with contextlib.redirect_stdout(io.StringIO()):
+        chunks = splitter.split(text, args.limit)
+    elapsed = time.perf_counter() - start
+    sizes = [chunk["metadata"]["tokens"] for chunk in chunks]
+    print(f"token offsets: {elapsed:7.2f}s   {len(chunks)} chunks   "
+          f"tokens min/max: {min(sizes)}/{max(sizes)}   {len(text) / 1024 / 1024 / elapsed:6.1f} M chars/s")
+
+    if args.skip_baseline or encoding is None:
+        return
+    start = time.perf_counter()
+    sizes, encodes = split_by_recounting(text, args.limit, encoding)
+    elapsed = time.perf_counter() - start
+    print(f"re-encoding:   {elapsed:7.2f}s   {len(sizes)} chunks   "
+          f"tokens min/max: {min(sizes)}/{max(sizes)}   {encodes} encode calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# benchmarks/bench_vector_search.py
+# Top-k query latency of the local memory-mapped store (float32 and float16)
+# compared with Qdrant - the server from Qdrant_URL when it is set, otherwise
+# qdrant_client's in-memory mode. Synthetic 1536-dim vectors, no API calls.
+#
+#   python benchmarks/bench_vector_search.py --documents 20000 --queries 200
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib.vector_store import LocalVectorStore
+
+
+def make_vectors(documents, dim, seed):
+    """Clustered random vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, documents // 100), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), documents)] + 0.3 * rng.normal(size=(documents, dim)).astype(np.float32)
+    return vectors
+
+
+def measure(search, queries):
+    timings = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(search(query))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, results
+
+
+def report(name, timings, recall=None):
+    timings = sorted(timings)
+    p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+    recall_text = f"   recall: {recall:.3f}" if recall is not None else ""
+    print(f"{name:<22} mean: {statistics.mean(timings):8.2f} ms   p50: {statistics.median(timings):8.2f} ms   "
+          f"p95: {p95:8.2f} ms{recall_text}")
+
+
+def recall_at_k(results, expected):
+    found = sum(len(set(result) & set(exact)) for result, exact in zip(results, expected))
+    return found / sum(len(exact) for exact in expected)
+
+
+def bench_local(dtype, vectors, queries, limit, folder):
+    store = LocalVectorStore(f"bench_{dtype}", dim=vectors.shape[1], dtype=dtype, folder=folder)
+    start = time.perf_counter()
+    for batch_start in range(0, len(vectors), 1000):
+        store.upsert([{"id": index, "vector": vectors[index], "payload": {"n": index}}
+                      for index in range(batch_start, min(batch_start + 1000, len(vectors)))])
+    print(f"local {dtype} load: {time.perf_counter() - start:.2f}s")
+    timings, results = measure(lambda query: [hit.id for hit in store.search(query, limit=limit)], queries)
+    store.close()
+    return timings, results
+
+
+def bench_qdrant(vectors, queries, limit):
+    try:
+        from qdrant_client import QdrantClient
+        from qdrant_client.http import models
+    except ImportError:
+        print("qdrant_client is not installed - Qdrant skipped")
+        return None
+
+    qdrant_url = os.getenv("Qdrant_URL")
+    client = QdrantClient(url=qdrant_url, api_key=os.getenv("Qdrant_APIkey")) if qdrant_url else QdrantClient(":memory:")
+    collection_name = f"bench_{uuid.uuid4().hex[:8]}"
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(size=vectors.shape[1], distance=models.Distance.COSINE)
+    )
+    try:
+        start = time.perf_counter()
+        for batch_start in range(0, len(vectors), 500):
+            client.upsert(collection_name=collection_name, points=[
+                models.PointStruct(id=index, vector=vectors[index].tolist(), payload={"n": index})
+                for index in range(batch_start, min(batch_start + 500, len(vectors)))
+            ])
+        print(f"Qdrant load ({qdrant_url or 'in-memory'}): {time.perf_counter() - start:.2f}s")
+        return measure(lambda query: [hit.id for hit in client.search(
+            collection_name=collection_name, query_vector=query.tolist(), limit=limit
+        )], queries)
+    finally:
+        client.delete_collection(collection_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local vector store with Qdrant")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--limit", type=int, default=5, help="Results per query (k)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.documents, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = vectors[rng.integers(0, args.documents, args.queries)] + 0.1 * rng.normal(size=(args.queries, args.dim)).astype(np.float32)
+
+    # Exact answers for the recall column
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(-(queries @ normalized.T), axis=1)[:, :args.limit].tolist()
+    print(f"{args.documents} vectors of size {args.dim}, {args.queries} queries, k={args.limit}\n")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for dtype in ("float32", "float16"):
+            timings, results = bench_local(dtype, vectors, queries, args.limit, folder)
+            report(f"local {dtype}", timings, recall_at_k(results, expected))
+
+    measured = bench_qdrant(vectors, queries, args.limit)
+    if measured:
+        timings, results = measured
+        report("qdrant", timings, recall_at_k(results, expected))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# lib/bm25_index.py
+# Local BM25 inverted index for exact tokens (dates, IDs, model names) that dense
+# embeddings miss, and reciprocal-rank fusion of lexical and dense rankings.
+import math
+import os
+import re
+import threading
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_BM25_FOLDER = os.path.join(root_folder, '.cache', 'bm25')
+
+# Words joined by - . / : stay one token (2024-11-12, RX-7, 12/B), their parts are indexed too
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+POLISH_STOPWORDS = {
+    "a", "aby", "ale", "bo", "by", "był", "była", "było", "były", "co", "czy", "dla", "do", "gdy", "i",
+    "ich", "jak", "jego", "jej", "jest", "już", "lub", "na", "nad", "nie", "o", "od", "oraz", "po", "pod",
+    "przez", "przy", "się", "są", "ta", "tak", "te", "tego", "tej", "ten", "to", "tym", "u", "w", "we",
+    "z", "za", "ze", "że"
+}
+# Inflectional endings stripped by the light stemmer, longest first
+POLISH_SUFFIXES = sorted([
+    "owego", "owej", "owym", "ości", "ość", "ami", "ach", "ych", "ich", "owi", "ego", "emu", "ymi",
+    "imi", "om", "ów", "em", "ie", "ze", "ej", "ym", "im", "ą", "ę", "a", "e", "i", "o", "u", "y"
+], key=len, reverse=True)
+DIACRITICS = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+
+@lru_cache(maxsize=200000)
+def stem(word: str) -> str:
+    """Light Polish stemmer: strips one inflectional ending (keeping at least 4 letters) and the diacritics"""
+    if word.isalpha():
+        for suffix in POLISH_SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+                word = word[:-len(suffix)]
+                break
+    return word.translate(DIACRITICS)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased, stemmed terms without Polish diacritics (so "kradzieży" matches "kradziez")"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).casefold()):
+        if token in POLISH_STOPWORDS:
+            continue
+        terms.append(stem(token))
+        parts = re.split(r"[-./:]", token) if not token.isalnum() else ()
+        if len(parts) > 1:
+            terms.extend(stem(part) for part in parts if part not in POLISH_STOPWORDS)
+    return terms
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence], k: int = 60) -> List[Tuple[object, float]]:
+    """Fuse ranked ID lists: score(id) = sum of 1 / (k + rank), best first"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    BM25 over documents keyed by string IDs (the vector point IDs), saved to
+    .cache/bm25/<name>.npz. Postings are kept per term in flat arrays
+    (uint32 document numbers, uint16 term frequencies), so a lookup is a slice.
+    Added and removed documents are merged into the arrays on the next search or save.
+    """
+    def __init__(self, name: str, folder: str = DEFAULT_BM25_FOLDER, k1: float = 1.2, b: float = 0.75):
+        self.path = os.path.join(folder, f"{name}.npz")
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        self.reset()
+        if os.path.exists(self.path):
+            self.load()
+
+    def reset(self):
+        self.terms: Dict[str, int] = {}
+        self.doc_ids: List[str] = []
+        self.doc_numbers: Dict[str, int] = {}
+        # Per document number: its length in terms and a removed flag (grown in place, read through NumPy views)
+        self.doc_lengths = array('I')
+        self.deleted = bytearray()
+        # Postings of term t: postings[offsets[t]:offsets[t + 1]] and frequencies[...]
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings = np.empty(0, dtype=np.uint32)
+        self.frequencies = np.empty(0, dtype=np.uint16)
+        # k1 * (1 - b + b * length / average length) per document
+        self.length_norms = np.empty(0, dtype=np.float32)
+
+        self.pending: List[Tuple[int, int, int]] = []
+        self.dirty = False
+
+    def __contains__(self, doc_id: str) -> bool:
+        number = self.doc_numbers.get(doc_id)
+        return number is not None and not self.deleted[number]
+
+    def __len__(self) -> int:
+        return len(self.deleted) - self.deleted.count(1)
+
+    def add(self, doc_id: str, text: str):
+        """Index a document (a document with the same ID is replaced)"""
+        counts = Counter(tokenize(text))
+        with self.lock:
+            if doc_id in self.doc_numbers:
+                self.deleted[self.doc_numbers[doc_id]] = 1
+            number = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+            self.doc_numbers[doc_id] = number
+            self.doc_lengths.append(sum(counts.values()))
+            self.deleted.append(0)
+            for term, frequency in counts.items():
+                term_number = self.terms.setdefault(term, len(self.terms))
+                self.pending.append((term_number, number, min(frequency, 65535)))
+            self.dirty = True
+
+    def remove(self, doc_ids: Iterable[str]):
+        with self.lock:
+            for doc_id in doc_ids:
+                number = self.doc_numbers.pop(doc_id, None)
+                if number is not None:
+                    self.deleted[number] = 1
+                    self.dirty = True
+
+    def compact(self):
+        """Merge pending postings into the arrays and drop removed documents (caller holds the lock)"""
+        if not self.dirty:
+            return
+        term_count = len(self.terms)
+        terms = np.repeat(np.arange(len(self.offsets) - 1, dtype=np.int64), np.diff(self.offsets))
+        docs = self.postings.astype(np.int64)
+        frequencies = self.frequencies
+        if self.pending:
+            pending = np.asarray(self.pending, dtype=np.int64)
+            terms = np.concatenate([terms, pending[:, 0]])
+            docs = np.concatenate([docs, pending[:, 1]])
+            frequencies = np.concatenate([frequencies, pending[:, 2].astype(np.uint16)])
+        deleted = np.frombuffer(self.deleted, dtype=bool)
+        keep = ~deleted[docs]
+        terms, docs, frequencies = terms[keep], docs[keep], frequencies[keep]
+        order = np.lexsort((docs, terms))
+
+        self.postings = docs[order].astype(np.uint32)
+        self.frequencies = frequencies[order]
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(terms, minlength=term_count))]).astype(np.int64)
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        alive_lengths = lengths[~deleted]
+        average_length = float(alive_lengths.mean()) if len(alive_lengths) else 1.0
+        self.length_norms = (self.k1 * (1 - self.b + self.b * lengths / max(average_length, 1.0))).astype(np.float32)
+        self.pending = []
+        self.dirty = False
+
+    def search(self, query: str, limit: int = 10, doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[str, float]]:
+        """Top `limit` (document ID, BM25 score) pairs, best first - only among doc_ids when given"""
+        with self.lock:
+            self.compact()
+            term_numbers = {self.terms[term] for term in tokenize(query) if term in self.terms}
+            if not term_numbers or limit <= 0:
+                return []
+            document_count = len(self)
+            scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+            for term_number in term_numbers:
+                start, end = self.offsets[term_number], self.offsets[term_number + 1]
+                if start == end:
+                    continue
+                docs = self.postings[start:end]
+                frequencies = self.frequencies[start:end].astype(np.float32)
+                idf = math.log(1 + (document_count - len(docs) + 0.5) / (len(docs) + 0.5))
+                # Postings of one term hold each document once, so plain fancy-index addition is safe
+                scores[docs] += idf * frequencies * (self.k1 + 1) / (frequencies + self.length_norms[docs])
+            if doc_ids is not None:
+                allowed = np.zeros(len(scores), dtype=bool)
+                allowed[[self.doc_numbers[doc_id] for doc_id in doc_ids if doc_id in self.doc_numbers]] = True
+                scores[~allowed] = 0
+            # Every matching document has a positive score
+            candidates = np.flatnonzero(scores)
+            if len(candidates) > limit:
+                candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+            candidates = candidates[np.argsort(-scores[candidates])]
+            return [(self.doc_ids[number], float(scores[number])) for number in candidates]
+
+    def save(self):
+        with self.lock:
+            self.compact()
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary_path = self.path + ".tmp.npz"
+            np.savez(
+                temporary_path,
+                terms=np.array(sorted(self.terms, key=self.terms.get), dtype=str),
+                doc_ids=np.array(self.doc_ids, dtype=str),
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32),
+                deleted=np.frombuffer(self.deleted, dtype=bool),
+                offsets=self.offsets,
+                postings=self.postings,
+                frequencies=self.frequencies,
+                length_norms=self.length_norms
+            )
+            os.replace(temporary_path, self.path)
+
+    def load(self):
+        with np.load(self.path) as data:
+            self.terms = {term: number for number, term in enumerate(data["terms"].tolist())}
+            self.doc_ids = data["doc_ids"].tolist()
+            self.doc_lengths = array('I', data["doc_lengths"].tolist())
+            self.deleted = bytearray(data["deleted"].astype(np.uint8).tobytes())
+            self.offsets = data["offsets"]
+            self.postings = data["postings"]
+            self.frequencies = data["frequencies"]
+            self.length_norms = data["length_norms"]
+        self.doc_numbers = {doc_id: number for number, doc_id in enumerate(self.doc_ids) if not self.deleted[number]}
+
+    def clear(self):
+        with self.lock:
+            self.reset()
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,107 @@
+# lib/context_packing.py
+# Retrieved chunks packed into a prompt under a token budget: text repeated by
+# overlapping chunks is sent once and the best-ranked chunks go in first.
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from lib.tokens import count_tokens, get_encoding
+
+# New text left of a chunk after removing the overlaps is dropped when shorter than this
+MIN_PIECE_CHARS = 200
+# A chunk that does not fit is cut to the remaining budget only when at least this much is left
+MIN_TRUNCATED_TOKENS = 100
+
+
+def subtract_spans(span: Tuple[int, int], covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Parts of span not in the (sorted, disjoint) covered spans"""
+    start, end = span
+    parts = []
+    for covered_start, covered_end in covered:
+        if covered_end <= start or covered_start >= end:
+            continue
+        if covered_start > start:
+            parts.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        parts.append((start, end))
+    return parts
+
+
+def add_span(span: Tuple[int, int], covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Covered spans with span added, merged and sorted"""
+    merged = []
+    for current in sorted(covered + [span]):
+        if merged and current[0] <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], current[1]))
+        else:
+            merged.append(current)
+    return merged
+
+
+def truncate_to_tokens(text: str, tokens: int, model: str) -> str:
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Same estimate as count_tokens (a token every 3 characters, plus one)
+        return text[:max(tokens - 1, 0) * 3]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:tokens])
+
+
+def pack_context(chunks: Sequence[str], max_tokens: int, source: Optional[str] = None,
+                 model: str = "gpt-4o-mini") -> Tuple[List[str], Dict]:
+    """
+    Pack chunks (best first) into at most max_tokens tokens.
+    When the source document is given, chunks are located in it, overlapping spans are
+    kept once and the packed pieces are returned in document order, adjacent ones joined.
+    Returns the packed texts and token counts before and after packing.
+    """
+    # (rank, position in the source or None, text) of the new text of every chunk
+    pieces = []
+    covered = []
+    seen = set()
+    for rank, chunk in enumerate(chunks):
+        start = source.find(chunk) if source else -1
+        if start < 0:
+            if chunk not in seen:
+                pieces.append((rank, None, chunk))
+                seen.add(chunk)
+            continue
+        span = (start, start + len(chunk))
+        parts = subtract_spans(span, covered)
+        for part_start, part_end in parts:
+            # Small leftovers of mostly repeated chunks are not worth a separate piece
+            if part_end - part_start >= MIN_PIECE_CHARS or parts == [span]:
+                pieces.append((rank, part_start, source[part_start:part_end]))
+        covered = add_span(span, covered)
+
+    # Greedy packing in rank order
+    selected = []
+    remaining = max_tokens
+    for rank, position, text in pieces:
+        tokens = count_tokens(text, model)
+        if tokens <= remaining:
+            selected.append((rank, position, text))
+            remaining -= tokens
+        elif remaining >= MIN_TRUNCATED_TOKENS:
+            selected.append((rank, position, truncate_to_tokens(text, remaining, model)))
+            break
+
+    # Document order reads better, and pieces that meet are one text again
+    located = sorted((position, text) for _, position, text in selected if position is not None)
+    packed = []
+    end = None
+    for position, text in located:
+        if packed and position == end:
+            packed[-1] += text
+        else:
+            packed.append(text)
+        end = position + len(text)
+    packed += [text for _, position, text in selected if position is None]
+
+    original_tokens = sum(count_tokens(chunk, model) for chunk in chunks)
+    packed_tokens = sum(count_tokens(text, model) for text in packed)
+    return packed, {
+        "chunks": len(chunks),
+        "packed_chunks": len(packed),
+        "original_tokens": original_tokens,
+        "packed_tokens": packed_tokens,
+        "saved_tokens": original_tokens - packed_tokens
+    }
@@ -0,0 +1,73 @@
+# lib/document_store.py
+import os
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_DOCUMENT_FOLDER = os.path.join(root_folder, '.cache')
+
+
+class DocumentStore:
+    """
+    Local store of document bodies keyed by content hash, compressed with zlib in SQLite.
+    Vector payloads keep only the hash and small metadata; bodies are read for the hits that are used.
+    """
+    def __init__(self, collection_name: str, folder: str = DEFAULT_DOCUMENT_FOLDER):
+        self.path = os.path.join(folder, f"documents_{collection_name}.sqlite")
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.db.commit()
+
+    def put_many(self, documents: Dict[str, str]):
+        """Store bodies by key (existing keys are kept - the key is the hash of the body)"""
+        rows = []
+        for key, text in documents.items():
+            data = text.encode('utf-8')
+            rows.append((key, zlib.compress(data, 6), len(data)))
+        with self.lock:
+            self.db.executemany("INSERT OR IGNORE INTO documents (key, body, size) VALUES (?, ?, ?)", rows)
+            self.db.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Bodies of the given keys (missing keys are left out)"""
+        keys = list(dict.fromkeys(keys))
+        documents = {}
+        with self.lock:
+            # SQLite limits the number of query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                for key, body in self.db.execute(
+                    f"SELECT key, body FROM documents WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    documents[key] = zlib.decompress(body).decode('utf-8')
+        return documents
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    def prune(self, keep_keys: Iterable[str]) -> int:
+        """Delete the bodies whose keys are not in keep_keys, returns how many were deleted"""
+        keep_keys = set(keep_keys)
+        with self.lock:
+            stale = [(key,) for (key,) in self.db.execute("SELECT key FROM documents") if key not in keep_keys]
+            self.db.executemany("DELETE FROM documents WHERE key = ?", stale)
+            self.db.commit()
+        return len(stale)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            documents, size, stored = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM documents"
+            ).fetchone()
+        return {"documents": documents, "size_bytes": size, "stored_bytes": stored}
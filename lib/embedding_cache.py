@@ -0,0 +1,166 @@
+# lib/embedding_cache.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_EMBEDDING_CACHE_PATH = os.path.join(root_folder, '.cache', 'embedding_cache.sqlite')
+
+
+def make_embedding_cache_key(model: str, text: str) -> str:
+    # Vectors of a stand-in server (OpenAI_baseURL) are never served to runs against the real API
+    base_url = os.getenv('OpenAI_baseURL')
+    if base_url:
+        model = f"{base_url}\n{model}"
+    return hashlib.sha256(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent store of embeddings keyed by (model, text hash), vectors kept as float32 blobs in SQLite.
+    The least recently used vectors are evicted once the store exceeds its size cap.
+    """
+    def __init__(self, path: str = DEFAULT_EMBEDDING_CACHE_PATH, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self.db.commit()
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """Cached vectors in the order of the texts, None for the ones not in the cache"""
+        keys = [make_embedding_cache_key(model, text) for text in texts]
+        found = {}
+        with self.lock:
+            # SQLite limits the number of query parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self.db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+                self.db.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+
+        vectors = []
+        for key in keys:
+            if key in found:
+                vector = array('f')
+                vector.frombytes(found[key])
+                vectors.append(vector.tolist())
+            else:
+                vectors.append(None)
+        return vectors
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        return self.get_many(model, [text])[0]
+
+    def set_many(self, model: str, texts: List[str], vectors: List[Optional[List[float]]]):
+        """Store the vectors (None values are skipped) and evict old entries if over the size cap"""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                continue
+            blob = array('f', vector).tobytes()
+            rows.append((make_embedding_cache_key(model, text), model, blob, len(blob), now))
+        if not rows:
+            return
+        with self.lock:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, size, last_access) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            self.evict()
+            self.db.commit()
+
+    def set(self, model: str, text: str, vector: List[float]):
+        self.set_many(model, [text], [vector])
+
+    def evict(self):
+        # Caller holds the lock
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM embeddings ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM embeddings")
+            self.db.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters of this process and the current store size"""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache configured from .env, or None when it is disabled"""
+    global _cache
+    if os.getenv("LLM_embedding_cache", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    path=os.getenv("LLM_embedding_cache_path", DEFAULT_EMBEDDING_CACHE_PATH),
+                    max_bytes=int(float(os.getenv("LLM_embedding_cache_max_mb", "512")) * 1024 * 1024)
+                )
+    return _cache
+
+
+def print_embedding_cache_stats():
+    """Print hit/miss counters of the embedding cache"""
+    cache = get_embedding_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.0%}), {stats['entries']} vectors, "
+              f"{stats['size_bytes'] / 1024 / 1024:.1f} MB, {stats['evictions']} evicted")
@@ -0,0 +1,135 @@
+# lib/embeddings.py
+import hashlib
+import json
+from typing import List, Optional, Union
+
+from openai import BadRequestError
+
+from lib.embedding_cache import get_embedding_cache
+from lib.llm import send_with_limiter
+from lib.single_flight import get_single_flight
+from lib.telemetry import record_cache_hit, track_call
+from lib.tokens import count_tokens
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Limits of one embeddings request
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300000
+MAX_TOKENS_PER_INPUT = 8191
+
+
+def make_batches(texts: List[str], max_inputs: int = MAX_INPUTS_PER_REQUEST,
+                 max_tokens: int = MAX_TOKENS_PER_REQUEST, model: str = DEFAULT_EMBEDDING_MODEL) -> List[List[int]]:
+    """Group text indexes into requests that stay under the input count and token limits"""
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for index, text in enumerate(texts):
+        tokens = count_tokens(text, model)
+        if tokens > MAX_TOKENS_PER_INPUT:
+            # Probably rejected by the API - send it alone so it cannot fail a whole batch
+            batches.append([index])
+            continue
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def make_embedding_key(input: Union[str, List[str]], model: str, **params) -> str:
+    canonical = json.dumps({"model": model, "input": input, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def create_embeddings(input: Union[str, List[str]], model: str = DEFAULT_EMBEDDING_MODEL, **params):
+    """
+    Embed one text or a list of texts through the shared rate limiter, returns the API response.
+    Identical requests in flight at the same time share one call.
+    """
+    texts = input if isinstance(input, list) else [input]
+    # ~4 characters per token, like the chat estimate
+    estimated_tokens = sum(len(text) for text in texts) // 4 + 1
+
+    def fetch():
+        with track_call("embedding", model) as call:
+            response = send_with_limiter(
+                model, estimated_tokens,
+                lambda client: client.embeddings.with_raw_response.create(model=model, input=input, **params),
+                call
+            )
+            call.set_usage(response.usage)
+            call.extra["inputs"] = len(input) if isinstance(input, list) else 1
+        return response
+
+    response, shared = get_single_flight("embeddings").do(make_embedding_key(input, model, **params), fetch)
+    if shared:
+        record_cache_hit("embedding", model, status="coalesced")
+    return response
+
+
+def cache_model_name(model: str, **params) -> str:
+    # Parameters like `dimensions` change the vector, so they are part of the cache key
+    return f"{model}:{json.dumps(params, sort_keys=True)}" if params else model
+
+
+def embed_text(text: str, model: str = DEFAULT_EMBEDDING_MODEL, use_cache: bool = True, **params) -> List[float]:
+    """Embedding of one text, served from the local embedding cache when it was embedded before"""
+    cache = get_embedding_cache() if use_cache else None
+    if cache:
+        vector = cache.get(cache_model_name(model, **params), text)
+        if vector is not None:
+            return vector
+
+    vector = create_embeddings(text, model, **params).data[0].embedding
+    if cache:
+        cache.set(cache_model_name(model, **params), text, vector)
+    return vector
+
+
+def embed_texts(texts: List[str], model: str = DEFAULT_EMBEDDING_MODEL,
+                batch_size: int = MAX_INPUTS_PER_REQUEST, max_batch_tokens: int = MAX_TOKENS_PER_REQUEST,
+                use_cache: bool = True, **params) -> List[Optional[List[float]]]:
+    """
+    Embed many texts with as few requests as possible.
+    Returns the vectors in the order of the texts - None for empty texts and texts that failed.
+    Texts in the local embedding cache are not sent again. A batch rejected by the API
+    is retried text by text, so one bad input does not lose the whole batch.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    vectors: List[Optional[List[float]]] = cache.get_many(cache_model_name(model, **params), texts) if cache else [None] * len(texts)
+    # The API rejects empty input
+    indexes = [index for index, text in enumerate(texts) if text and text.strip() and vectors[index] is None]
+    batches = make_batches([texts[index] for index in indexes], batch_size, max_batch_tokens, model)
+
+    for batch_number, batch in enumerate(batches, 1):
+        batch_indexes = [indexes[position] for position in batch]
+        try:
+            response = create_embeddings([texts[index] for index in batch_indexes], model, **params)
+            for item in response.data:
+                vectors[batch_indexes[item.index]] = item.embedding
+            continue
+        except BadRequestError as e:
+            if len(batch_indexes) == 1:
+                print(f"Error creating embedding for text {batch_indexes[0]}: {e}")
+                continue
+            print(f"Embedding batch {batch_number}/{len(batches)} ({len(batch_indexes)} texts) was rejected: {e} - retrying one by one")
+        except Exception as e:
+            # 429 and server errors were already retried with backoff - sending the texts one by one would not help
+            print(f"Embedding batch {batch_number}/{len(batches)} ({len(batch_indexes)} texts) failed: {e}")
+            continue
+
+        for index in batch_indexes:
+            try:
+                vectors[index] = create_embeddings(texts[index], model, **params).data[0].embedding
+            except Exception as e:
+                print(f"Error creating embedding for text {index}: {e}")
+
+    if cache:
+        cache.set_many(cache_model_name(model, **params), [texts[index] for index in indexes], [vectors[index] for index in indexes])
+    return vectors
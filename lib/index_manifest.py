@@ -0,0 +1,68 @@
+# lib/index_manifest.py
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_MANIFEST_FOLDER = os.path.join(root_folder, '.cache')
+
+
+def stable_point_id(file_path: str, content_hash: str) -> str:
+    """Same file with the same content always gets the same point ID"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{os.path.abspath(file_path)}:{content_hash}"))
+
+
+class IndexManifest:
+    """
+    Local record of the files stored in a vector collection:
+    {absolute path: {"file_path", "mtime", "size", "hash", "id"}}.
+    Lets a re-run skip unchanged files without reading them.
+    """
+    def __init__(self, collection_name: str, folder: str = DEFAULT_MANIFEST_FOLDER):
+        self.path = os.path.join(folder, f"manifest_{collection_name}.json")
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.entries = json.load(file)
+
+    def get(self, file_path: str) -> Optional[Dict]:
+        return self.entries.get(os.path.abspath(file_path))
+
+    def is_unchanged(self, file_path: str, stat: os.stat_result) -> bool:
+        """True when size and modification time match the stored entry (the file is not read)"""
+        entry = self.get(file_path)
+        return bool(entry) and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns
+
+    def set(self, file_path: str, stat: os.stat_result, content_hash: str, point_id: Optional[str]):
+        with self.lock:
+            self.entries[os.path.abspath(file_path)] = {
+                "file_path": file_path,
+                "mtime": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "hash": content_hash,
+                "id": point_id
+            }
+
+    def remove(self, file_path: str):
+        with self.lock:
+            self.entries.pop(os.path.abspath(file_path), None)
+
+    def paths_under(self, folder_path: str) -> List[str]:
+        folder_path = os.path.abspath(folder_path)
+        return [path for path in self.entries if os.path.dirname(path) == folder_path]
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def save(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Write to a temporary file first so an interrupted run does not corrupt the manifest
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.entries, file, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
@@ -0,0 +1,244 @@
+# lib/ivf_index.py
+# Approximate search over a LocalVectorStore for corpora too large to scan:
+# a k-means coarse quantizer splits the vectors into lists, only the `nprobe`
+# lists closest to the query are scored from compact codes (product or 8-bit
+# scalar quantization), and the best candidates are re-ranked exactly with the
+# full vectors read from the store's memory map. NumPy only.
+import os
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from lib.vector_store import LocalVectorStore, SearchHit, normalize_rows
+
+QUANTIZATIONS = ("pq", "int8")
+
+
+def assign(data: np.ndarray, centroids: np.ndarray, spherical: bool = True, block_rows: int = 8192) -> np.ndarray:
+    """Index of the closest centroid for every row (cosine when spherical, otherwise Euclidean)"""
+    labels = np.empty(len(data), dtype=np.int32)
+    # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2, so the closest centroid maximizes x.c - ||c||^2 / 2
+    offset = None if spherical else 0.5 * (centroids ** 2).sum(axis=1)
+    for start in range(0, len(data), block_rows):
+        scores = data[start:start + block_rows] @ centroids.T
+        if offset is not None:
+            scores -= offset
+        labels[start:start + block_rows] = scores.argmax(axis=1)
+    return labels
+
+
+def kmeans(data: np.ndarray, clusters: int, iterations: int = 20, spherical: bool = True, seed: int = 0) -> np.ndarray:
+    """Lloyd's k-means, spherical (unit-length centroids) for cosine similarity"""
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(data))
+    centroids = data[rng.choice(len(data), clusters, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        labels = assign(data, centroids, spherical)
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=clusters)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.add.reduceat(data[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+        # Empty clusters restart from random points
+        if not filled.all():
+            centroids[~filled] = data[rng.choice(len(data), int((~filled).sum()), replace=False)]
+        if spherical:
+            centroids = normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of a LocalVectorStore.
+
+    quantization="pq" keeps `subvectors` bytes per vector (96 for 1536 dims by default),
+    "int8" keeps one byte per dimension. Codes describe the residual to the list centroid,
+    so for a query q the approximate score is q.centroid + q.residual, where q.residual
+    comes from a lookup table (pq) or one product with the codes (int8).
+    A point overwritten in place keeps its old codes until the index is rebuilt;
+    the exact re-ranking still scores it with the new vector.
+    """
+    def __init__(self, dim: int = 1536, lists: Optional[int] = None, quantization: str = "pq",
+                 subvectors: int = 96, nprobe: int = 8, rerank: int = 100, seed: int = 0):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r} (use one of {QUANTIZATIONS})")
+        if quantization == "pq" and dim % subvectors:
+            raise ValueError(f"{dim} dimensions cannot be split into {subvectors} subvectors")
+        self.dim = dim
+        self.lists = lists
+        self.quantization = quantization
+        self.subvectors = subvectors
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        # pq: (subvectors, 256, dim / subvectors) codebooks; int8: per-dimension minimum and step
+        self.codebooks: Optional[np.ndarray] = None
+        self.minimum: Optional[np.ndarray] = None
+        self.step: Optional[np.ndarray] = None
+        # Per indexed store row: its list and its codes
+        self.labels = np.empty(0, dtype=np.int32)
+        self.codes = np.empty((0, subvectors if quantization == "pq" else dim), dtype=np.uint8)
+        # Rows grouped by list: list_rows[list_offsets[i]:list_offsets[i + 1]] belong to list i
+        self.list_rows = np.empty(0, dtype=np.int32)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def indexed(self) -> int:
+        """Store rows covered by the index - rows appended later are searched exactly"""
+        return len(self.labels)
+
+    def train(self, vectors: np.ndarray, iterations: int = 20):
+        """Learn the coarse centroids and the quantizer from a sample of normalized vectors"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        lists = self.lists or max(1, min(4096, int(4 * np.sqrt(len(vectors)))))
+        self.centroids = kmeans(vectors, lists, iterations, spherical=True, seed=self.seed)
+        residuals = vectors - self.centroids[assign(vectors, self.centroids)]
+
+        if self.quantization == "pq":
+            sub_dim = self.dim // self.subvectors
+            # 100 points per codeword are enough for 256 codewords of a few dimensions
+            sample = residuals[:256 * 100]
+            self.codebooks = np.stack([
+                kmeans(sample[:, m * sub_dim:(m + 1) * sub_dim], 256, iterations, spherical=False, seed=self.seed + m)
+                for m in range(self.subvectors)
+            ])
+        else:
+            # Clip the extreme 0.1% so a few outliers do not waste the 256 levels
+            self.minimum = np.percentile(residuals, 0.1, axis=0).astype(np.float32)
+            maximum = np.percentile(residuals, 99.9, axis=0).astype(np.float32)
+            self.step = np.maximum(maximum - self.minimum, 1e-6) / 255
+
+    def encode(self, residuals: np.ndarray) -> np.ndarray:
+        if self.quantization == "pq":
+            sub_dim = self.dim // self.subvectors
+            return np.stack([
+                assign(residuals[:, m * sub_dim:(m + 1) * sub_dim], self.codebooks[m], spherical=False)
+                for m in range(self.subvectors)
+            ], axis=1).astype(np.uint8)
+        return np.clip(np.rint((residuals - self.minimum) / self.step), 0, 255).astype(np.uint8)
+
+    def add(self, vectors: np.ndarray):
+        """Index the next store rows (vectors in row order, starting at `indexed`)"""
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+        labels = assign(vectors, self.centroids)
+        codes = self.encode(vectors - self.centroids[labels])
+        self.labels = np.concatenate([self.labels, labels])
+        self.codes = np.concatenate([self.codes, codes])
+        self.list_rows = np.argsort(self.labels, kind='stable').astype(np.int32)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.labels, minlength=len(self.centroids)))])
+
+    def update(self, store: LocalVectorStore, min_points: int = 10000, train_size: int = 50000,
+               block_rows: int = 16384):
+        """
+        Train on the store if needed and index the rows appended since the last update.
+        Stores smaller than min_points stay untrained and are searched exactly.
+        """
+        if not self.trained:
+            rng = np.random.default_rng(self.seed)
+            alive_rows = np.flatnonzero(store.alive[:store.size])
+            if len(alive_rows) < min_points:
+                return
+            sample = np.sort(rng.choice(alive_rows, min(train_size, len(alive_rows)), replace=False))
+            self.train(store.vectors(sample))
+        for start in range(self.indexed, store.size, block_rows):
+            self.add(store.vectors(np.arange(start, min(start + block_rows, store.size))))
+
+    def approximate_scores(self, query: np.ndarray, centroid_scores: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """q.centroid + q.residual from the codes of the given rows"""
+        codes = self.codes[rows]
+        if self.quantization == "pq":
+            sub_dim = self.dim // self.subvectors
+            # table[m, c] = query subvector m . codeword c of subspace m
+            table = np.einsum('mcd,md->mc', self.codebooks, query.reshape(self.subvectors, sub_dim))
+            residual = table[np.arange(self.subvectors), codes].sum(axis=1)
+        else:
+            residual = codes.astype(np.float32) @ (query * self.step) + query @ self.minimum
+        return centroid_scores[self.labels[rows]] + residual
+
+    def search(self, store: LocalVectorStore, query_vector: Sequence[float], limit: int = 10,
+               nprobe: Optional[int] = None, rerank: Optional[int] = None,
+               query_filter: Optional[Dict] = None) -> List[SearchHit]:
+        """Approximate top `limit` points, re-ranked with the exact cosine similarity"""
+        return self.search_batch(store, [query_vector], limit, nprobe, rerank, query_filter)[0]
+
+    def search_batch(self, store: LocalVectorStore, query_vectors: Sequence[Sequence[float]], limit: int = 10,
+                     nprobe: Optional[int] = None, rerank: Optional[int] = None,
+                     query_filter: Optional[Dict] = None) -> List[List[SearchHit]]:
+        # A payload filter already narrows the candidates, so they are scored exactly
+        if not self.trained or query_filter:
+            return store.search_batch(query_vectors, limit, query_filter)
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dim))
+        nprobe = nprobe or self.nprobe
+        rerank = max(rerank or self.rerank, limit)
+        size = store.size
+
+        ranked_rows = []
+        ranked_scores = []
+        for query in queries:
+            # Rows of the nprobe lists closest to the query
+            centroid_scores = self.centroids @ query
+            probed = np.argpartition(-centroid_scores, min(nprobe, len(centroid_scores)) - 1)[:nprobe]
+            rows = np.concatenate([self.list_rows[self.list_offsets[i]:self.list_offsets[i + 1]] for i in probed])
+            if len(rows) > rerank:
+                scores = self.approximate_scores(query, centroid_scores, rows)
+                rows = rows[np.argpartition(-scores, rerank - 1)[:rerank]]
+            # Rows appended after the last update are not in the lists yet
+            rows = np.concatenate([rows, np.arange(self.indexed, size)])
+            rows = np.sort(rows[store.alive[rows]])
+            if len(rows) == 0:
+                ranked_rows.append(rows)
+                ranked_scores.append(np.empty(0, dtype=np.float32))
+                continue
+            exact = store.vectors(rows) @ query
+            top = np.argsort(-exact)[:limit]
+            ranked_rows.append(rows[top])
+            ranked_scores.append(exact[top])
+        return store.load_hits(ranked_rows, ranked_scores)
+
+    def memory_bytes(self) -> int:
+        """RAM used by the index (the full vectors stay on disk)"""
+        arrays = [self.centroids, self.codebooks, self.minimum, self.step,
+                  self.labels, self.codes, self.list_rows, self.list_offsets]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def save(self, path: str):
+        arrays = {"labels": self.labels, "codes": self.codes, "centroids": self.centroids}
+        if self.quantization == "pq":
+            arrays["codebooks"] = self.codebooks
+        else:
+            arrays.update(minimum=self.minimum, step=self.step)
+        temporary_path = path + ".tmp.npz"
+        np.savez(temporary_path, **arrays)
+        os.replace(temporary_path, path)
+
+    def load(self, path: str):
+        with np.load(path) as data:
+            self.centroids = data["centroids"]
+            self.labels = data["labels"]
+            self.codes = data["codes"]
+            if self.quantization == "pq":
+                self.codebooks = data["codebooks"]
+            else:
+                self.minimum, self.step = data["minimum"], data["step"]
+        self.list_rows = np.argsort(self.labels, kind='stable').astype(np.int32)
+        self.list_offsets = np.concatenate([[0], np.cumsum(np.bincount(self.labels, minlength=len(self.centroids)))])
+
+
+def open_ivf_index(store: LocalVectorStore, quantization: str = "pq", **options) -> IVFIndex:
+    """The index saved next to the store (ivf_<quantization>.npz), or a new untrained one"""
+    index = IVFIndex(dim=store.dim, quantization=quantization, **options)
+    path = os.path.join(store.folder, f"ivf_{quantization}.npz")
+    if os.path.exists(path):
+        index.load(path)
+    return index
+
+
+def save_ivf_index(store: LocalVectorStore, index: IVFIndex):
+    index.save(os.path.join(store.folder, f"ivf_{index.quantization}.npz"))
@@ -0,0 +1,287 @@
+# lib/llm.py
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+from openai import APIConnectionError, InternalServerError, RateLimitError
+
+from lib.openai_client import get_async_client, get_client
+from lib.llm_cache import get_cache, make_cache_key
+from lib.rate_limiter import estimate_tokens, get_rate_limiter, parse_reset_duration
+from lib.single_flight import get_single_flight
+from lib.telemetry import record_cache_hit, track_call
+
+# 429, 5xx, timeout and connection errors are retried this many times
+MAX_RETRIES = int(os.getenv("LLM_max_retries", "8"))
+# APITimeoutError is an APIConnectionError
+TRANSIENT_ERRORS = (InternalServerError, APIConnectionError)
+
+
+def rate_limit_delay(error: RateLimitError, attempt: int) -> float:
+    """Seconds to pause after a 429 - Retry-After header or exponential backoff with jitter"""
+    retry_after = parse_reset_duration(error.response.headers.get("retry-after"))
+    if retry_after:
+        return retry_after
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def transient_error_delay(attempt: int) -> float:
+    """Seconds to pause after a 5xx or connection error - exponential backoff with jitter"""
+    return min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def is_quota_error(error: RateLimitError) -> bool:
+    # Exhausted quota is also a 429, but waiting will not help
+    return getattr(error, "code", None) == "insufficient_quota"
+
+
+def used_tokens(response):
+    # Whisper and image responses have no token usage
+    return getattr(getattr(response, "usage", None), "total_tokens", None)
+
+
+def call_kind(messages: List[Dict]) -> str:
+    """"vision" when the request contains images, otherwise "chat" (used in telemetry)"""
+    for message in messages:
+        if isinstance(message.get("content"), list):
+            if any(part.get("type") == "image_url" for part in message["content"]):
+                return "vision"
+    return "chat"
+
+
+def send_with_limiter(model: str, estimated_tokens: int, request: Callable[[Any], Any], call=None,
+                      keep_slot: bool = False):
+    """
+    Send one API request through the shared rate limiter of the model, retrying 429, 5xx and
+    connection errors. request(client) makes the call with with_raw_response, e.g.
+    lambda client: client.embeddings.with_raw_response.create(...). Returns the parsed response.
+    With keep_slot the limiter slot stays taken after success (a stream being read) - the caller
+    releases it with on_success or on_error.
+    """
+    limiter = get_rate_limiter(model)
+    # Retries are handled here, so the limiter sees every 429 and every failed call
+    client = get_client().with_options(max_retries=0)
+
+    for attempt in range(MAX_RETRIES + 1):
+        if call is not None:
+            call.retries = attempt
+        limiter.acquire(estimated_tokens)
+        try:
+            raw_response = request(client)
+            response = raw_response.parse()
+        except RateLimitError as e:
+            if is_quota_error(e) or attempt == MAX_RETRIES:
+                limiter.on_error()
+                raise
+            limiter.on_rate_limited(e.response.headers, retry_after=rate_limit_delay(e, attempt))
+            continue
+        except TRANSIENT_ERRORS:
+            limiter.on_error()
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(transient_error_delay(attempt))
+            continue
+        except BaseException:
+            # Also covers cancellation and interrupts, so the in-flight slot is always released
+            limiter.on_error()
+            raise
+        if not keep_slot:
+            limiter.on_success(raw_response.headers, estimated_tokens, used_tokens(response))
+        return response
+
+
+async def async_send_with_limiter(model: str, estimated_tokens: int, request: Callable[[Any], Awaitable[Any]], call=None):
+    """Async version of send_with_limiter - request(client) gets the async client"""
+    limiter = get_rate_limiter(model)
+    client = get_async_client().with_options(max_retries=0)
+
+    for attempt in range(MAX_RETRIES + 1):
+        if call is not None:
+            call.retries = attempt
+        await limiter.acquire_async(estimated_tokens)
+        try:
+            raw_response = await request(client)
+            response = raw_response.parse()
+        except RateLimitError as e:
+            if is_quota_error(e) or attempt == MAX_RETRIES:
+                limiter.on_error()
+                raise
+            limiter.on_rate_limited(e.response.headers, retry_after=rate_limit_delay(e, attempt))
+            continue
+        except TRANSIENT_ERRORS:
+            limiter.on_error()
+            if attempt == MAX_RETRIES:
+                raise
+            await asyncio.sleep(transient_error_delay(attempt))
+            continue
+        except BaseException:
+            # Also covers cancellation and interrupts, so the in-flight slot is always released
+            limiter.on_error()
+            raise
+        limiter.on_success(raw_response.headers, estimated_tokens, used_tokens(response))
+        return response
+
+
+def create_chat_completion(model: str, messages: List[Dict], **params):
+    """Send a chat request through the shared rate limiter, retrying 429, 5xx and connection errors"""
+    estimated_tokens = estimate_tokens(messages, params.get("max_tokens"))
+    with track_call(call_kind(messages), model) as call:
+        response = send_with_limiter(
+            model, estimated_tokens,
+            lambda client: client.chat.completions.with_raw_response.create(model=model, messages=messages, **params),
+            call
+        )
+        call.set_usage(response.usage)
+        return response
+
+
+async def async_create_chat_completion(model: str, messages: List[Dict], **params):
+    """Async version of create_chat_completion"""
+    estimated_tokens = estimate_tokens(messages, params.get("max_tokens"))
+    async with track_call(call_kind(messages), model) as call:
+        response = await async_send_with_limiter(
+            model, estimated_tokens,
+            lambda client: client.chat.completions.with_raw_response.create(model=model, messages=messages, **params),
+            call
+        )
+        call.set_usage(response.usage)
+        return response
+
+
+def chat_completion(model: str, messages: List[Dict], use_cache: bool = True, **params) -> str:
+    """
+    Send a chat (or vision) request and return the answer text.
+    Identical requests are answered from the local cache.
+    """
+    cache = get_cache() if use_cache else None
+    key = make_cache_key(model, messages, **params)
+    if cache:
+        cached_answer = cache.get(key)
+        if cached_answer is not None:
+            record_cache_hit(call_kind(messages), model)
+            return cached_answer
+
+    def fetch_answer():
+        response = create_chat_completion(model, messages, **params)
+        answer = response.choices[0].message.content
+        if cache and answer is not None:
+            cache.set(key, answer, model=model)
+        return answer
+
+    # Identical requests sent at the same moment (e.g. from other threads) share one call
+    answer, shared = get_single_flight("chat").do(key, fetch_answer)
+    if shared:
+        record_cache_hit(call_kind(messages), model, status="coalesced")
+    return answer
+
+
+async def async_chat_completion(model: str, messages: List[Dict], use_cache: bool = True, **params) -> str:
+    """Async version of chat_completion for pipelines that run many requests at once"""
+    cache = get_cache() if use_cache else None
+    key = make_cache_key(model, messages, **params)
+    if cache:
+        cached_answer = cache.get(key)
+        if cached_answer is not None:
+            record_cache_hit(call_kind(messages), model)
+            return cached_answer
+
+    async def fetch_answer():
+        response = await async_create_chat_completion(model, messages, **params)
+        answer = response.choices[0].message.content
+        if cache and answer is not None:
+            cache.set(key, answer, model=model)
+        return answer
+
+    answer, shared = await get_single_flight("chat").do_async(key, fetch_answer)
+    if shared:
+        record_cache_hit(call_kind(messages), model, status="coalesced")
+    return answer
+
+
+class ChatStream:
+    """
+    Streamed chat answer - iterate over it to get the text pieces as they arrive.
+    After the loop, `text` holds the whole answer and the timings of the call are set:
+    `time_to_first_token` and `total_time` (seconds).
+    """
+    def __init__(self, model: str, messages: List[Dict], use_cache: bool = True, **params):
+        self.model = model
+        self.messages = messages
+        self.use_cache = use_cache
+        self.params = params
+        self.text = ""
+        self.time_to_first_token: Optional[float] = None
+        self.total_time: Optional[float] = None
+        self.from_cache = False
+
+    def __iter__(self) -> Iterator[str]:
+        start_time = time.perf_counter()
+        cache = get_cache() if self.use_cache else None
+        key = make_cache_key(self.model, self.messages, **self.params) if cache else None
+        cached_answer = cache.get(key) if cache else None
+        if cached_answer is not None:
+            self.from_cache = True
+            self.text = cached_answer
+            self.time_to_first_token = self.total_time = time.perf_counter() - start_time
+            record_cache_hit(call_kind(self.messages), self.model)
+            yield cached_answer
+            return
+
+        limiter = get_rate_limiter(self.model)
+        estimated_tokens = estimate_tokens(self.messages, self.params.get("max_tokens"))
+        with track_call(call_kind(self.messages), self.model) as call:
+            # Opening the stream is retried like any other call - nothing has been yielded yet
+            stream = send_with_limiter(
+                self.model, estimated_tokens,
+                lambda client: client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=self.messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **self.params
+                ),
+                call, keep_slot=True
+            )
+            try:
+                parts = []
+                usage = None
+                for chunk in stream:
+                    if chunk.usage:
+                        usage = chunk.usage
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if self.time_to_first_token is None:
+                        self.time_to_first_token = time.perf_counter() - start_time
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+            except BaseException:
+                # Also covers the caller stopping the iteration early
+                limiter.on_error()
+                raise
+            limiter.on_success(stream.response.headers, estimated_tokens, usage.total_tokens if usage else None)
+            call.set_usage(usage)
+            call.extra["ttft_ms"] = round((self.time_to_first_token or 0) * 1000, 2)
+
+        self.text = "".join(parts)
+        self.total_time = time.perf_counter() - start_time
+        if cache and self.text:
+            cache.set(key, self.text, model=self.model)
+
+    def timings(self) -> str:
+        """Short summary of the call timings"""
+        if self.total_time is None:
+            return "not finished"
+        source = " (cache)" if self.from_cache else ""
+        return f"time to first token: {self.time_to_first_token or 0:.2f}s, total: {self.total_time:.2f}s{source}"
+
+
+def print_cache_stats():
+    """Print hit/miss counters of the completion cache"""
+    cache = get_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"(hit rate {stats['hit_rate']:.0%}), {stats['entries']} entries, "
+              f"{stats['size_bytes'] / 1024:.1f} KB")
@@ -0,0 +1,170 @@
+# lib/llm_cache.py
+import base64
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(root_folder, '.cache', 'llm_cache.sqlite')
+
+# Matches inline images sent to the vision models
+DATA_URL_REGEX = re.compile(r'^data:(image/[\w.+-]*);base64,(.*)$', re.DOTALL)
+
+
+def hash_image_data_urls(value):
+    """Replace base64 image payloads with the hash of the image bytes"""
+    if isinstance(value, dict):
+        return {key: hash_image_data_urls(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [hash_image_data_urls(item) for item in value]
+    if isinstance(value, str):
+        match = DATA_URL_REGEX.match(value)
+        if match:
+            try:
+                image_bytes = base64.b64decode(match.group(2))
+            except ValueError:
+                image_bytes = match.group(2).encode('utf-8')
+            return f"{match.group(1)};sha256:{hashlib.sha256(image_bytes).hexdigest()}"
+    return value
+
+
+def make_cache_key(model: str, messages: List[Dict], **params) -> str:
+    """Content address of a request: model, full message list, image hashes, call parameters and base URL"""
+    request = {
+        "model": model,
+        "messages": hash_image_data_urls(messages),
+        "params": params
+    }
+    # Answers of a stand-in server (OpenAI_baseURL) are never served to runs against the real API
+    base_url = os.getenv('OpenAI_baseURL')
+    if base_url:
+        request["base_url"] = base_url
+    canonical = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent completion cache stored in SQLite.
+    Entries expire after the TTL and the least recently used ones are evicted
+    once the stored answers exceed the size cap.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 256 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_completions_last_access ON completions(last_access)")
+        self.db.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached answer or None (counts a hit or a miss)"""
+        with self.lock:
+            row = self.db.execute("SELECT value, created FROM completions WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created = row
+            if self.ttl_seconds and now - created > self.ttl_seconds:
+                # Expired entries are dropped on read
+                self.db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.db.commit()
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, model: str = None):
+        """Store an answer and evict old entries if the cache is over its size cap"""
+        size = len(value.encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO completions (key, model, value, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, size, now, now)
+            )
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        # Caller holds the lock
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM completions ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute("DELETE FROM completions WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM completions")
+            self.db.commit()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters of this process and the current cache size"""
+        with self.lock:
+            entries, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMCache]:
+    """Return the process-wide cache configured from .env, or None when caching is disabled"""
+    global _cache
+    if os.getenv("LLM_cache", "1") == "0":
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                ttl_hours = float(os.getenv("LLM_cache_ttl_hours", "168"))
+                _cache = LLMCache(
+                    path=os.getenv("LLM_cache_path", DEFAULT_CACHE_PATH),
+                    max_bytes=int(float(os.getenv("LLM_cache_max_mb", "256")) * 1024 * 1024),
+                    ttl_seconds=ttl_hours * 3600 if ttl_hours > 0 else None
+                )
+    return _cache
@@ -0,0 +1,551 @@
+# lib/mock_openai_server.py
+# Run from the repository root: python -m lib.mock_openai_server --latency 0.2 --fixtures fixtures.json
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import struct
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from lib.llm_cache import hash_image_data_urls
+
+DEFAULT_UPSTREAM_URL = "https://api.openai.com/v1"
+
+# Request fields that change how the answer is delivered, not what it is
+DELIVERY_FIELDS = ("stream", "stream_options", "encoding_format", "user")
+
+# 1x1 transparent PNG returned by the image endpoints
+MOCK_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+def chat_completion_response(model: str, content: str) -> dict:
+    """Build a response body shaped like the OpenAI chat completions API"""
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}
+    }
+
+
+def mock_chat_answer(request: dict) -> str:
+    """Canned answer - vision requests also report how many images they received"""
+    images = 0
+    for message in request.get("messages", []):
+        if isinstance(message.get("content"), list):
+            images += sum(1 for part in message["content"] if part.get("type") == "image_url")
+    return f"OK ({images} image(s) received)" if images else "OK"
+
+
+def mock_embedding(text: str, dimensions: int) -> list:
+    """Deterministic unit vector - the same text always gets the same embedding"""
+    generator = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [generator.gauss(0, 1) for _ in range(dimensions)]
+    norm = sum(value * value for value in vector) ** 0.5
+    return [value / norm for value in vector]
+
+
+def embeddings_response(model: str, inputs: list) -> dict:
+    dimensions = 3072 if "large" in model else 1536
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": index, "embedding": mock_embedding(str(text), dimensions)}
+            for index, text in enumerate(inputs)
+        ],
+        "model": model,
+        "usage": {"prompt_tokens": sum(len(str(text)) // 4 + 1 for text in inputs),
+                  "total_tokens": sum(len(str(text)) // 4 + 1 for text in inputs)}
+    }
+
+
+def encode_embeddings(body: dict, encoding_format: Optional[str]) -> dict:
+    """The SDK asks for base64 encoded float32 vectors by default"""
+    if encoding_format != "base64":
+        return body
+    body = dict(body)
+    body["data"] = [
+        {**item, "embedding": base64.b64encode(struct.pack(f"<{len(item['embedding'])}f", *item["embedding"])).decode("ascii")}
+        for item in body["data"]
+    ]
+    return body
+
+
+def fixture_key(endpoint: str, request: dict, file_content: Optional[bytes] = None) -> str:
+    """Key of a recorded response - delivery options and image bytes are left out or hashed"""
+    request = {key: value for key, value in request.items() if key not in DELIVERY_FIELDS}
+    payload = {"endpoint": endpoint, "request": hash_image_data_urls(request)}
+    if file_content is not None:
+        payload["file_sha256"] = hashlib.sha256(file_content).hexdigest()
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class FixtureStore:
+    """Recorded API responses kept in a JSON file, {key: {"endpoint", "status", "json" or "text"}}"""
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fixtures = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.fixtures = json.load(file)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            return self.fixtures.get(key)
+
+    def set(self, key: str, fixture: dict):
+        with self.lock:
+            self.fixtures[key] = fixture
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Write to a temporary file first so an interrupted run does not corrupt the fixtures
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(self.fixtures, file, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+
+
+class MockState:
+    """Uploaded files, batch jobs and the behaviour settings of the stand-in server"""
+    def __init__(self, batch_delay: float = 0.5, latency: float = 0.0, jitter: float = 0.0,
+                 token_latency: float = 0.0, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 fixtures: Optional[FixtureStore] = None, record: bool = False,
+                 upstream_url: str = DEFAULT_UPSTREAM_URL, seed: Optional[int] = None):
+        self.files = {}
+        self.batches = {}
+        self.batch_delay = batch_delay
+        self.latency = latency
+        self.jitter = jitter
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.fixtures = fixtures
+        self.record = record
+        self.upstream_url = upstream_url.rstrip("/")
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # Counters for reporting
+        self.requests = 0
+        self.replayed = 0
+        self.recorded = 0
+        self.injected_errors = 0
+
+    def response_delay(self) -> float:
+        with self.lock:
+            return self.latency + self.random.uniform(0, self.jitter)
+
+    def injected_error(self) -> Optional[int]:
+        """Status code of a synthetic failure for this request, or None"""
+        with self.lock:
+            self.requests += 1
+            draw = self.random.random()
+            if draw < self.rate_limit_rate:
+                self.injected_errors += 1
+                return 429
+            if draw < self.rate_limit_rate + self.error_rate:
+                self.injected_errors += 1
+                return 500
+        return None
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "replayed": self.replayed,
+                "recorded": self.recorded,
+                "injected_errors": self.injected_errors
+            }
+
+    def add_file(self, filename: str, purpose: str, content: bytes) -> dict:
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        file_object = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        with self.lock:
+            self.files[file_id] = (file_object, content)
+        return file_object
+
+    def create_batch(self, input_file_id: str, endpoint: str, completion_window: str, metadata) -> dict:
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self.run_batch, args=(batch_id,), daemon=True).start()
+        return batch
+
+    def run_batch(self, batch_id: str):
+        """Answer every request of the batch file, like the real API does in the background"""
+        with self.lock:
+            batch = self.batches[batch_id]
+            input_file = self.files.get(batch["input_file_id"])
+        if input_file is None:
+            with self.lock:
+                batch["status"] = "failed"
+                batch["errors"] = {"object": "list", "data": [{"code": "invalid_file", "message": "Input file not found"}]}
+            return
+
+        lines = [json.loads(line) for line in input_file[1].decode("utf-8").splitlines() if line.strip()]
+        with self.lock:
+            batch["status"] = "in_progress"
+            batch["request_counts"]["total"] = len(lines)
+        time.sleep(self.batch_delay)
+
+        output_lines = []
+        for request in lines:
+            body = chat_completion_response(request["body"].get("model", "mock"), mock_chat_answer(request["body"]))
+            output_lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": body},
+                "error": None
+            }))
+        output_file = self.add_file(f"{batch_id}_output.jsonl", "batch_output", ("\n".join(output_lines) + "\n").encode("utf-8"))
+
+        with self.lock:
+            batch["request_counts"]["completed"] = len(lines)
+            batch["output_file_id"] = output_file["id"]
+            batch["status"] = "completed"
+            batch["completed_at"] = int(time.time())
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Answers OpenAI API requests with recorded or canned responses"""
+    # HTTP/1.1 so the client can keep the connection alive between calls
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def read_json_body(self) -> dict:
+        body = self.read_body()
+        return json.loads(body) if body else {}
+
+    def parse_form_body(self, body: bytes) -> dict:
+        """Parse a multipart/form-data upload into {field: (filename, bytes)}"""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=default_policy).parsebytes(header + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        return fields
+
+    def read_form_body(self) -> dict:
+        return self.parse_form_body(self.read_body())
+
+    def send_bytes(self, body: bytes, content_type: str, status: int = 200, headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, data: dict, status: int = 200, headers: Optional[Dict] = None):
+        self.send_bytes(json.dumps(data).encode("utf-8"), "application/json", status, headers)
+
+    def send_error_json(self, status: int, message: str, error_type: str, code: Optional[str] = None, headers: Optional[Dict] = None):
+        self.send_json({"error": {"message": message, "type": error_type, "param": None, "code": code}}, status, headers)
+
+    def send_not_found(self):
+        self.send_error_json(404, f"Unknown path {self.path}", "invalid_request_error")
+
+    def send_injected_error(self, status: int):
+        if status == 429:
+            self.send_error_json(429, "Synthetic rate limit", "requests", "rate_limit_exceeded",
+                                 headers={"retry-after": "0.1", "x-ratelimit-remaining-requests": "0",
+                                          "x-ratelimit-reset-requests": "100ms"})
+        else:
+            self.send_error_json(500, "Synthetic server error", "server_error")
+
+    def send_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def send_chat_stream(self, body: dict, include_usage: bool):
+        """Send a finished chat completion as server-sent events, one word per chunk"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        content = body["choices"][0]["message"]["content"] or ""
+        words = content.split(" ")
+        base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+        for index, word in enumerate(words):
+            if index and self.state.token_latency:
+                time.sleep(self.state.token_latency)
+            piece = word if index == len(words) - 1 else word + " "
+            delta = {"role": "assistant", "content": piece} if index == 0 else {"content": piece}
+            chunk = {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        chunk = {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": body["choices"][0].get("finish_reason", "stop")}]}
+        self.send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        if include_usage:
+            chunk = {**base, "choices": [], "usage": body.get("usage")}
+            self.send_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.send_chunk(b"data: [DONE]\n\n")
+        self.send_chunk(b"")
+
+    def forward_to_upstream(self, path: str, json_body: Optional[dict] = None, raw_body: Optional[bytes] = None) -> dict:
+        """Send the request to the real API and return it as a fixture"""
+        headers = {"Authorization": self.headers.get("Authorization", "")}
+        url = self.state.upstream_url + path[path.find("/", 1):] if path.startswith("/v1/") else self.state.upstream_url + path
+        if json_body is not None:
+            headers["Content-Type"] = "application/json"
+            raw_body = json.dumps(json_body).encode("utf-8")
+        else:
+            headers["Content-Type"] = self.headers.get("Content-Type")
+
+        request = urllib.request.Request(url, data=raw_body, headers=headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                status, content_type, body = response.status, response.headers.get("Content-Type", ""), response.read()
+        except urllib.error.HTTPError as e:
+            status, content_type, body = e.code, e.headers.get("Content-Type", ""), e.read()
+
+        fixture = {"endpoint": path, "status": status}
+        if content_type.startswith("application/json"):
+            fixture["json"] = json.loads(body)
+        else:
+            fixture["text"] = body.decode("utf-8")
+        return fixture
+
+    def resolve(self, path: str, key: str, synthetic, json_body: Optional[dict] = None, raw_body: Optional[bytes] = None) -> dict:
+        """Recorded response for the key, a freshly recorded one or a synthetic one"""
+        fixtures = self.state.fixtures
+        fixture = fixtures.get(key) if fixtures else None
+        if fixture is not None:
+            with self.state.lock:
+                self.state.replayed += 1
+            return fixture
+        if fixtures and self.state.record:
+            fixture = self.forward_to_upstream(path, json_body, raw_body)
+            if fixture["status"] == 200:
+                fixtures.set(key, fixture)
+                with self.state.lock:
+                    self.state.recorded += 1
+            return fixture
+        return {"endpoint": path, "status": 200, **synthetic()}
+
+    def send_fixture(self, fixture: dict):
+        if "json" in fixture:
+            self.send_json(fixture["json"], fixture["status"])
+        else:
+            self.send_bytes(fixture.get("text", "").encode("utf-8"), "text/plain; charset=utf-8", fixture["status"])
+
+    def handle_chat(self, path: str, request: dict):
+        key = fixture_key("chat/completions", request)
+        # Streamed answers are recorded as whole completions and split up again
+        upstream_request = {name: value for name, value in request.items() if name not in ("stream", "stream_options")}
+        fixture = self.resolve(
+            path, key,
+            lambda: {"json": chat_completion_response(request.get("model", "mock"), mock_chat_answer(request))},
+            json_body=upstream_request
+        )
+        if fixture["status"] == 200 and request.get("stream"):
+            self.send_chat_stream(fixture["json"], (request.get("stream_options") or {}).get("include_usage", False))
+        else:
+            self.send_fixture(fixture)
+
+    def handle_embeddings(self, path: str, request: dict):
+        inputs = request.get("input")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        key = fixture_key("embeddings", request)
+        # Vectors are recorded as floats and encoded the way this request wants them
+        upstream_request = {**request, "encoding_format": "float"}
+        fixture = self.resolve(
+            path, key,
+            lambda: {"json": embeddings_response(request.get("model", "mock"), inputs)},
+            json_body=upstream_request
+        )
+        if fixture["status"] == 200:
+            self.send_json(encode_embeddings(fixture["json"], request.get("encoding_format")))
+        else:
+            self.send_fixture(fixture)
+
+    def handle_transcription(self, path: str):
+        raw_body = self.read_body()
+        fields = self.parse_form_body(raw_body)
+        filename, content = fields.get("file", ("audio", b""))
+        options = {name: (value[1] or b"").decode("utf-8") for name, value in fields.items() if name != "file"}
+        response_format = options.get("response_format", "json")
+
+        def synthetic():
+            text = f"Mock transcription of {filename} ({len(content or b'')} bytes)."
+            if response_format in ("json", "verbose_json"):
+                return {"json": {"text": text}}
+            return {"text": text}
+
+        key = fixture_key("audio/transcriptions", options, content or b"")
+        self.send_fixture(self.resolve(path, key, synthetic, raw_body=raw_body))
+
+    def handle_image_generation(self, path: str, request: dict):
+        def synthetic():
+            data = []
+            for _ in range(request.get("n") or 1):
+                if request.get("response_format") == "b64_json":
+                    data.append({"b64_json": base64.b64encode(MOCK_PNG).decode("ascii"), "revised_prompt": request.get("prompt")})
+                else:
+                    host, port = self.server.server_address[:2]
+                    data.append({"url": f"http://{host}:{port}/mock-images/{uuid.uuid4().hex[:12]}.png", "revised_prompt": request.get("prompt")})
+            return {"json": {"created": int(time.time()), "data": data}}
+
+        key = fixture_key("images/generations", request)
+        self.send_fixture(self.resolve(path, key, synthetic, json_body=request))
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        # Files and batches are local bookkeeping, only the model endpoints get latency and errors
+        if path.endswith("/files"):
+            fields = self.read_form_body()
+            filename, content = fields.get("file", ("upload.jsonl", b""))
+            purpose = (fields.get("purpose", (None, b"batch"))[1] or b"batch").decode("utf-8")
+            self.send_json(self.state.add_file(filename, purpose, content))
+            return
+        if path.endswith("/batches"):
+            request = self.read_json_body()
+            self.send_json(self.state.create_batch(
+                request.get("input_file_id"),
+                request.get("endpoint"),
+                request.get("completion_window"),
+                request.get("metadata")
+            ))
+            return
+
+        model_endpoints = ("/chat/completions", "/embeddings", "/audio/transcriptions", "/images/generations")
+        if not path.endswith(model_endpoints):
+            self.read_body()
+            self.send_not_found()
+            return
+
+        time.sleep(self.state.response_delay())
+        error_status = self.state.injected_error()
+        if error_status:
+            self.read_body()
+            self.send_injected_error(error_status)
+        elif path.endswith("/chat/completions"):
+            self.handle_chat(path, self.read_json_body())
+        elif path.endswith("/embeddings"):
+            self.handle_embeddings(path, self.read_json_body())
+        elif path.endswith("/audio/transcriptions"):
+            self.handle_transcription(path)
+        else:
+            self.handle_image_generation(path, self.read_json_body())
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "mock-images":
+            self.send_bytes(MOCK_PNG, "image/png")
+            return
+        with self.state.lock:
+            if len(parts) >= 2 and parts[-2] == "batches" and parts[-1] in self.state.batches:
+                self.send_json(self.state.batches[parts[-1]])
+            elif len(parts) >= 3 and parts[-3] == "files" and parts[-1] == "content" and parts[-2] in self.state.files:
+                self.send_bytes(self.state.files[parts[-2]][1], "application/octet-stream")
+            elif len(parts) >= 2 and parts[-2] == "files" and parts[-1] in self.state.files:
+                self.send_json(self.state.files[parts[-1]][0])
+            else:
+                self.send_not_found()
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, batch_delay: float = 0.5,
+                      fixtures_path: Optional[str] = None, **options):
+    """
+    Start the stand-in server in a background thread.
+    Options (latency, jitter, token_latency, error_rate, rate_limit_rate, record, upstream_url, seed)
+    are passed to MockState.
+    Returns the server and its base URL (pass it as OpenAI_baseURL).
+    """
+    server = ThreadingHTTPServer((host, port), MockOpenAIHandler)
+    server.daemon_threads = True
+    fixtures = FixtureStore(fixtures_path) if fixtures_path else None
+    server.state = MockState(batch_delay=batch_delay, fixtures=fixtures, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://{host}:{server.server_address[1]}/v1"
+    return server, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every model call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency, up to this many seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of calls answered with 429")
+    parser.add_argument("--fixtures", help="JSON file with recorded responses to replay")
+    parser.add_argument("--record", action="store_true", help="Forward unknown requests to the real API and save them in --fixtures")
+    parser.add_argument("--upstream", default=DEFAULT_UPSTREAM_URL, help="API used in --record mode")
+    parser.add_argument("--seed", type=int, help="Seed of the latency and error draws")
+    args = parser.parse_args()
+
+    if args.record and not args.fixtures:
+        parser.error("--record needs --fixtures")
+
+    server, base_url = start_mock_server(
+        host=args.host, port=args.port, fixtures_path=args.fixtures,
+        latency=args.latency, jitter=args.jitter, token_latency=args.token_latency,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+        record=args.record, upstream_url=args.upstream, seed=args.seed
+    )
+    print(f"Mock OpenAI server listening on {base_url} (set OpenAI_baseURL={base_url})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(f"Served: {server.state.stats()}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
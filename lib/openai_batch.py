@@ -0,0 +1,113 @@
+# lib/openai_batch.py
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from lib.openai_client import get_client
+
+# Batch statuses after which the job will not change anymore
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def build_batch_request(custom_id: str, model: str, messages: List[Dict], **params) -> Dict:
+    """One line of the batch input file"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {"model": model, "messages": messages, **params}
+    }
+
+
+def write_batch_file(requests: List[Dict], file_path: str) -> str:
+    """Write the requests as a JSONL batch input file"""
+    custom_ids = [request["custom_id"] for request in requests]
+    if len(custom_ids) != len(set(custom_ids)):
+        raise ValueError("custom_id values in a batch have to be unique")
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    with open(file_path, 'w', encoding='utf-8') as file:
+        for request in requests:
+            file.write(json.dumps(request, ensure_ascii=False) + '\n')
+    return file_path
+
+
+def submit_batch(file_path: str, endpoint: str = "/v1/chat/completions",
+                 completion_window: str = "24h", metadata: Optional[Dict] = None) -> str:
+    """Upload the batch file, start the batch job and return its ID"""
+    client = get_client()
+    with open(file_path, 'rb') as batch_file:
+        uploaded_file = client.files.create(file=batch_file, purpose="batch")
+
+    batch = client.batches.create(
+        input_file_id=uploaded_file.id,
+        endpoint=endpoint,
+        completion_window=completion_window,
+        metadata=metadata
+    )
+    print(f"Submitted batch {batch.id} ({os.path.basename(file_path)})")
+    return batch.id
+
+
+def wait_for_batch(batch_id: str, poll_interval: float = 30, timeout: Optional[float] = None):
+    """Poll the batch until it reaches a final status and return the batch object"""
+    client = get_client()
+    start_time = time.time()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if counts:
+            print(f"Batch {batch_id}: {batch.status} ({counts.completed}/{counts.total} done, {counts.failed} failed)")
+        else:
+            print(f"Batch {batch_id}: {batch.status}")
+
+        if batch.status in FINAL_STATUSES:
+            return batch
+        if timeout is not None and time.time() - start_time > timeout:
+            raise TimeoutError(f"Batch {batch_id} did not finish in {timeout} seconds (status: {batch.status})")
+        time.sleep(poll_interval)
+
+
+def parse_batch_output(output_text: str) -> Dict[str, Optional[str]]:
+    """Map every custom_id of a batch output file to its answer (None when the request failed)"""
+    results = {}
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            print(f"Batch request {record.get('custom_id')} failed: {record.get('error') or response.get('body')}")
+            results[record["custom_id"]] = None
+            continue
+        results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+def download_batch_results(batch) -> Dict[str, Optional[str]]:
+    """Download the output (and error) files of a finished batch"""
+    client = get_client()
+    results = {}
+    if batch.output_file_id:
+        results.update(parse_batch_output(client.files.content(batch.output_file_id).text))
+    if batch.error_file_id:
+        results.update(parse_batch_output(client.files.content(batch.error_file_id).text))
+    return results
+
+
+def run_chat_batch(messages_by_id: Dict[str, List[Dict]], model: str, file_path: str,
+                   poll_interval: float = 30, timeout: Optional[float] = None, **params) -> Dict[str, Optional[str]]:
+    """
+    Run a whole batch job: write the file, submit it, wait and map the answers back to the input IDs.
+    IDs without an answer are returned with None.
+    """
+    requests = [build_batch_request(custom_id, model, messages, **params) for custom_id, messages in messages_by_id.items()]
+    write_batch_file(requests, file_path)
+    batch_id = submit_batch(file_path)
+    batch = wait_for_batch(batch_id, poll_interval=poll_interval, timeout=timeout)
+    if batch.status != "completed":
+        print(f"Batch {batch_id} finished with status: {batch.status}")
+
+    results = download_batch_results(batch)
+    return {custom_id: results.get(custom_id) for custom_id in messages_by_id}
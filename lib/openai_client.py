@@ -0,0 +1,83 @@
+# lib/openai_client.py
+import asyncio
+import os
+import threading
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool settings shared by every script (can be tuned from .env)
+MAX_CONNECTIONS = int(os.getenv("OpenAI_max_connections", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OpenAI_max_keepalive", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("OpenAI_keepalive_expiry", "120"))
+REQUEST_TIMEOUT = float(os.getenv("OpenAI_timeout", "120"))
+CONNECT_TIMEOUT = 10.0
+
+_client = None
+_client_lock = threading.Lock()
+_async_clients = {}
+
+
+def get_pool_limits() -> httpx.Limits:
+    """Keep-alive pool limits used by the shared HTTP client"""
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY
+    )
+
+
+def get_timeout() -> httpx.Timeout:
+    """Request timeout used by the shared HTTP client"""
+    return httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+
+
+def get_client() -> OpenAI:
+    """
+    Return the process-wide OpenAI client.
+    The client is created on first use and reuses its pooled connections,
+    so only the first call pays for the TLS handshake.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            # Second check - another thread could have created it in the meantime
+            if _client is None:
+                _client = OpenAI(
+                    api_key=os.getenv("OpenAI_APIkey"),
+                    base_url=os.getenv("OpenAI_baseURL") or None,
+                    http_client=httpx.Client(limits=get_pool_limits(), timeout=get_timeout())
+                )
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Return the shared async OpenAI client for the running event loop.
+    Pooled connections belong to one loop, so each loop gets its own client.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        # Forget clients of loops that are already closed
+        for old_loop in [old_loop for old_loop in _async_clients if old_loop.is_closed()]:
+            del _async_clients[old_loop]
+        client = AsyncOpenAI(
+            api_key=os.getenv("OpenAI_APIkey"),
+            base_url=os.getenv("OpenAI_baseURL") or None,
+            http_client=httpx.AsyncClient(limits=get_pool_limits(), timeout=get_timeout())
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def close_client():
+    """Close the shared client and its connection pool"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
@@ -0,0 +1,25 @@
+# lib/prompts.py
+import textwrap
+from typing import Dict, List, Optional, Union
+
+
+def normalize_prompt(text: str) -> str:
+    """Same text, same bytes - removes the indentation of triple-quoted prompts and stray whitespace"""
+    text = textwrap.dedent(text.replace('\r\n', '\n'))
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def build_messages(instructions: str, user_content: Union[str, List[Dict]],
+                   shared_context: Optional[str] = None) -> List[Dict]:
+    """
+    Chat messages laid out for the provider's prompt caching: the static part
+    (instructions, then context shared by every call) goes first in the system
+    message and stays byte-identical, the part that changes per call goes last.
+    """
+    system_prompt = normalize_prompt(instructions)
+    if shared_context:
+        system_prompt += "\n\n" + normalize_prompt(shared_context)
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_content}
+    ]
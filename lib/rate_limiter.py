@@ -0,0 +1,206 @@
+# lib/rate_limiter.py
+import asyncio
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How long to wait before re-checking a full concurrency window
+POLL_INTERVAL = 0.02
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset headers like "1s", "6m0s", "120ms" or "0.5" into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    seconds = 0.0
+    matches = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not matches:
+        return None
+    for number, unit in matches:
+        seconds += float(number) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+
+def estimate_tokens(messages, max_tokens: Optional[int] = None) -> int:
+    """Rough token estimate of a request (~4 characters per token) used before the real usage is known"""
+    characters = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            characters += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    characters += len(part.get("text", ""))
+                else:
+                    # Images are billed per tile, count them as a low detail image
+                    characters += 85 * 4
+    return characters // 4 + (max_tokens or 256)
+
+
+class TokenBucket:
+    """Budget that refills continuously, e.g. requests or tokens per minute"""
+    def __init__(self, capacity: float, per_seconds: float = 60.0):
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / per_seconds
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 when it is available now)"""
+        self.refill()
+        # Requests bigger than the whole bucket only have to wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def consume(self, amount: float):
+        # Can go below zero when the real usage was bigger than the estimate
+        self.tokens -= amount
+
+    def sync_with_server(self, remaining: Optional[float]):
+        """Trust the server's view of the remaining budget when it is lower than ours"""
+        if remaining is None:
+            return
+        self.refill()
+        self.tokens = min(self.tokens, remaining)
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for the LLM calls of one model.
+    Respects the requests-per-minute and tokens-per-minute budgets and adapts
+    the number of requests in flight (AIMD): +1 per window of successful calls,
+    halved after every 429.
+    """
+    def __init__(self, rpm: float, tpm: float, initial_concurrency: float = 4,
+                 min_concurrency: float = 1, max_concurrency: float = 64,
+                 decrease_factor: float = 0.5):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = float(initial_concurrency)
+        self.min_concurrency = float(min_concurrency)
+        self.max_concurrency = float(max_concurrency)
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+        # Counters for reporting
+        self.successes = 0
+        self.rate_limited = 0
+
+    def try_start(self, estimated_tokens: int) -> float:
+        """Reserve a slot if possible. Returns 0 on success or the seconds to wait"""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.in_flight >= int(self.concurrency):
+                return POLL_INTERVAL
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait > 0:
+                return wait
+            self.requests.consume(1)
+            self.tokens.consume(estimated_tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self, estimated_tokens: int):
+        """Block until the request may be sent"""
+        while True:
+            wait = self.try_start(estimated_tokens)
+            if wait == 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens: int):
+        """Wait (without blocking the event loop) until the request may be sent"""
+        while True:
+            wait = self.try_start(estimated_tokens)
+            if wait == 0:
+                return
+            await asyncio.sleep(wait)
+
+    def on_success(self, headers: Optional[Dict] = None, estimated_tokens: int = 0, used_tokens: Optional[int] = None):
+        """Release the slot, correct the token estimate and grow the window additively"""
+        with self.lock:
+            self.in_flight -= 1
+            self.successes += 1
+            if used_tokens is not None:
+                self.tokens.consume(used_tokens - estimated_tokens)
+            self.update_from_headers(headers)
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def on_rate_limited(self, headers: Optional[Dict] = None, retry_after: Optional[float] = None):
+        """Release the slot, shrink the window multiplicatively and pause until the limit resets"""
+        with self.lock:
+            self.in_flight -= 1
+            self.rate_limited += 1
+            self.concurrency = max(self.min_concurrency, self.concurrency * self.decrease_factor)
+            self.update_from_headers(headers)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    def on_error(self):
+        """Release the slot after an error that is not a rate limit"""
+        with self.lock:
+            self.in_flight -= 1
+
+    def update_from_headers(self, headers: Optional[Dict]):
+        # Caller holds the lock
+        if not headers:
+            return
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            bucket.sync_with_server(float(remaining))
+            reset_seconds = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if float(remaining) <= 0 and reset_seconds:
+                # Budget used up - nothing will pass until the server resets it
+                self.blocked_until = max(self.blocked_until, time.monotonic() + reset_seconds)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "concurrency": round(self.concurrency, 2),
+                "in_flight": self.in_flight,
+                "successes": self.successes,
+                "rate_limited": self.rate_limited
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """Return the shared limiter of the model (limits are configured in .env)"""
+    with _limiters_lock:
+        limiter = _limiters.get(model)
+        if limiter is None:
+            limiter = RateLimiter(
+                rpm=float(os.getenv("LLM_rpm", "500")),
+                tpm=float(os.getenv("LLM_tpm", "200000")),
+                initial_concurrency=float(os.getenv("LLM_initial_concurrency", "4")),
+                max_concurrency=float(os.getenv("LLM_max_concurrency", "64"))
+            )
+            _limiters[model] = limiter
+        return limiter
@@ -0,0 +1,56 @@
+# lib/report_dates.py
+# Dates of dated reports, read from file names (2024-11-12.txt, 2024_11_12.txt,
+# 12.11.2024.txt, 20241112.txt) or from the text (also "12 listopada 2024").
+import datetime
+import os
+import re
+from typing import Optional, Union
+
+POLISH_MONTHS = {
+    "stycznia": 1, "lutego": 2, "marca": 3, "kwietnia": 4, "maja": 5, "czerwca": 6,
+    "lipca": 7, "sierpnia": 8, "września": 9, "października": 10, "listopada": 11, "grudnia": 12
+}
+ISO_DATE = re.compile(r"(?<!\d)(\d{4})[-_./](\d{1,2})[-_./](\d{1,2})(?!\d)")
+DAY_FIRST_DATE = re.compile(r"(?<!\d)(\d{1,2})[-_./](\d{1,2})[-_./](\d{4})(?!\d)")
+COMPACT_DATE = re.compile(r"(?<!\d)(\d{4})(\d{2})(\d{2})(?!\d)")
+POLISH_DATE = re.compile(r"(?<!\d)(\d{1,2})\s+(" + "|".join(POLISH_MONTHS) + r")\s+(\d{4})(?!\d)", re.IGNORECASE)
+
+
+def make_date(year, month, day) -> Optional[datetime.date]:
+    try:
+        return datetime.date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
+def parse_date(text: str, compact: bool = False) -> Optional[datetime.date]:
+    """First valid date in the text; 8-digit dates (20241112) only when compact is set, as IDs look the same"""
+    candidates = []
+    for match in ISO_DATE.finditer(text):
+        candidates.append((match.start(), make_date(*match.groups())))
+    for match in DAY_FIRST_DATE.finditer(text):
+        day, month, year = match.groups()
+        candidates.append((match.start(), make_date(year, month, day)))
+    for match in POLISH_DATE.finditer(text):
+        day, month, year = match.groups()
+        candidates.append((match.start(), make_date(year, POLISH_MONTHS[month.lower()], day)))
+    if compact:
+        for match in COMPACT_DATE.finditer(text):
+            candidates.append((match.start(), make_date(*match.groups())))
+    valid = sorted((position, date) for position, date in candidates if date)
+    return valid[0][1] if valid else None
+
+
+def parse_report_date(file_name: str, content: str = "") -> Optional[datetime.date]:
+    """Date of a report - from its file name first, then from its text"""
+    return parse_date(os.path.splitext(os.path.basename(file_name))[0], compact=True) or parse_date(content)
+
+
+def date_to_int(date: Union[datetime.date, str]) -> int:
+    """YYYYMMDD number, so date ranges are numeric range filters"""
+    if isinstance(date, str):
+        parsed = parse_date(date, compact=True)
+        if parsed is None:
+            raise ValueError(f"Not a date: {date}")
+        date = parsed
+    return date.year * 10000 + date.month * 100 + date.day
@@ -0,0 +1,114 @@
+# lib/single_flight.py
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    """One upstream call and the result handed to everybody waiting for it"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Merges identical requests that are in flight at the same time into one call.
+    The first caller of a key runs the call, the others wait and get the same result
+    (or the same exception). Works for threads (do) and asyncio tasks (do_async).
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls: Dict[Hashable, _Call] = {}
+        self.async_calls: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        # Counters for reporting
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run function once per key in flight. Returns the result and whether it was shared"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+        return call.result, False
+
+    async def do_async(self, key: Hashable, function: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async version of do - identical requests of one event loop share one call"""
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self.lock:
+            task = self.async_calls.get(flight_key)
+            leader = task is None
+            if leader:
+                # The call runs in its own task, so it outlives a cancelled leader
+                task = loop.create_task(function())
+                self.async_calls[flight_key] = task
+                task.add_done_callback(lambda done: self._finish_async(flight_key, done))
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        # Shield, so a cancelled caller does not cancel the shared call
+        return await asyncio.shield(task), not leader
+
+    def _finish_async(self, flight_key: Tuple[int, Hashable], task: asyncio.Task):
+        with self.lock:
+            if self.async_calls.get(flight_key) is task:
+                del self.async_calls[flight_key]
+        # Mark the exception as retrieved even when nobody was left waiting
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            requests = self.executed + self.coalesced
+            return {
+                "requests": requests,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "saved_rate": round(self.coalesced / requests, 3) if requests else 0.0
+            }
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Shared single-flight group, e.g. "chat" or "embeddings" """
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def print_single_flight_stats():
+    """Print how many upstream calls were saved by merging identical requests"""
+    for name, flight in _flights.items():
+        stats = flight.stats()
+        print(f"Single-flight {name}: {stats['requests']} requests, {stats['executed']} sent, "
+              f"{stats['coalesced']} merged ({stats['saved_rate']:.0%} saved)")
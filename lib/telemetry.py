@@ -0,0 +1,237 @@
+# lib/telemetry.py
+# Per-call records of every model call (chat, vision, embeddings, whisper).
+# Summary of the most expensive stages: python -m lib.telemetry [path]
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+lib_folder = os.path.join(root_folder, 'lib')
+DEFAULT_TELEMETRY_PATH = os.path.join(root_folder, '.cache', 'llm_telemetry.jsonl')
+
+
+def find_caller() -> str:
+    """`script.py:function` of the first frame outside lib/ - the stage that made the call"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not os.path.realpath(filename).startswith(lib_folder + os.sep) and not filename.startswith("<"):
+            return f"{os.path.basename(filename)}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def usage_counts(usage) -> Dict:
+    """Token counts of an API usage object (or dict), missing values as 0"""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "total_tokens": 0}
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens") or usage.get("input_tokens") or 0,
+        "completion_tokens": usage.get("completion_tokens") or usage.get("output_tokens") or 0,
+        "cached_tokens": details.get("cached_tokens") or 0,
+        "total_tokens": usage.get("total_tokens") or 0
+    }
+
+
+class PrometheusExporter:
+    """Counters and latency histogram served on a local /metrics endpoint (needs prometheus_client)"""
+    def __init__(self, port: int):
+        from prometheus_client import Counter, Histogram, start_http_server
+
+        labels = ["kind", "model", "caller", "status"]
+        self.calls = Counter("llm_calls_total", "Model calls", labels)
+        self.seconds = Histogram("llm_call_seconds", "Wall time of model calls", labels,
+                                 buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120))
+        self.tokens = Counter("llm_tokens_total", "Tokens used by model calls", ["kind", "model", "caller", "type"])
+        self.retries = Counter("llm_retries_total", "Retried model calls", ["kind", "model", "caller"])
+        start_http_server(port)
+
+    def observe(self, record: Dict):
+        labels = [record["kind"], record["model"], record["caller"], record["status"]]
+        self.calls.labels(*labels).inc()
+        self.seconds.labels(*labels).observe(record["wall_ms"] / 1000)
+        for token_type in ("prompt", "completion", "cached"):
+            if record[f"{token_type}_tokens"]:
+                self.tokens.labels(record["kind"], record["model"], record["caller"], token_type).inc(record[f"{token_type}_tokens"])
+        if record["retries"]:
+            self.retries.labels(record["kind"], record["model"], record["caller"]).inc(record["retries"])
+
+
+class Telemetry:
+    """Writes one JSON line per model call and feeds the optional Prometheus exporter"""
+    def __init__(self, path: Optional[str] = DEFAULT_TELEMETRY_PATH, prometheus_port: Optional[int] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.exporter = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+        if prometheus_port:
+            try:
+                self.exporter = PrometheusExporter(prometheus_port)
+                print(f"LLM metrics served on http://localhost:{prometheus_port}/metrics")
+            except ImportError:
+                print("prometheus_client is not installed - metrics endpoint disabled")
+            except OSError as e:
+                print(f"Could not start the metrics endpoint: {e}")
+
+    def record(self, record: Dict):
+        with self.lock:
+            if self.file:
+                self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self.file.flush()
+            if self.exporter:
+                self.exporter.observe(record)
+
+
+_totals = defaultdict(lambda: defaultdict(int))
+_totals_lock = threading.Lock()
+
+
+def add_to_totals(record: Dict):
+    with _totals_lock:
+        totals = _totals[record["model"]]
+        totals["calls"] += 1
+        for field in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            totals[field] += record[field]
+
+
+def print_prompt_cache_stats():
+    """Print how much of the prompt tokens of this process were served from the provider's prefix cache"""
+    with _totals_lock:
+        for model, totals in _totals.items():
+            if not totals["prompt_tokens"]:
+                continue
+            print(f"{model}: {totals['calls']} calls, {totals['prompt_tokens']} prompt tokens, "
+                  f"{totals['cached_tokens']} cached by the provider "
+                  f"({totals['cached_tokens'] / totals['prompt_tokens']:.0%})")
+
+
+class CallTracker:
+    """Collects the details of one call, see track_call"""
+    def __init__(self, kind: str, model: str, caller: str):
+        self.kind = kind
+        self.model = model
+        self.caller = caller
+        self.usage = None
+        self.retries = 0
+        self.status = "ok"
+        self.extra = {}
+        self.start_time = time.perf_counter()
+
+    def set_usage(self, usage):
+        self.usage = usage
+
+    def finish(self):
+        record = {
+            "ts": round(time.time(), 3),
+            "kind": self.kind,
+            "model": self.model,
+            "caller": self.caller,
+            "status": self.status,
+            "wall_ms": round((time.perf_counter() - self.start_time) * 1000, 2),
+            **usage_counts(self.usage),
+            "retries": self.retries,
+            **self.extra
+        }
+        add_to_totals(record)
+        telemetry = get_telemetry()
+        if telemetry:
+            telemetry.record(record)
+        return record
+
+
+class track_call:
+    """
+    Context manager (sync and async) that records one model call:
+
+        with track_call("chat", model) as call:
+            response = client.chat.completions.create(...)
+            call.set_usage(response.usage)
+    """
+    def __init__(self, kind: str, model: str, caller: Optional[str] = None):
+        self.tracker = CallTracker(kind, model, caller or find_caller())
+
+    def __enter__(self) -> CallTracker:
+        self.tracker.start_time = time.perf_counter()
+        return self.tracker
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None and self.tracker.status == "ok":
+            self.tracker.status = "error" if issubclass(exc_type, Exception) else "cancelled"
+        self.tracker.finish()
+        return False
+
+    async def __aenter__(self) -> CallTracker:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        return self.__exit__(exc_type, exc, traceback)
+
+
+def record_cache_hit(kind: str, model: str, status: str = "cache_hit"):
+    """Record a call answered without a request of its own (local cache or a merged identical call)"""
+    tracker = CallTracker(kind, model, find_caller())
+    tracker.status = status
+    tracker.finish()
+
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Optional[Telemetry]:
+    """Process-wide telemetry configured from .env, or None when it is disabled"""
+    global _telemetry
+    if os.getenv("LLM_telemetry", "1") == "0":
+        return None
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                port = os.getenv("LLM_metrics_port")
+                _telemetry = Telemetry(
+                    path=os.getenv("LLM_telemetry_path", DEFAULT_TELEMETRY_PATH),
+                    prometheus_port=int(port) if port else None
+                )
+    return _telemetry
+
+
+def summarize(path: str = DEFAULT_TELEMETRY_PATH) -> Dict:
+    """Totals per caller and kind of call, most time consuming first"""
+    totals = defaultdict(lambda: defaultdict(float))
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            stage = totals[(record["caller"], record["kind"], record["model"])]
+            stage["calls"] += 1
+            stage["errors"] += record["status"] == "error"
+            stage["retries"] += record.get("retries", 0)
+            for field in ("wall_ms", "prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"):
+                stage[field] += record.get(field, 0)
+    return dict(sorted(totals.items(), key=lambda item: item[1]["wall_ms"], reverse=True))
+
+
+def print_summary(path: str = DEFAULT_TELEMETRY_PATH):
+    print(f"{'caller':<50} {'kind':<10} {'model':<24} {'calls':>6} {'time s':>9} {'prompt':>9} {'compl.':>8} {'cached':>8} {'retries':>7}")
+    for (caller, kind, model), stage in summarize(path).items():
+        print(f"{caller:<50} {kind:<10} {model:<24} {int(stage['calls']):>6} {stage['wall_ms'] / 1000:>9.1f} "
+              f"{int(stage['prompt_tokens']):>9} {int(stage['completion_tokens']):>8} "
+              f"{int(stage['cached_tokens']):>8} {int(stage['retries']):>7}")
+
+
+if __name__ == "__main__":
+    print_summary(sys.argv[1] if len(sys.argv) > 1 else os.getenv("LLM_telemetry_path", DEFAULT_TELEMETRY_PATH))
@@ -0,0 +1,80 @@
+# lib/tokens.py
+# Token counts with the model's tiktoken encoding (loaded once per model) and token
+# offsets of a whole document, so chunk boundaries are found without re-encoding.
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """tiktoken encoding of the model, or None when tiktoken is not installed or its encoding cannot be loaded"""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The encoding files are downloaded on first use - offline, token counts are estimated instead
+        print(f"Warning: tiktoken encoding for {model} could not be loaded ({e}), token counts are estimated")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        # Rough upper estimate, Polish text has fewer characters per token than English
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class TokenOffsets:
+    """
+    Character offset at which every token of a document starts, from one encoding
+    of the whole text (a prefix sum of the token lengths). Tokens of text[start:end]
+    are counted with two binary searches; a token cut by start or end counts whole.
+    """
+    def __init__(self, text: str, model: str):
+        self.length = len(text)
+        encoding = get_encoding(model)
+        if encoding is None:
+            # Same estimate as count_tokens: a token every 3 characters
+            self.offsets = np.arange(0, self.length, 3, dtype=np.int64)
+            return
+        tokens = encoding.encode(text, disallowed_special=())
+        token_bytes = np.fromiter(map(len, encoding.decode_tokens_bytes(tokens)), dtype=np.int64, count=len(tokens))
+        byte_offsets = np.cumsum(token_bytes) - token_bytes
+        # Character of every UTF-8 byte (continuation bytes belong to the character before them)
+        data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8)
+        character_of_byte = np.cumsum((data & 0xC0) != 0x80) - 1
+        self.offsets = character_of_byte[byte_offsets] if len(tokens) else np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def first_token(self, position: int) -> int:
+        """Number of the token the character position is in"""
+        index = int(np.searchsorted(self.offsets, position, side='right')) - 1
+        if index <= 0:
+            return 0
+        # Tokens inside one character (split emoji) share its offset - take the first of them
+        return int(np.searchsorted(self.offsets, self.offsets[index], side='left'))
+
+    def count(self, start: int, end: int) -> int:
+        """Tokens of text[start:end]"""
+        if end <= start:
+            return 0
+        return int(np.searchsorted(self.offsets, end, side='left')) - self.first_token(start)
+
+    def end_after(self, start: int, tokens: int) -> int:
+        """Character position right after `tokens` tokens from start (the end of the text when fewer are left)"""
+        index = self.first_token(start) + tokens
+        end = int(self.offsets[index]) if index < len(self.offsets) else self.length
+        if tokens > 0 and end <= start:
+            # The tokens end inside one character (split emoji) - it is taken whole
+            end = min(start + 1, self.length)
+        return end
@@ -0,0 +1,343 @@
+# lib/vector_store.py
+# In-process exact vector search for corpora that fit on one machine: normalized
+# vectors in a memory-mapped .npy matrix, payloads in a SQLite side table.
+# Selected instead of Qdrant with Vector_backend=local in .env.
+import io
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+root_folder = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+DEFAULT_VECTOR_FOLDER = os.path.join(root_folder, '.cache', 'vectors')
+# Rows the matrix starts with, it doubles whenever it is full
+INITIAL_CAPACITY = 1024
+
+
+def get_vector_backend() -> str:
+    """"qdrant" (default) or "local", from Vector_backend in .env"""
+    return os.getenv("Vector_backend", "qdrant").strip().lower()
+
+
+def filter_sql(query_filter: Dict) -> Tuple[str, List]:
+    """
+    SQL condition for a payload filter like
+    {"date_int": {"gte": 20240101, "lte": 20241231}, "file_name": {"any": ["a.txt"]}, "content_hash": {"match": "..."}}
+    """
+    conditions = []
+    params = []
+    for field, condition in query_filter.items():
+        expression = f"json_extract(payload, '$.{field}')"
+        if "match" in condition:
+            conditions.append(f"{expression} = ?")
+            params.append(condition["match"])
+        if "any" in condition:
+            conditions.append(f"{expression} IN ({','.join('?' * len(condition['any']))})")
+            params.extend(condition["any"])
+        if condition.get("gte") is not None:
+            conditions.append(f"{expression} >= ?")
+            params.append(condition["gte"])
+        if condition.get("lte") is not None:
+            conditions.append(f"{expression} <= ?")
+            params.append(condition["lte"])
+    return " AND ".join(conditions) or "1", params
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Unit-length rows, so a dot product is the cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class SearchHit:
+    """One search result, with the same attributes as a Qdrant ScoredPoint"""
+    __slots__ = ("id", "score", "payload")
+
+    def __init__(self, id, score: float, payload: Dict):
+        self.id = id
+        self.score = score
+        self.payload = payload
+
+    def __repr__(self):
+        return f"SearchHit(id={self.id!r}, score={self.score:.4f})"
+
+
+class LocalVectorStore:
+    """
+    Exact top-k cosine search over a memory-mapped matrix (float32 or float16).
+    Rows are only appended: an updated point is overwritten in place, a deleted one
+    is masked out, and the file grows by rewriting the .npy header and extending it.
+    """
+    def __init__(self, name: str, dim: int = 1536, dtype: Optional[str] = None,
+                 folder: str = DEFAULT_VECTOR_FOLDER, block_rows: int = 16384):
+        self.name = name
+        self.dim = dim
+        self.dtype = np.dtype(dtype or os.getenv("Vector_dtype", "float32"))
+        if self.dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported vector dtype {self.dtype} (use float32 or float16)")
+        # Rows scored per matrix product - bounds the memory of one search on large stores
+        self.block_rows = block_rows
+        self.folder = os.path.join(folder, name)
+        self.vectors_path = os.path.join(self.folder, "vectors.npy")
+        self.lock = threading.RLock()
+
+        os.makedirs(self.folder, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.folder, "payloads.sqlite"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS points (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.db.commit()
+
+        if os.path.exists(self.vectors_path):
+            self.matrix = np.load(self.vectors_path, mmap_mode='r+')
+            if self.matrix.dtype != self.dtype or self.matrix.shape[1] != dim:
+                raise ValueError(f"{self.vectors_path} holds {self.matrix.dtype} vectors of size "
+                                 f"{self.matrix.shape[1]}, expected {self.dtype} of size {dim}")
+        else:
+            self.matrix = np.lib.format.open_memmap(self.vectors_path, mode='w+', dtype=self.dtype,
+                                                    shape=(INITIAL_CAPACITY, dim))
+
+        self.size = self.db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM points").fetchone()[0]
+        self.alive = np.zeros(self.matrix.shape[0], dtype=bool)
+        self.alive[:self.size] = True
+        deleted_rows = [row for (row,) in self.db.execute("SELECT row FROM points WHERE deleted = 1")]
+        self.alive[deleted_rows] = False
+
+    def grow(self, rows: int):
+        """Make room for at least `rows` rows (caller holds the lock)"""
+        capacity = self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2)
+        self.matrix.flush()
+        offset = self.matrix.offset
+        del self.matrix
+
+        header = io.BytesIO()
+        np.lib.format.write_array_header_1_0(header, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (new_capacity, self.dim)
+        })
+        if len(header.getvalue()) == offset:
+            # numpy pads the header, so the longer shape fits and no data has to move
+            with open(self.vectors_path, 'r+b') as file:
+                file.write(header.getvalue())
+                file.truncate(offset + new_capacity * self.dim * self.dtype.itemsize)
+        else:
+            old_matrix = np.load(self.vectors_path, mmap_mode='r')
+            new_matrix = np.lib.format.open_memmap(self.vectors_path + ".tmp", mode='w+', dtype=self.dtype,
+                                                   shape=(new_capacity, self.dim))
+            new_matrix[:capacity] = old_matrix
+            new_matrix.flush()
+            del old_matrix, new_matrix
+            os.replace(self.vectors_path + ".tmp", self.vectors_path)
+
+        self.matrix = np.load(self.vectors_path, mmap_mode='r+')
+        self.alive = np.concatenate([self.alive, np.zeros(new_capacity - capacity, dtype=bool)])
+
+    def upsert(self, points: List[Dict]):
+        """Add or replace points given as {"id", "vector", "payload"}"""
+        if not points:
+            return
+        vectors = np.asarray([point["vector"] for point in points], dtype=np.float32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of size {self.dim}, got shape {vectors.shape}")
+        vectors = normalize_rows(vectors)
+        ids = [json.dumps(point["id"]) for point in points]
+
+        with self.lock:
+            existing = {}
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                existing.update(self.db.execute(
+                    f"SELECT id, row FROM points WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+
+            rows = []
+            next_row = self.size
+            for point_id in ids:
+                if point_id not in existing:
+                    existing[point_id] = next_row
+                    next_row += 1
+                rows.append(existing[point_id])
+            self.grow(next_row)
+
+            # Vectors are written before the payloads, so a crash never leaves a payload without its vector
+            self.matrix[rows] = vectors.astype(self.dtype)
+            self.matrix.flush()
+            self.db.executemany(
+                "INSERT OR REPLACE INTO points (row, id, payload, deleted) VALUES (?, ?, ?, 0)",
+                [(row, point_id, json.dumps(point.get("payload") or {}, ensure_ascii=False))
+                 for row, point_id, point in zip(rows, ids, points)]
+            )
+            self.db.commit()
+            self.size = max(self.size, next_row)
+            self.alive[rows] = True
+
+    def delete(self, point_ids: Sequence):
+        """Mask points out of the search (their rows are not reused)"""
+        ids = [json.dumps(point_id) for point_id in point_ids]
+        with self.lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = [row for (row,) in self.db.execute(
+                    f"SELECT row FROM points WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                )]
+                self.db.executemany("UPDATE points SET deleted = 1 WHERE row = ?", [(row,) for row in rows])
+                self.alive[rows] = False
+            self.db.commit()
+
+    def create_payload_index(self, field: str):
+        """SQLite index on one payload field, used by filters on that field"""
+        with self.lock:
+            self.db.execute(f"CREATE INDEX IF NOT EXISTS idx_points_{field} ON points(json_extract(payload, '$.{field}'))")
+            self.db.commit()
+
+    def filter_ids(self, query_filter: Dict) -> List:
+        """IDs of the points matching a payload filter (see filter_sql)"""
+        conditions, params = filter_sql(query_filter)
+        with self.lock:
+            rows = self.db.execute(f"SELECT id FROM points WHERE deleted = 0 AND {conditions}", params).fetchall()
+        return [json.loads(point_id) for (point_id,) in rows]
+
+    def filter_rows(self, query_filter: Dict) -> np.ndarray:
+        """Sorted rows of the points matching a payload filter"""
+        conditions, params = filter_sql(query_filter)
+        with self.lock:
+            rows = self.db.execute(f"SELECT row FROM points WHERE deleted = 0 AND {conditions} ORDER BY row", params).fetchall()
+        return np.array([row for (row,) in rows], dtype=np.int64)
+
+    def find_ids(self, **match) -> List:
+        """IDs of the points whose payload fields equal the given values"""
+        return self.filter_ids({field: {"match": value} for field, value in match.items()})
+
+    def retrieve(self, point_ids: Sequence) -> Dict:
+        """Payloads of the given points by ID (missing or deleted points are left out)"""
+        ids = [json.dumps(point_id) for point_id in point_ids]
+        payloads = {}
+        with self.lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                for point_id, payload in self.db.execute(
+                    f"SELECT id, payload FROM points WHERE deleted = 0 AND id IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    payloads[json.loads(point_id)] = json.loads(payload)
+        return payloads
+
+    def payload_values(self, field: str) -> set:
+        """Distinct values of one payload field over all stored points"""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT DISTINCT json_extract(payload, '$.{field}') FROM points WHERE deleted = 0"
+            ).fetchall()
+        return {value for (value,) in rows if value is not None}
+
+    def count(self) -> int:
+        return int(self.alive[:self.size].sum())
+
+    def search(self, query_vector: Sequence[float], limit: int = 10, query_filter: Optional[Dict] = None) -> List[SearchHit]:
+        """Top `limit` points by cosine similarity, best first"""
+        return self.search_batch([query_vector], limit, query_filter)[0]
+
+    def search_batch(self, query_vectors: Sequence[Sequence[float]], limit: int = 10,
+                     query_filter: Optional[Dict] = None) -> List[List[SearchHit]]:
+        """
+        Top `limit` points for each query - one matrix product for all of them.
+        With a payload filter only the matching rows are read and scored.
+        """
+        queries = normalize_rows(np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dim))
+        with self.lock:
+            size = self.size
+            if size == 0 or limit <= 0:
+                return [[] for _ in range(len(queries))]
+            if query_filter:
+                return self.search_rows(queries, self.filter_rows(query_filter), limit)
+
+            # float16 rows are converted in smaller blocks into one reused float32 buffer
+            block_rows = self.block_rows if self.dtype == np.float32 else min(self.block_rows, 4096)
+            buffer = None if self.dtype == np.float32 else np.empty((min(block_rows, size), self.dim), dtype=np.float32)
+            best_scores = np.empty((len(queries), 0), dtype=np.float32)
+            best_rows = np.empty((len(queries), 0), dtype=np.int64)
+            for start in range(0, size, block_rows):
+                end = min(start + block_rows, size)
+                block = self.matrix[start:end]
+                if buffer is not None:
+                    np.copyto(buffer[:end - start], block)
+                    block = buffer[:end - start]
+                scores = queries @ block.T
+                scores[:, ~self.alive[start:end]] = -np.inf
+                scores = np.concatenate([best_scores, scores], axis=1)
+                rows = np.concatenate([best_rows, np.broadcast_to(np.arange(start, end), (len(queries), end - start))], axis=1)
+                if scores.shape[1] > limit:
+                    top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+                    scores = np.take_along_axis(scores, top, axis=1)
+                    rows = np.take_along_axis(rows, top, axis=1)
+                best_scores, best_rows = scores, rows
+
+            order = np.argsort(-best_scores, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+            return self.load_hits(best_rows, best_scores)
+
+    def search_rows(self, queries: np.ndarray, rows: np.ndarray, limit: int) -> List[List[SearchHit]]:
+        """Exact top `limit` among the given rows for normalized queries"""
+        with self.lock:
+            rows = rows[self.alive[rows]]
+            best_scores = np.empty((len(queries), 0), dtype=np.float32)
+            best_rows = np.empty((len(queries), 0), dtype=np.int64)
+            for start in range(0, len(rows), self.block_rows):
+                block_rows = rows[start:start + self.block_rows]
+                scores = queries @ self.vectors(block_rows).T
+                scores = np.concatenate([best_scores, scores], axis=1)
+                candidates = np.concatenate([best_rows, np.broadcast_to(block_rows, (len(queries), len(block_rows)))], axis=1)
+                if scores.shape[1] > limit:
+                    top = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+                    scores = np.take_along_axis(scores, top, axis=1)
+                    candidates = np.take_along_axis(candidates, top, axis=1)
+                best_scores, best_rows = scores, candidates
+
+            order = np.argsort(-best_scores, axis=1)
+            return self.load_hits(np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1))
+
+    def vectors(self, rows: Sequence[int]) -> np.ndarray:
+        """Full-precision (float32) vectors of the given rows, read from the memory map"""
+        with self.lock:
+            return np.asarray(self.matrix[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+    def load_hits(self, rows_per_query, scores_per_query) -> List[List[SearchHit]]:
+        """Search hits with IDs and payloads for rows already ranked per query (-inf scores are dropped)"""
+        wanted = sorted({int(row) for rows, scores in zip(rows_per_query, scores_per_query)
+                         for row, score in zip(rows, scores) if score > -np.inf})
+        points = {}
+        with self.lock:
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                for row, point_id, payload in self.db.execute(
+                    f"SELECT row, id, payload FROM points WHERE row IN ({','.join('?' * len(chunk))})", chunk
+                ):
+                    points[row] = (json.loads(point_id), json.loads(payload))
+
+        results = []
+        for rows, scores in zip(rows_per_query, scores_per_query):
+            results.append([SearchHit(points[int(row)][0], float(score), points[int(row)][1])
+                            for row, score in zip(rows, scores) if score > -np.inf])
+        return results
+
+    def close(self):
+        with self.lock:
+            self.matrix.flush()
+            self.db.close()
@@ -0,0 +1,50 @@
+# tests/conftest.py
+import collections
+import importlib.util
+import os
+
+import pytest
+
+import lib.context_packing
+import lib.tokens
+
+ROOT_FOLDER = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+
+def load_script(relative_path: str, name: str):
+    """Module of a script whose file name is not importable as is"""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT_FOLDER, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_byte_encoding(sample: str):
+    """Small tiktoken encoding (all bytes plus the most frequent pairs of the sample) - no download needed"""
+    tiktoken = pytest.importorskip("tiktoken")
+    ranks = {bytes([i]): i for i in range(256)}
+    data = sample.encode('utf-8')
+    for (first, second), _ in collections.Counter(zip(data, data[1:])).most_common(300):
+        ranks.setdefault(bytes([first, second]), len(ranks))
+    pattern = r"""'(?:[sdmt]|ll|ve|re)| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+    return tiktoken.Encoding(name="test_bytes", pat_str=pattern, mergeable_ranks=ranks, special_tokens={})
+
+
+@pytest.fixture(params=["estimate", "tiktoken"])
+def encoding(request, monkeypatch):
+    """Token counting with the length estimate (no encoding) and with a byte-level tiktoken encoding"""
+    encoding = None if request.param == "estimate" else make_byte_encoding(SAMPLE_TEXT)
+    # Also replaced where the function was imported by name
+    for module in (lib.tokens, lib.context_packing):
+        monkeypatch.setattr(module, "get_encoding", lambda model: encoding)
+    return encoding
+
+
+SAMPLE_TEXT = (
+    "# Raport\n\n## Sekcja 1\n\n"
+    + "Czujnik w sektorze C wykrył ruch o 12:45, patrol zgłosił awarię zasilania. " * 20
+    + "\n\nZobacz [raport](https://example.com/raport) i ![schemat](https://example.com/img.png) 🚀🚀\n\n"
+    + "## Sekcja 2\n\n"
+    + "The sensor model RX-7 reported 2024-11-12 data, zażółć gęślą jaźń. " * 30
+    + "\n"
+)
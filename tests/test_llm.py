@@ -0,0 +1,64 @@
+# tests/test_llm.py
+# Model calls against the local stand-in server, which answers some requests with 429 and 500
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from lib import llm, openai_client, rate_limiter
+from lib.embeddings import embed_texts
+from lib.mock_openai_server import start_mock_server
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    server, base_url = start_mock_server(error_rate=0.2, rate_limit_rate=0.2, seed=7)
+    monkeypatch.setenv("OpenAI_APIkey", "test")
+    monkeypatch.setenv("OpenAI_baseURL", base_url)
+    monkeypatch.setenv("LLM_cache", "0")
+    monkeypatch.setenv("LLM_embedding_cache", "0")
+    monkeypatch.setenv("LLM_telemetry", "0")
+    monkeypatch.setattr(llm, "transient_error_delay", lambda attempt: 0)
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    openai_client.close_client()
+    yield server
+    openai_client.close_client()
+    server.shutdown()
+
+
+def question(index):
+    return [{"role": "user", "content": f"Question number {index}"}]
+
+
+def test_errors_are_retried(mock_server):
+    answers = [llm.chat_completion("gpt-4o-mini", question(index)) for index in range(20)]
+    assert answers == ["OK"] * 20
+    assert mock_server.state.stats()["injected_errors"] > 0
+    limiter = rate_limiter.get_rate_limiter("gpt-4o-mini")
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["rate_limited"] > 0
+
+
+def test_async_requests_are_retried_and_coalesced(mock_server):
+    async def main():
+        return await asyncio.gather(*(llm.async_chat_completion("gpt-4o-mini", question(index % 5)) for index in range(20)))
+
+    assert asyncio.run(main()) == ["OK"] * 20
+    assert rate_limiter.get_rate_limiter("gpt-4o-mini").stats()["in_flight"] == 0
+
+
+def test_embedding_batches_are_retried_whole(mock_server):
+    vectors = embed_texts([f"Document {index}" for index in range(10)] + [""], batch_size=4)
+    assert all(len(vector) == 1536 for vector in vectors[:10])
+    assert vectors[10] is None
+    assert rate_limiter.get_rate_limiter("text-embedding-ada-002").stats()["in_flight"] == 0
+
+
+def test_stream_opening_is_retried(mock_server):
+    for index in range(10):
+        stream = llm.ChatStream("gpt-4o-mini", question(index))
+        assert "".join(stream) == "OK"
+        assert stream.time_to_first_token is not None
+    assert rate_limiter.get_rate_limiter("gpt-4o-mini").stats()["in_flight"] == 0
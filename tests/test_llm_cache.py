@@ -0,0 +1,83 @@
+# tests/test_llm_cache.py
+import base64
+
+import pytest
+
+from lib import llm_cache
+from lib.llm_cache import LLMCache, make_cache_key
+
+MESSAGES = [{"role": "user", "content": "What is the capital of Poland?"}]
+
+
+def image_message(image_bytes: bytes):
+    data_url = "data:image/png;base64," + base64.b64encode(image_bytes).decode('ascii')
+    return [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": data_url}}]}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable time.time of the cache module"""
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_cache_key_depends_on_the_whole_request(monkeypatch):
+    monkeypatch.delenv("OpenAI_baseURL", raising=False)
+    key = make_cache_key("gpt-4o-mini", MESSAGES, temperature=0)
+    assert key == make_cache_key("gpt-4o-mini", [dict(message) for message in MESSAGES], temperature=0)
+    assert key != make_cache_key("gpt-4o", MESSAGES, temperature=0)
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES, temperature=1)
+    assert key != make_cache_key("gpt-4o-mini", MESSAGES + [{"role": "user", "content": "And Germany?"}], temperature=0)
+
+
+def test_cache_key_uses_the_image_hash():
+    assert make_cache_key("gpt-4o", image_message(b"png")) == make_cache_key("gpt-4o", image_message(b"png"))
+    assert make_cache_key("gpt-4o", image_message(b"png")) != make_cache_key("gpt-4o", image_message(b"other png"))
+    assert "base64" not in str(llm_cache.hash_image_data_urls(image_message(b"png")))
+
+
+def test_cache_key_separates_base_urls(monkeypatch):
+    monkeypatch.delenv("OpenAI_baseURL", raising=False)
+    real_key = make_cache_key("gpt-4o-mini", MESSAGES)
+    monkeypatch.setenv("OpenAI_baseURL", "http://127.0.0.1:8089/v1")
+    assert make_cache_key("gpt-4o-mini", MESSAGES) != real_key
+
+
+def test_get_and_set_count_hits_and_misses():
+    cache = LLMCache(":memory:")
+    assert cache.get("key") is None
+    cache.set("key", "Warszawa", model="gpt-4o-mini")
+    assert cache.get("key") == "Warszawa"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["size_bytes"] == len("Warszawa")
+
+
+def test_expired_entries_are_dropped(clock):
+    cache = LLMCache(":memory:", ttl_seconds=60)
+    cache.set("key", "answer")
+    clock[0] += 59
+    assert cache.get("key") == "answer"
+    clock[0] += 2
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = LLMCache(":memory:", max_bytes=20)
+    for key in ("a", "b"):
+        cache.set(key, "x" * 8)
+        clock[0] += 1
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") == "x" * 8
+    clock[0] += 1
+    cache.set("c", "x" * 8)
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == "x" * 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_get_cache_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("LLM_cache", "0")
+    assert llm_cache.get_cache() is None
@@ -0,0 +1,95 @@
+# tests/test_rate_limiter.py
+import asyncio
+
+import pytest
+
+from lib import rate_limiter
+from lib.rate_limiter import POLL_INTERVAL, RateLimiter, TokenBucket, estimate_tokens, parse_reset_duration
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0), ("6m0s", 360.0), ("120ms", 0.12), ("0.5", 0.5), ("1h2m", 3720.0), ("", None), (None, None), ("soon", None)
+])
+def test_parse_reset_duration(value, seconds):
+    if seconds is None:
+        assert parse_reset_duration(value) is None
+    else:
+        assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+def test_estimate_tokens_counts_text_and_images():
+    assert estimate_tokens([{"role": "user", "content": "x" * 400}], max_tokens=10) == 110
+    image = {"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:"}}]}
+    assert estimate_tokens([image], max_tokens=10) == 95
+
+
+def test_token_bucket_waits_for_the_refill():
+    bucket = TokenBucket(60, per_seconds=60)
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+    # Bigger than the whole bucket - only a full bucket is needed
+    assert bucket.wait_time(600) == pytest.approx(60.0, abs=0.1)
+
+
+def test_concurrency_window_is_released_on_every_outcome():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, initial_concurrency=2)
+    assert limiter.try_start(10) == 0
+    assert limiter.try_start(10) == 0
+    # Window full
+    assert limiter.try_start(10) == POLL_INTERVAL
+    limiter.on_success({}, 10, 12)
+    assert limiter.try_start(10) == 0
+    limiter.on_error()
+    limiter.on_rate_limited({})
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_window_grows_on_success_and_halves_on_429():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, initial_concurrency=4, max_concurrency=8)
+    for _ in range(4):
+        limiter.acquire(1)
+        limiter.on_success()
+    assert limiter.concurrency == pytest.approx(4.92, abs=0.01)
+    limiter.acquire(1)
+    limiter.on_rate_limited()
+    assert limiter.concurrency == pytest.approx(2.46, abs=0.01)
+    assert limiter.stats()["rate_limited"] == 1
+
+
+def test_retry_after_blocks_new_requests():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000)
+    limiter.acquire(1)
+    limiter.on_rate_limited(retry_after=5)
+    assert limiter.try_start(1) == pytest.approx(5, abs=0.1)
+
+
+def test_exhausted_budget_in_headers_blocks_until_reset():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000)
+    limiter.acquire(1)
+    limiter.on_success({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "2s"})
+    assert limiter.try_start(1) == pytest.approx(2, abs=0.1)
+
+
+def test_async_acquire_waits_for_a_free_slot():
+    limiter = RateLimiter(rpm=1000, tpm=1_000_000, initial_concurrency=1)
+
+    async def main():
+        await limiter.acquire_async(1)
+        waiting = asyncio.ensure_future(limiter.acquire_async(1))
+        await asyncio.sleep(POLL_INTERVAL * 3)
+        assert not waiting.done()
+        limiter.on_success()
+        await asyncio.wait_for(waiting, 1)
+        limiter.on_success()
+
+    asyncio.run(main())
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_get_rate_limiter_is_shared_per_model(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setenv("LLM_rpm", "30")
+    assert rate_limiter.get_rate_limiter("gpt-4o-mini") is rate_limiter.get_rate_limiter("gpt-4o-mini")
+    assert rate_limiter.get_rate_limiter("gpt-4o-mini") is not rate_limiter.get_rate_limiter("gpt-4o")
+    assert rate_limiter.get_rate_limiter("gpt-4o").requests.capacity == 30
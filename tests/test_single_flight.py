@@ -0,0 +1,136 @@
+# tests/test_single_flight.py
+import asyncio
+import threading
+import time
+
+import pytest
+
+from lib.single_flight import SingleFlight
+
+
+def test_threads_share_one_call():
+    flight = SingleFlight("test")
+    calls = []
+    started = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait()
+    waiters = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    for thread in [leader] + waiters:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(results) == [("answer", False)] + [("answer", True)] * 3
+    assert flight.stats()["coalesced"] == 3
+    assert flight.calls == {}
+
+
+def test_threads_share_the_error():
+    flight = SingleFlight("test")
+    started = threading.Event()
+
+    def work():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("upstream failed")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("key", work)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait()
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2
+    # The next call runs again
+    assert flight.do("key", lambda: "retried") == ("retried", False)
+
+
+def test_async_calls_share_the_result():
+    flight = SingleFlight("test")
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert results == [("answer", False)] + [("answer", True)] * 4
+    assert flight.async_calls == {}
+
+
+def test_async_calls_share_the_error():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.async_calls == {}
+
+
+def test_cancelled_leader_does_not_cancel_the_waiters():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(main()) == ("answer", True)
+    assert flight.stats()["executed"] == 1
+
+
+def test_cancelled_waiter_does_not_cancel_the_call():
+    flight = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        return await leader
+
+    assert asyncio.run(main()) == ("answer", False)
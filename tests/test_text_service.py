@@ -0,0 +1,49 @@
+# tests/test_text_service.py
+import io
+
+import pytest
+
+from tests.conftest import SAMPLE_TEXT, load_script
+
+TextService = load_script("11-Documents-Metadata/(in-progress)TextService.py", "TextService").TextService
+
+
+@pytest.fixture
+def service(capsys):
+    # The splitter prints every chunk
+    yield TextService()
+    capsys.readouterr()
+
+
+def test_split_covers_the_text(service, encoding):
+    text = SAMPLE_TEXT.replace("](", "] (")  # no links, so the chunk texts are not rewritten
+    chunks = service.split(text, 50)
+    assert len(chunks) > 1
+    assert "".join(chunk["text"] for chunk in chunks) == text
+    assert all(0 < chunk["metadata"]["tokens"] <= 50 for chunk in chunks)
+    assert chunks[0]["metadata"]["headers"] == {"h1": ["Raport"], "h2": ["Sekcja 1"]}
+    assert chunks[-1]["metadata"]["headers"]["h2"] == ["Sekcja 2"]
+
+
+def test_split_extracts_links(service, encoding):
+    chunk = service.split(SAMPLE_TEXT, 10000)[0]
+    assert chunk["metadata"]["urls"][0] == "https://example.com/raport"
+    assert chunk["metadata"]["images"] == ["https://example.com/img.png"]
+    assert "[raport]({$url0})" in chunk["text"]
+
+
+def test_split_with_one_token_limit_ends(service, encoding):
+    # int(limit * 0.8) is 0 - every chunk must still move forward, also over a character split into tokens
+    text = SAMPLE_TEXT[:300] + "🚀🚀 zażółć\n"
+    chunks = service.split(text, 1)
+    assert all(chunk["text"] for chunk in chunks)
+    assert "".join(chunk["text"] for chunk in chunks) == text
+
+
+@pytest.mark.parametrize("block_chars", [777, 1001, 5000])
+def test_streamed_split_matches_one_pass(service, encoding, block_chars):
+    expected = service.split(SAMPLE_TEXT * 3, 50)
+    assert list(service.iter_split(io.StringIO(SAMPLE_TEXT * 3), 50, block_chars=block_chars)) == expected
+    # Bytes are decoded incrementally, also when a block ends inside a character
+    data = io.BytesIO((SAMPLE_TEXT * 3).encode('utf-8'))
+    assert list(service.iter_split(data, 50, block_chars=block_chars)) == expected
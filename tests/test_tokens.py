@@ -0,0 +1,50 @@
+# tests/test_tokens.py
+import lib.tokens
+from lib.context_packing import pack_context
+from lib.tokens import TokenOffsets, count_tokens
+from tests.conftest import SAMPLE_TEXT
+
+
+def test_offsets_count_like_encoding_the_slice(encoding):
+    offsets = TokenOffsets(SAMPLE_TEXT, "gpt-4o-mini")
+    assert offsets.count(0, len(SAMPLE_TEXT)) == len(offsets)
+    # The length estimate of count_tokens rounds up by one token
+    assert 0 <= count_tokens(SAMPLE_TEXT, "gpt-4o-mini") - len(offsets) <= (1 if encoding is None else 0)
+    for start in range(0, len(SAMPLE_TEXT), 97):
+        end = offsets.end_after(start, 25)
+        assert start < end <= len(SAMPLE_TEXT)
+        assert offsets.count(start, end) <= 25
+    assert offsets.count(10, 10) == 0
+
+
+def test_end_after_stops_at_the_end_of_the_text(encoding):
+    offsets = TokenOffsets("short text", "gpt-4o-mini")
+    assert offsets.end_after(0, 1000) == len("short text")
+
+
+def test_character_split_into_tokens_is_taken_whole(encoding):
+    text = "a🚀b"
+    offsets = TokenOffsets(text, "gpt-4o-mini")
+    # One token from the rocket never ends inside it
+    assert offsets.end_after(1, 1) >= 2
+    assert offsets.count(1, 2) >= 1
+
+
+def test_count_tokens_estimate_without_encoding(monkeypatch):
+    monkeypatch.setattr(lib.tokens, "get_encoding", lambda model: None)
+    assert count_tokens("x" * 30, "gpt-4o-mini") == 11
+
+
+def test_pack_context_sends_overlapping_text_once(encoding):
+    source = SAMPLE_TEXT
+    first, second = source[0:1500], source[1000:2500]
+    packed, stats = pack_context([first, second], 100000, source=source)
+    assert packed == [source[0:2500]]
+    assert stats["saved_tokens"] > 0
+
+
+def test_pack_context_keeps_the_budget(encoding):
+    chunks = [SAMPLE_TEXT[:1500], "Unrelated note " * 50]
+    packed, stats = pack_context(chunks, 200, source=SAMPLE_TEXT)
+    assert stats["packed_tokens"] <= 200
+    assert packed